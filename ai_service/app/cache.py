@@ -0,0 +1,91 @@
+# AI מטמון קבוע לטיולים שנוצרו ב
+# SQLite נשמר על הדיסק בקובץ כך שהוא שורד הפעלה מחדש של השירות
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+TRIP_CACHE_PATH = os.getenv("TRIP_CACHE_PATH", "trip_cache.db")
+TRIP_CACHE_TTL_SECONDS = int(os.getenv("TRIP_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60)) # תוקף רשומה - שבוע כברירת מחדל
+TRIP_CACHE_MAX_ENTRIES = int(os.getenv("TRIP_CACHE_MAX_ENTRIES", 5000)) # מעבר לזה נמחקות הרשומות שלא נקראו הכי הרבה זמן
+
+class TripPlanCache:
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+
+    # פתיחת החיבור רק בשימוש הראשון
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS trip_cache ("
+                "key TEXT PRIMARY KEY, "
+                "value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "last_accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_trip_cache_last_accessed ON trip_cache (last_accessed)")
+            self._conn.commit()
+        return self._conn
+
+    # מפתח לפי שדות הבקשה המנורמלים וגרסת הפרומפט
+    @staticmethod
+    def make_key(destination: str, num_days: int, num_travelers: int, trip_type: Optional[str], prompt_version: str) -> str:
+        normalized = {
+            "destination": " ".join(destination.split()).lower(),
+            "num_days": num_days,
+            "num_travelers": num_travelers,
+            "trip_type": str(getattr(trip_type, "value", trip_type) or "").lower(),
+            "prompt_version": prompt_version,
+        }
+        raw = json.dumps(normalized, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # שליפה מהמטמון - None אם אין רשומה או שפג תוקפה
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, created_at FROM trip_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM trip_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+
+            conn.execute("UPDATE trip_cache SET last_accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+
+        return json.loads(value)
+
+    # שמירה במטמון ופינוי הרשומות הישנות ביותר אם עברנו את הגבול
+    def set(self, key: str, value: dict):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO trip_cache (key, value, created_at, last_accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            conn.execute(
+                "DELETE FROM trip_cache WHERE key IN ("
+                "SELECT key FROM trip_cache ORDER BY last_accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            conn.commit()
+
+trip_cache = TripPlanCache(TRIP_CACHE_PATH, TRIP_CACHE_TTL_SECONDS, TRIP_CACHE_MAX_ENTRIES)
@@ -1,10 +1,19 @@
 # קובץ הפעלה ראשי של האתר
 # FastAPI קובץ זה אחראי על הפעלת השרת ומגדיר את 
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app import routes
+from app import services
 
-app = FastAPI()
+# סגירת החיבורים הפתוחים לבק ול-AI בכיבוי השרת
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await services.backend_client.aclose()
+    await services.client.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(routes.router)
 
@@ -1,53 +1,144 @@
 # AI שקשורים ל API נתיבי
 
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+import os
+from fastapi import APIRouter, HTTPException, Request
 from fastapi import Query
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from openai import OpenAIError
 from app.schemas import TripRequest, TripResponse, BudgetResponse, TripType
 from app.schemas import TripAdvisorChatRequest, TripAdvisorChatResponse
 from app import services
+from app.cache import trip_cache
 
 router = APIRouter(prefix="/trip-ai", tags=["Trip AI Service"])
 
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", 1)) # כל כמה זמן בודקים אם הלקוח עדיין מחובר
+
+# הרצת יצירה ארוכה וביטול שלה אם הלקוח התנתק באמצע
+async def run_until_disconnected(request: Request, coro):
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client closed request.")
+    finally:
+        task.cancel()
+
+# מפתח המטמון של בקשת טיול
+def get_cache_key(trip_request: TripRequest) -> str:
+    return trip_cache.make_key(
+        trip_request.destination,
+        trip_request.num_days,
+        trip_request.num_travelers,
+        trip_request.trip_type,
+        services.PROMPT_VERSION
+    )
+
 # AI - יצירת טיול מותאם אישית
 @router.post("/custom-trip", response_model=TripResponse)
-async def create_custom_trip(trip_request: TripRequest):
+async def create_custom_trip(trip_request: TripRequest, request: Request):
     if not trip_request.destination or not trip_request.num_days:
         raise HTTPException(status_code=400, detail="Destination and number of days are required.")
 
-    # תמיד שולחים ל-AI לבנות את הטיול
-    trip_plan, estimated_budget = services.custom_trip_plan(
+    # טיול זהה שכבר נוצר מוחזר מהמטמון, אלא אם התבקש טיול חדש
+    cache_key = get_cache_key(trip_request)
+    if not trip_request.fresh:
+        cached = await asyncio.to_thread(trip_cache.get, cache_key)
+        if cached is not None:
+            return TripResponse(**cached)
+
+    plan_trip = services.custom_trip_plan_parallel if trip_request.parallel else services.custom_trip_plan
+    trip_plan, estimated_budget = await run_until_disconnected(request, plan_trip(
         destination=trip_request.destination,
-        num_days= trip_request.num_days,
+        num_days=trip_request.num_days,
         num_travelers=trip_request.num_travelers,
         trip_type=trip_request.trip_type
-    )
+    ))
 
-    return TripResponse(
+    response = TripResponse(
         trip_plan=trip_plan,
         estimated_budget=estimated_budget
-    )    
+    )
+    await asyncio.to_thread(trip_cache.set, cache_key, response.model_dump())
+
+    return response
+
+# AI - יצירת טיול מותאם אישית בהזרמה (NDJSON) - כל יום נשלח ברגע שהוא מוכן
+@router.post("/custom-trip/stream")
+async def stream_custom_trip(trip_request: TripRequest):
+    if not trip_request.destination or not trip_request.num_days:
+        raise HTTPException(status_code=400, detail="Destination and number of days are required.")
+
+    services.validate_trip_input(trip_request.destination, trip_request.num_days, trip_request.num_travelers)
+
+    cache_key = get_cache_key(trip_request)
+    cached = None if trip_request.fresh else await asyncio.to_thread(trip_cache.get, cache_key)
+
+    async def events():
+        # טיול מהמטמון נשלח מיד, באותו פורמט של הזרמה רגילה
+        if cached is not None:
+            for day in cached["trip_plan"] or []:
+                yield json.dumps({"type": "day", "day": day}) + "\n"
+            yield json.dumps({"type": "budget", "estimated_budget": cached["estimated_budget"]}) + "\n"
+            return
+
+        trip_plan = []
+        try:
+            async for event in services.stream_custom_trip_plan(
+                destination=trip_request.destination,
+                num_days=trip_request.num_days,
+                num_travelers=trip_request.num_travelers,
+                trip_type=trip_request.trip_type
+            ):
+                if event["type"] == "day":
+                    trip_plan.append(event["day"])
+                else:
+                    await asyncio.to_thread(trip_cache.set, cache_key, {"trip_plan": trip_plan, "estimated_budget": event["estimated_budget"]})
+                yield json.dumps(event) + "\n"
+        except HTTPException as e:
+            yield json.dumps({"type": "error", "detail": e.detail}) + "\n"
+        except (ValidationError, KeyError) as e:
+            yield json.dumps({"type": "error", "detail": f"AI response error: {str(e)}"}) + "\n"
+        except OpenAIError as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # חישוב תקציב לטיול קיים
 @router.post("/calculate-budget/{trip_id}", response_model=BudgetResponse)
-async def calculate_trip_budget(trip_id: int, num_travelers: int = Query(...)):
-    trip = services.get_trip_by_id_from_backend(trip_id)
+async def calculate_trip_budget(trip_id: int, request: Request, num_travelers: int = Query(...)):
+    # פרטי הטיול והפעילויות נשלפים מהבק במקביל
+    trip, trip_plan = await asyncio.gather(
+        services.get_trip_by_id_from_backend(trip_id),
+        services.get_trip_plan_from_backend(trip_id)
+    )
 
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found.")
 
     destination = trip["destination"]
-    trip_plan = services.get_trip_plan_from_backend(trip_id)
 
     num_days = trip["duration_days"]
     if num_days is None:
         raise HTTPException(status_code=400, detail="Cannot calculate budget: trip duration is missing.")
 
-    estimated_budget = services.calculate_budget_by_ai(
+    estimated_budget = await run_until_disconnected(request, services.calculate_budget_by_ai(
         destination=destination,
         num_days=num_days,
         num_travelers=num_travelers,
         trip_plan=trip_plan
-    )
+    ))
 
     print(BudgetResponse(estimated_budget=estimated_budget))
     return BudgetResponse(estimated_budget=estimated_budget)
@@ -59,5 +150,5 @@ def get_trip_types():
 
 # צ'אט בוט לייעוץ טיולים
 @router.post("/trip-advisor", response_model=TripAdvisorChatResponse)
-def chat_trip_advisor(req: TripAdvisorChatRequest):
-    return services.trip_advisor_chat(req)
\ No newline at end of file
+async def chat_trip_advisor(req: TripAdvisorChatRequest):
+    return await services.trip_advisor_chat(req)
\ No newline at end of file
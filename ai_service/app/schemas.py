@@ -30,6 +30,8 @@ class TripRequest(BaseModel):
     num_days: int
     num_travelers: int
     trip_type: TripType
+    parallel: bool = False  # יצירת כל טווחי הימים במקביל
+    fresh: bool = False     # דילוג על המטמון ויצירת טיול חדש
 
 class TripResponse(BaseModel):
     trip_plan: Optional[List[DayPlan]] = None
@@ -1,11 +1,12 @@
 # AI פונקציות שירות הקשורות ל 
 
+import asyncio
 import json
-from openai import OpenAI, OpenAIError
+import httpx
+from openai import AsyncOpenAI, OpenAIError
 from app.schemas import DayPlan, ActivityItem
-from typing import List, Optional, Tuple
+from typing import AsyncIterator, List, Optional, Tuple
 import os
-import requests
 from dotenv import load_dotenv
 from fastapi import HTTPException
 from collections import defaultdict
@@ -13,98 +14,100 @@ import re
 from app.schemas import (TripAdvisorChatRequest, TripAdvisorChatResponse)
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-# AI יצירת טיול
-def custom_trip_plan(destination: str,num_days: int,num_travelers: int,trip_type: Optional[str] = None) -> Tuple[List[dict], float]:
-    
-    MAX_DAYS_PER_REQUEST = 10
-    visited_places = set()
-    all_days = []
+BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:8000")
+BACKEND_TIMEOUT_SECONDS = float(os.getenv("BACKEND_TIMEOUT_SECONDS", 10)) # זמן המתנה מקסימלי לתשובה מהבק
+backend_client = httpx.AsyncClient(base_url=BACKEND_URL, timeout=BACKEND_TIMEOUT_SECONDS)
 
-    if not destination.strip() or num_days < 1 or num_travelers < 1:
-        raise HTTPException(status_code=400, detail="Invalid input data for trip planning.")
+PROMPT_VERSION = "1" # יש לעדכן בכל שינוי בפרומפט כדי שהמטמון לא יחזיר טיולים ישנים
+MAX_DAYS_PER_REQUEST = 10
+MAX_CONCURRENT_CHUNKS = int(os.getenv("AI_MAX_CONCURRENT_CHUNKS", 4)) # מספר מקסימלי של קריאות מקבילות ל-AI
 
-    for i in range(0, num_days, MAX_DAYS_PER_REQUEST):
-        sub_start_day = i + 1
-        sub_end_day = min(i + MAX_DAYS_PER_REQUEST, num_days)
-        sub_days = sub_end_day - sub_start_day + 1
+# בניית הפרומפט עבור טווח ימים אחד בטיול
+def build_chunk_prompt(destination: str, num_days: int, num_travelers: int, trip_type: Optional[str],
+                       sub_start_day: int, sub_end_day: int, visited_places: Optional[set] = None) -> str:
+    sub_days = sub_end_day - sub_start_day + 1
 
-        prompt = (
-            f"You are a professional travel planner. Create a detailed and realistic travel itinerary for **Day {sub_start_day} to Day {sub_end_day}** "
-            f"({sub_days} days in total) for {num_travelers} travelers visiting {destination}. "
-        )
+    prompt = (
+        f"You are a professional travel planner. Create a detailed and realistic travel itinerary for **Day {sub_start_day} to Day {sub_end_day}** "
+        f"({sub_days} days in total) for {num_travelers} travelers visiting {destination}. "
+    )
 
-        if trip_type:
-            prompt += f"The trip should match the style: '{trip_type}'. "
-
-        if visited_places:
-            visited_text = ", ".join(sorted(visited_places))
-            prompt += (
-                f"Avoid repeating the following places already visited in earlier days: {visited_text}. "
-                f"This itinerary is a continuation of a longer trip. Please ensure the new days follow naturally. "
-                f"maintain a logical geographical flow – group nearby locations together and avoid unnecessary backtracking. "
-            )
-        
+    if trip_type:
+        prompt += f"The trip should match the style: '{trip_type}'. "
+
+    if visited_places:
+        visited_text = ", ".join(sorted(visited_places))
+        prompt += (
+            f"Avoid repeating the following places already visited in earlier days: {visited_text}. "
+            f"This itinerary is a continuation of a longer trip. Please ensure the new days follow naturally. "
+            f"maintain a logical geographical flow – group nearby locations together and avoid unnecessary backtracking. "
+        )
+    elif visited_places is None and num_days > sub_days:
         prompt += (
-        f"Each day should include at least 5 to 7 activities, covering the full day from morning (~08:00) to evening (~21:00). "
-        "Include a natural mix of experiences: sightseeing, meals, relaxation, nature, culture, local highlights, and transportation if needed. "
-        "Make sure to space out the activities realistically by considering how long it would take to travel between locations. "
-        "Avoid back-to-back activities that are far apart unless they are near each other or within walking distance. "
-        "Each activity must have the following fields:\n"
-        "- time (in HH:MM format)\n"
-        "- title (short activity name)\n"
-        "- description (1–2 sentences explaining the activity)\n"
-        "- location_name (specific and realistic place)\n\n"
-        "Structure the result as a JSON array of days:\n"
-        "[\n"
-        "  {\n"
-        "    \"day\": 1,\n"
-        "    \"activities\": [\n"
-        "      {\n"
-        "        \"time\": \"08:30\",\n"
-        "        \"title\": \"Visit the Museum\",\n"
-        "        \"description\": \"Explore the ancient exhibits of the local culture.\",\n"
-        "        \"location_name\": \"National Museum\"\n"
-        "      }, ...\n"
-        "    ]\n"
-        "  },\n"
-        "  ...\n"
-        "]\n\n"
+            f"These days are one part of a longer {num_days}-day trip. "
+            f"Focus on places that fit this part of the trip and maintain a logical geographical flow. "
         )
 
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=4000,
-                timeout=200,
-            )
-        except OpenAIError as e:
-            raise HTTPException(status_code=500, detail=str(e))
-
-        full_text = response.choices[0].message.content.strip()
+    prompt += (
+    f"Each day should include at least 5 to 7 activities, covering the full day from morning (~08:00) to evening (~21:00). "
+    "Include a natural mix of experiences: sightseeing, meals, relaxation, nature, culture, local highlights, and transportation if needed. "
+    "Make sure to space out the activities realistically by considering how long it would take to travel between locations. "
+    "Avoid back-to-back activities that are far apart unless they are near each other or within walking distance. "
+    "Each activity must have the following fields:\n"
+    "- time (in HH:MM format)\n"
+    "- title (short activity name)\n"
+    "- description (1–2 sentences explaining the activity)\n"
+    "- location_name (specific and realistic place)\n\n"
+    "Structure the result as a JSON array of days:\n"
+    "[\n"
+    "  {\n"
+    "    \"day\": 1,\n"
+    "    \"activities\": [\n"
+    "      {\n"
+    "        \"time\": \"08:30\",\n"
+    "        \"title\": \"Visit the Museum\",\n"
+    "        \"description\": \"Explore the ancient exhibits of the local culture.\",\n"
+    "        \"location_name\": \"National Museum\"\n"
+    "      }, ...\n"
+    "    ]\n"
+    "  },\n"
+    "  ...\n"
+    "]\n\n"
+    )
 
-        try:
-            print(full_text)
-            chunk_days = json.loads(full_text)
-            for index, day in enumerate(chunk_days):
-                day["day"] = i + index + 1
-                for activity in day.get("activities", []):
-                    loc = activity.get("location_name", "").strip()
-                    if loc:
-                        visited_places.add(loc)
-
-            all_days.extend(chunk_days)
-        except (json.JSONDecodeError, ValueError) as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"AI response error on days {sub_start_day}-{sub_end_day}: {str(e)}"
-            )
+    return prompt
 
-    # חישוב תקציב לפי הטיול המלא
-    day_plans = [
+# AI פענוח תשובת ה  ומספור הימים לפי מיקומם בטיול
+def parse_chunk_days(full_text: str, sub_start_day: int, sub_end_day: int) -> List[dict]:
+    try:
+        chunk_days = json.loads(full_text)
+        for index, day in enumerate(chunk_days):
+            day["day"] = sub_start_day + index
+    except (json.JSONDecodeError, ValueError, TypeError) as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"AI response error on days {sub_start_day}-{sub_end_day}: {str(e)}"
+        )
+
+    return chunk_days
+
+# טווחי הימים שנשלחים ל-AI בכל קריאה
+def get_chunk_ranges(num_days: int) -> List[Tuple[int, int]]:
+    return [
+        (i + 1, min(i + MAX_DAYS_PER_REQUEST, num_days))
+        for i in range(0, num_days, MAX_DAYS_PER_REQUEST)
+    ]
+
+# ולידציה של קלט לתכנון טיול
+def validate_trip_input(destination: str, num_days: int, num_travelers: int):
+    if not destination.strip() or num_days < 1 or num_travelers < 1:
+        raise HTTPException(status_code=400, detail="Invalid input data for trip planning.")
+
+# המרת ימי הטיול לאובייקטים לצורך חישוב תקציב
+def build_day_plans(all_days: List[dict]) -> List[DayPlan]:
+    return [
         DayPlan(
             day=day["day"],
             activities=[
@@ -118,12 +121,143 @@ def custom_trip_plan(destination: str,num_days: int,num_travelers: int,trip_type
         )
         for day in all_days
     ]
-    total_budget = calculate_budget_by_ai(destination, num_days, num_travelers, day_plans)
+
+# AI שליחת פרומפט של טווח ימים ל  ופענוח התשובה
+async def request_chunk(prompt: str, sub_start_day: int, sub_end_day: int) -> List[dict]:
+    try:
+        response = await client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=4000,
+            timeout=200,
+        )
+    except OpenAIError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    full_text = response.choices[0].message.content.strip()
+    return parse_chunk_days(full_text, sub_start_day, sub_end_day)
+
+# AI יצירת טיול
+async def custom_trip_plan(destination: str,num_days: int,num_travelers: int,trip_type: Optional[str] = None) -> Tuple[List[dict], float]:
+    visited_places = set()
+    all_days = []
+
+    validate_trip_input(destination, num_days, num_travelers)
+
+    for sub_start_day, sub_end_day in get_chunk_ranges(num_days):
+        prompt = build_chunk_prompt(destination, num_days, num_travelers, trip_type, sub_start_day, sub_end_day, visited_places)
+        chunk_days = await request_chunk(prompt, sub_start_day, sub_end_day)
+
+        for day in chunk_days:
+            for activity in day.get("activities", []):
+                loc = activity.get("location_name", "").strip()
+                if loc:
+                    visited_places.add(loc)
+
+        all_days.extend(chunk_days)
+
+    # חישוב תקציב לפי הטיול המלא
+    total_budget = await calculate_budget_by_ai(destination, num_days, num_travelers, build_day_plans(all_days))
 
     return all_days, total_budget
 
+# הסרת מקומות שכבר הופיעו בחלקים קודמים מחלק אחד של הטיול
+def reconcile_chunk(chunk_days: List[dict], visited_places: set) -> List[dict]:
+    chunk_places = set()
+    for day in chunk_days:
+        kept_activities = []
+        for activity in day.get("activities", []):
+            loc = activity.get("location_name", "").strip().lower()
+            if loc and loc in visited_places:
+                continue
+            if loc:
+                chunk_places.add(loc)
+            kept_activities.append(activity)
+        day["activities"] = kept_activities
+
+    visited_places |= chunk_places
+    return chunk_days
+
+# איחוד החלקים שנוצרו במקביל והסרת מקומות שכבר הופיעו בחלקים קודמים
+def reconcile_chunks(chunks: List[List[dict]]) -> List[dict]:
+    visited_places = set()
+    all_days = []
+
+    for chunk_days in chunks:
+        all_days.extend(reconcile_chunk(chunk_days, visited_places))
+
+    return all_days
+
+# AI יצירת חלק אחד של הטיול מול ה
+async def generate_chunk(semaphore: asyncio.Semaphore, destination: str, num_days: int, num_travelers: int,
+                         trip_type: Optional[str], sub_start_day: int, sub_end_day: int) -> List[dict]:
+    prompt = build_chunk_prompt(destination, num_days, num_travelers, trip_type, sub_start_day, sub_end_day)
+
+    async with semaphore:
+        return await request_chunk(prompt, sub_start_day, sub_end_day)
+
+# AI יצירת טיול - כל טווחי הימים נשלחים במקביל
+async def custom_trip_plan_parallel(destination: str, num_days: int, num_travelers: int, trip_type: Optional[str] = None) -> Tuple[List[dict], float]:
+    validate_trip_input(destination, num_days, num_travelers)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHUNKS)
+    tasks = [
+        asyncio.create_task(generate_chunk(semaphore, destination, num_days, num_travelers, trip_type, sub_start_day, sub_end_day))
+        for sub_start_day, sub_end_day in get_chunk_ranges(num_days)
+    ]
+
+    try:
+        chunks = await asyncio.gather(*tasks)
+    except BaseException:
+        # אם חלק אחד נכשל - אין טעם להמשיך לחכות לשאר
+        for task in tasks:
+            task.cancel()
+        raise
+
+    all_days = reconcile_chunks(chunks)
+
+    # חישוב תקציב לפי הטיול המלא
+    total_budget = await calculate_budget_by_ai(destination, num_days, num_travelers, build_day_plans(all_days))
+
+    return all_days, total_budget
+
+# AI יצירת טיול בהזרמה - כל יום נשלח ללקוח ברגע שהחלק שלו מוכן
+async def stream_custom_trip_plan(destination: str, num_days: int, num_travelers: int, trip_type: Optional[str] = None) -> AsyncIterator[dict]:
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHUNKS)
+    tasks = [
+        asyncio.create_task(generate_chunk(semaphore, destination, num_days, num_travelers, trip_type, sub_start_day, sub_end_day))
+        for sub_start_day, sub_end_day in get_chunk_ranges(num_days)
+    ]
+    pending = set(tasks)
+    visited_places = set()
+    day_plans = []
+
+    try:
+        # החלקים נוצרים במקביל אבל נשלחים לפי סדר הימים
+        # חלק מאוחר שנכשל עוצר את ההזרמה מיד, בלי לחכות שהחלקים שלפניו יסתיימו
+        for task in tasks:
+            while not task.done():
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    if not finished.cancelled() and finished.exception() is not None:
+                        raise finished.exception()
+            chunk_days = reconcile_chunk(task.result(), visited_places)
+            for day in chunk_days:
+                day_plan = DayPlan.model_validate(day)
+                day_plans.append(day_plan)
+                yield {"type": "day", "day": day_plan.model_dump()}
+
+        total_budget = await calculate_budget_by_ai(destination, num_days, num_travelers, day_plans)
+        yield {"type": "budget", "estimated_budget": total_budget}
+    finally:
+        # אם הלקוח התנתק או שחלק נכשל - מבטלים את מה שעוד רץ ואוספים את כל התוצאות, כדי ששגיאה לא תישאר בלי טיפול
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
 # חישוב תקציב טיול
-def calculate_budget_by_ai(destination: str, num_days: int, num_travelers: int, trip_plan: List[DayPlan]) -> float:
+async def calculate_budget_by_ai(destination: str, num_days: int, num_travelers: int, trip_plan: List[DayPlan]) -> float:
     trip_description = ""
     for day in trip_plan:
         activities_str = ", ".join([activity.title for activity in day.activities])
@@ -138,7 +272,7 @@ def calculate_budget_by_ai(destination: str, num_days: int, num_travelers: int,
         "Please provide ONLY the estimated total cost in USD as a **single number**, without any explanation, text or symbol."
     )
 
-    response = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model="gpt-3.5-turbo",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.2,
@@ -158,9 +292,8 @@ def calculate_budget_by_ai(destination: str, num_days: int, num_travelers: int,
     return 0.0
 
 # טיול לפי מזהה
-def get_trip_by_id_from_backend(trip_id: int):
-    backend_url = f"http://backend:8000/api/trips/{trip_id}"
-    response = requests.get(backend_url)
+async def get_trip_by_id_from_backend(trip_id: int):
+    response = await backend_client.get(f"/api/trips/{trip_id}")
 
     if response.status_code == 200:
         return response.json()  # מחזיר את פרטי הטיול כמילון
@@ -168,9 +301,8 @@ def get_trip_by_id_from_backend(trip_id: int):
         raise Exception("Failed to fetch trip from backend.")
 
 # AI קבלת כל הפעילויות של טיול לפי פורמט להעביר ל 
-def get_trip_plan_from_backend(trip_id: int):
-    backend_url = f"http://backend:8000/api/trips/{trip_id}/activities"
-    response = requests.get(backend_url)
+async def get_trip_plan_from_backend(trip_id: int):
+    response = await backend_client.get(f"/api/trips/{trip_id}/activities")
 
     if response.status_code != 200:
         raise Exception("Failed to fetch trip activities from backend.")
@@ -199,7 +331,7 @@ def get_trip_plan_from_backend(trip_id: int):
     return trip_plan
 
 # צ'אט בוט יועץ טיולים
-def trip_advisor_chat(req: TripAdvisorChatRequest) -> TripAdvisorChatResponse:
+async def trip_advisor_chat(req: TripAdvisorChatRequest) -> TripAdvisorChatResponse:
     prompt = """
 You are Trip Advisor Chat, a conversational assistant that helps users define their travel preferences.
 
@@ -269,7 +401,7 @@ Professional, helpful, conversational. No emojis. No small talk.
 REMEMBER: You help users DECIDE, not recommend. Your questions should guide them to discover their own preferences."""
 
     try:
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": prompt},
@@ -278,6 +410,7 @@ REMEMBER: You help users DECIDE, not recommend. Your questions should guide them
             ],
             temperature=0.1, 
             max_tokens=300,  
+            timeout=30,
         )
     except OpenAIError as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,60 @@
+import pytest
+from unittest.mock import patch
+from app.cache import TripPlanCache
+
+PLAN = {"trip_plan": [{"day": 1, "activities": []}], "estimated_budget": 1200.0}
+
+# פיקסטורת מטמון זמני בתיקייה של הבדיקה
+@pytest.fixture
+def cache(tmp_path):
+    return TripPlanCache(str(tmp_path / "cache.db"), ttl_seconds=60, max_entries=2)
+
+
+# --- make_key ---
+# בדיקה: נרמול היעד וסוג הטיול נותן אותו מפתח
+def test_make_key_normalizes_request():
+    key_a = TripPlanCache.make_key("  Paris ", 3, 2, "City Break", "1")
+    key_b = TripPlanCache.make_key("paris", 3, 2, "city break", "1")
+    assert key_a == key_b
+
+# בדיקה: גרסת פרומפט שונה נותנת מפתח שונה
+def test_make_key_depends_on_prompt_version():
+    assert TripPlanCache.make_key("Paris", 3, 2, None, "1") != TripPlanCache.make_key("Paris", 3, 2, None, "2")
+
+
+# --- get / set ---
+# בדיקה: שמירה ושליפה
+def test_cache_set_and_get(cache):
+    cache.set("k", PLAN)
+    assert cache.get("k") == PLAN
+
+# בדיקה: מפתח שלא קיים
+def test_cache_miss(cache):
+    assert cache.get("missing") is None
+
+# בדיקה: רשומה שפג תוקפה לא מוחזרת
+def test_cache_entry_expires(cache):
+    with patch("app.cache.time.time", return_value=1000.0):
+        cache.set("k", PLAN)
+    with patch("app.cache.time.time", return_value=1061.0):
+        assert cache.get("k") is None
+
+# בדיקה: הרשומה שלא נקראה הכי הרבה זמן נמחקת
+def test_cache_evicts_least_recently_used(cache):
+    with patch("app.cache.time.time", return_value=1.0):
+        cache.set("a", PLAN)
+    with patch("app.cache.time.time", return_value=2.0):
+        cache.set("b", PLAN)
+    with patch("app.cache.time.time", return_value=3.0):
+        cache.get("a")
+    with patch("app.cache.time.time", return_value=4.0):
+        cache.set("c", PLAN)
+        assert cache.get("b") is None
+        assert cache.get("a") == PLAN
+        assert cache.get("c") == PLAN
+
+# בדיקה: המטמון נשמר בין מופעים (הפעלה מחדש)
+def test_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    TripPlanCache(path, ttl_seconds=60, max_entries=10).set("k", PLAN)
+    assert TripPlanCache(path, ttl_seconds=60, max_entries=10).get("k") == PLAN
@@ -0,0 +1,98 @@
+import json
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+from app import routes
+from app.cache import TripPlanCache
+from app.schemas import TripRequest
+from app.main import app
+
+DAY = {"day": 1, "activities": [{"time": "09:00", "title": "Museum", "description": "Visit", "location_name": "Center"}]}
+TRIP = {"destination": "Paris", "num_days": 1, "num_travelers": 2, "trip_type": "City Break"}
+
+client = TestClient(app)
+
+# מטמון זמני בתיקייה של הבדיקה במקום המטמון של השירות
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    cache = TripPlanCache(str(tmp_path / "cache.db"), ttl_seconds=60, max_entries=10)
+    monkeypatch.setattr(routes, "trip_cache", cache)
+    return cache
+
+
+# --- create_custom_trip ---
+# בקשה חוזרת מוחזרת מהמטמון בלי לפנות ל-AI
+def test_custom_trip_served_from_cache():
+    with patch("app.services.custom_trip_plan", new_callable=AsyncMock, return_value=([DAY], 1000.0)) as mock_plan:
+        first = client.post("/trip-ai/custom-trip", json=TRIP)
+        second = client.post("/trip-ai/custom-trip", json={**TRIP, "destination": "  paris "})
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert second.json() == first.json()
+    assert mock_plan.await_count == 1
+
+# fresh=true מדלג על המטמון ומעדכן אותו בטיול החדש
+def test_custom_trip_fresh_refreshes_cache():
+    with patch("app.services.custom_trip_plan", new_callable=AsyncMock, return_value=([DAY], 1000.0)) as mock_plan:
+        client.post("/trip-ai/custom-trip", json=TRIP)
+        mock_plan.return_value = ([DAY], 2000.0)
+        fresh = client.post("/trip-ai/custom-trip", json={**TRIP, "fresh": True})
+        cached = client.post("/trip-ai/custom-trip", json=TRIP)
+
+    assert fresh.json()["estimated_budget"] == 2000.0
+    assert cached.json()["estimated_budget"] == 2000.0
+    assert mock_plan.await_count == 2
+
+# טיול שנכשל לא נשמר במטמון
+def test_custom_trip_error_not_cached(cache):
+    with patch("app.services.custom_trip_plan", new_callable=AsyncMock, side_effect=HTTPException(status_code=500, detail="AI error")):
+        response = client.post("/trip-ai/custom-trip", json=TRIP)
+
+    assert response.status_code == 500
+    assert cache.get(routes.get_cache_key(TripRequest(**TRIP))) is None
+
+
+# --- stream_custom_trip ---
+# שגיאה באמצע ההזרמה נשלחת כאירוע error אחרי הימים שכבר נשלחו, והטיול לא נשמר במטמון
+def test_stream_custom_trip_error_event(cache):
+    async def stream(**kwargs):
+        yield {"type": "day", "day": DAY}
+        raise HTTPException(status_code=500, detail="AI error")
+
+    with patch("app.services.stream_custom_trip_plan", side_effect=stream):
+        response = client.post("/trip-ai/custom-trip/stream", json=TRIP)
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"type": "day", "day": DAY},
+        {"type": "error", "detail": "AI error"},
+    ]
+    assert cache.get(routes.get_cache_key(TripRequest(**TRIP))) is None
+
+# טיול מהמטמון נשלח באותו פורמט בלי לפנות ל-AI
+def test_stream_custom_trip_replays_cache(cache):
+    cache.set(routes.get_cache_key(TripRequest(**TRIP)), {"trip_plan": [DAY], "estimated_budget": 1000.0})
+
+    with patch("app.services.stream_custom_trip_plan") as mock_stream:
+        response = client.post("/trip-ai/custom-trip/stream", json=TRIP)
+
+    mock_stream.assert_not_called()
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"type": "day", "day": DAY},
+        {"type": "budget", "estimated_budget": 1000.0},
+    ]
+
+# הזרמה שהסתיימה נשמרת במטמון, ו-fresh=true מדלג עליו
+def test_stream_custom_trip_caches_result(cache):
+    async def stream(**kwargs):
+        yield {"type": "day", "day": DAY}
+        yield {"type": "budget", "estimated_budget": 1500.0}
+
+    with patch("app.services.stream_custom_trip_plan", side_effect=stream) as mock_stream:
+        client.post("/trip-ai/custom-trip/stream", json=TRIP)
+        client.post("/trip-ai/custom-trip/stream", json=TRIP)
+        client.post("/trip-ai/custom-trip/stream", json={**TRIP, "fresh": True})
+
+    assert mock_stream.call_count == 2
+    assert cache.get(routes.get_cache_key(TripRequest(**TRIP))) == {"trip_plan": [DAY], "estimated_budget": 1500.0}
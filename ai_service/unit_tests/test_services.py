@@ -1,7 +1,9 @@
+import asyncio
 import pytest
 from fastapi import HTTPException
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from app.services import custom_trip_plan, calculate_budget_by_ai, get_trip_plan_from_backend
+from app.services import custom_trip_plan_parallel, reconcile_chunks, stream_custom_trip_plan
 from app.schemas import DayPlan, ActivityItem
 
 # --- calculate_budget_by_ai ---
@@ -10,9 +12,9 @@ def test_calculate_budget_success():
     trip_plan = [
         DayPlan(day=1, activities=[ActivityItem(time="08:00", title="A", description="...", location_name="X")])
     ]
-    with patch("app.services.client.chat.completions.create") as mock_create:
+    with patch("app.services.client.chat.completions.create", new_callable=AsyncMock) as mock_create:
         mock_create.return_value.choices = [MagicMock(message=MagicMock(content="1500"))]
-        budget = calculate_budget_by_ai("Paris", 5, 2, trip_plan)
+        budget = asyncio.run(calculate_budget_by_ai("Paris", 5, 2, trip_plan))
         assert isinstance(budget, float) and budget > 0
 
 # OpenAIError בדיקה: נזרקת חריגה מתאימה עבור 
@@ -20,14 +22,14 @@ def test_calculate_budget_openai_error():
     trip_plan = [
         DayPlan(day=1, activities=[])
     ]
-    with patch("app.services.client.chat.completions.create", side_effect=Exception("error")):
+    with patch("app.services.client.chat.completions.create", new_callable=AsyncMock, side_effect=Exception("error")):
         with pytest.raises(Exception):
-            calculate_budget_by_ai("Paris", 5, 2, trip_plan)
+            asyncio.run(calculate_budget_by_ai("Paris", 5, 2, trip_plan))
 
 # (num_travelers = 0) → HTTPException בדיקה: קלט שגוי 
 def test_calculate_budget_invalid_input():
     with pytest.raises(HTTPException):
-        custom_trip_plan(destination="Paris", num_days=3, num_travelers=0)
+        asyncio.run(custom_trip_plan(destination="Paris", num_days=3, num_travelers=0))
 
 
 # --- get_trip_plan_from_backend ---
@@ -36,29 +38,29 @@ def test_get_trip_plan_success():
     fake_response = [
         {"day_number": 1, "time": "08:00", "title": "Visit", "description": "desc", "location_name": "Museum"}
     ]
-    with patch("app.services.requests.get") as mock_get:
-        mock_get.return_value.status_code = 200
+    with patch("app.services.backend_client.get", new_callable=AsyncMock) as mock_get:
+        mock_get.return_value = MagicMock(status_code=200)
         mock_get.return_value.json.return_value = fake_response
-        result = get_trip_plan_from_backend(1)
+        result = asyncio.run(get_trip_plan_from_backend(1))
         assert isinstance(result, list)
         assert isinstance(result[0], DayPlan)
 
 # בדיקה: קלט ריק מחזיר רשימה ריקה
 def test_get_trip_plan_empty():
-    with patch("app.services.requests.get") as mock_get:
-        mock_get.return_value.status_code = 200
+    with patch("app.services.backend_client.get", new_callable=AsyncMock) as mock_get:
+        mock_get.return_value = MagicMock(status_code=200)
         mock_get.return_value.json.return_value = []
-        result = get_trip_plan_from_backend(1)
+        result = asyncio.run(get_trip_plan_from_backend(1))
         assert result == []
 
 # בדיקה: קלט עם שדות חסרים לא קורס
 def test_get_trip_plan_missing_fields():
     incomplete_response = [{"day_number": 2, "title": "Only title"}]
-    with patch("app.services.requests.get") as mock_get:
-        mock_get.return_value.status_code = 200
+    with patch("app.services.backend_client.get", new_callable=AsyncMock) as mock_get:
+        mock_get.return_value = MagicMock(status_code=200)
         mock_get.return_value.json.return_value = incomplete_response
         try:
-            get_trip_plan_from_backend(1)
+            asyncio.run(get_trip_plan_from_backend(1))
         except Exception:
             pass
 
@@ -66,29 +68,29 @@ def test_get_trip_plan_missing_fields():
 # --- custom_trip_plan ---
 # בדיקה: תכנון תקין עם קלטים תקינים
 def test_custom_trip_plan_success():
-    with patch("app.services.client.chat.completions.create") as mock_create, \
-         patch("app.services.calculate_budget_by_ai", return_value=1000.0):
+    with patch("app.services.client.chat.completions.create", new_callable=AsyncMock) as mock_create, \
+         patch("app.services.calculate_budget_by_ai", new_callable=AsyncMock, return_value=1000.0):
         mock_create.return_value.choices = [MagicMock(message=MagicMock(content='[{"day":1,"activities":[]}]\n'))]
-        days, budget = custom_trip_plan("Paris", 1, 2)
+        days, budget = asyncio.run(custom_trip_plan("Paris", 1, 2))
         assert isinstance(days, list)
         assert isinstance(budget, float)
 
 # בדיקה: מספר ימים לא חוקי
 def test_custom_trip_plan_invalid_days():
     with pytest.raises(HTTPException):
-        custom_trip_plan("Paris", 0, 2)
+        asyncio.run(custom_trip_plan("Paris", 0, 2))
 
 # בדיקה: טקסט ריק
 def test_custom_trip_plan_empty_text():
     with pytest.raises(HTTPException):
-        custom_trip_plan("", 3, 2)
+        asyncio.run(custom_trip_plan("", 3, 2))
 
 # trip_type בדיקה: חסר  
 def test_custom_trip_plan_missing_optional_field():
-    with patch("app.services.client.chat.completions.create") as mock_create, \
-         patch("app.services.calculate_budget_by_ai", return_value=1000.0):
+    with patch("app.services.client.chat.completions.create", new_callable=AsyncMock) as mock_create, \
+         patch("app.services.calculate_budget_by_ai", new_callable=AsyncMock, return_value=1000.0):
         mock_create.return_value.choices = [MagicMock(message=MagicMock(content='[{"day":1,"activities":[]}]\n'))]
-        days, budget = custom_trip_plan("Rome", 1, 1, trip_type=None)
+        days, budget = asyncio.run(custom_trip_plan("Rome", 1, 1, trip_type=None))
         assert isinstance(days, list)
         assert isinstance(budget, float)
 
@@ -97,7 +99,92 @@ def test_custom_trip_plan_missing_optional_field():
 # AI בדיקה: קבלת קלט לא תקין מ
 def test_custom_trip_plan_with_malformed_json():
     malformed_json = '[{"day": 1, "activities": [INVALID]}]'
-    with patch("app.services.client.chat.completions.create") as mock_create:
+    with patch("app.services.client.chat.completions.create", new_callable=AsyncMock) as mock_create:
         mock_create.return_value.choices = [MagicMock(message=MagicMock(content=malformed_json))]
         with pytest.raises(HTTPException):
-            custom_trip_plan("Berlin", 1, 2)
+            asyncio.run(custom_trip_plan("Berlin", 1, 2))
+
+
+# --- custom_trip_plan_parallel ---
+# בדיקה: כל החלקים נשלחים ומספור הימים נשמר לפי הסדר
+def test_custom_trip_plan_parallel_success():
+    chunk = '[' + ','.join(['{"day":1,"activities":[]}'] * 10) + ']'
+    with patch("app.services.client.chat.completions.create", new_callable=AsyncMock) as mock_create, \
+         patch("app.services.calculate_budget_by_ai", new_callable=AsyncMock, return_value=2000.0):
+        mock_create.return_value.choices = [MagicMock(message=MagicMock(content=chunk))]
+        days, budget = asyncio.run(custom_trip_plan_parallel("Tokyo", 30, 2))
+        assert mock_create.await_count == 3
+        assert [day["day"] for day in days] == list(range(1, 31))
+        assert budget == 2000.0
+
+# בדיקה: קלט לא חוקי
+def test_custom_trip_plan_parallel_invalid_input():
+    with pytest.raises(HTTPException):
+        asyncio.run(custom_trip_plan_parallel("Tokyo", 0, 2))
+
+# AI בדיקה: שגיאה באחד החלקים מחזירה שגיאת 
+def test_custom_trip_plan_parallel_malformed_json():
+    with patch("app.services.client.chat.completions.create", new_callable=AsyncMock) as mock_create:
+        mock_create.return_value.choices = [MagicMock(message=MagicMock(content="[INVALID]"))]
+        with pytest.raises(HTTPException):
+            asyncio.run(custom_trip_plan_parallel("Tokyo", 12, 2))
+
+
+# --- reconcile_chunks ---
+# בדיקה: מקום שכבר הופיע בחלק קודם מוסר מהחלקים הבאים
+def test_reconcile_chunks_removes_repeated_places():
+    chunks = [
+        [{"day": 1, "activities": [{"location_name": "Senso-ji"}, {"location_name": "Ueno Park"}]}],
+        [{"day": 2, "activities": [{"location_name": "senso-ji "}, {"location_name": "Shibuya"}]}],
+    ]
+    days = reconcile_chunks(chunks)
+    assert [act["location_name"] for act in days[1]["activities"]] == ["Shibuya"]
+
+# בדיקה: חזרה על מקום באותו חלק נשמרת
+def test_reconcile_chunks_keeps_repeats_within_chunk():
+    chunks = [
+        [
+            {"day": 1, "activities": [{"location_name": "Hotel"}]},
+            {"day": 2, "activities": [{"location_name": "Hotel"}]},
+        ]
+    ]
+    days = reconcile_chunks(chunks)
+    assert len(days[1]["activities"]) == 1
+
+
+# --- stream_custom_trip_plan ---
+# בדיקה: הימים נשלחים לפי הסדר ואחריהם אירוע תקציב
+def test_stream_custom_trip_plan_events():
+    chunk = '[' + ','.join(['{"day":1,"activities":[]}'] * 10) + ']'
+
+    async def collect():
+        return [event async for event in stream_custom_trip_plan("Tokyo", 20, 2)]
+
+    with patch("app.services.client.chat.completions.create", new_callable=AsyncMock) as mock_create, \
+         patch("app.services.calculate_budget_by_ai", new_callable=AsyncMock, return_value=1500.0):
+        mock_create.return_value.choices = [MagicMock(message=MagicMock(content=chunk))]
+        events = asyncio.run(collect())
+
+    assert [event["day"]["day"] for event in events[:-1]] == list(range(1, 21))
+    assert events[-1] == {"type": "budget", "estimated_budget": 1500.0}
+
+# בדיקה: חלק מאוחר שנכשל עוצר את ההזרמה מיד ומבטל את החלקים שעוד רצים
+def test_stream_custom_trip_plan_later_chunk_fails_fast():
+    cancelled = []
+
+    async def request_chunk(prompt, sub_start_day, sub_end_day):
+        if sub_start_day == 1:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(sub_start_day)
+                raise
+        raise HTTPException(status_code=500, detail="AI error")
+
+    async def collect():
+        return [event async for event in stream_custom_trip_plan("Tokyo", 20, 2)]
+
+    with patch("app.services.request_chunk", side_effect=request_chunk):
+        with pytest.raises(HTTPException):
+            asyncio.run(asyncio.wait_for(collect(), timeout=5))
+    assert cancelled == [1]
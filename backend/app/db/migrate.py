@@ -0,0 +1,129 @@
+# הרצת מיגרציות של מבנה ה-DB עם Alembic
+# Alembic מוגדר כאן בקוד ולא בקובץ alembic.ini, כך שאותן הגדרות משמשות את הבדיקות ואת שורת הפקודה
+# השרת עצמו לא מריץ DDL - המיגרציות רצות לפני הפריסה עם: python -m app.db.migrate upgrade
+
+import os
+import argparse
+from alembic import command, op
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import inspect, text
+from app.db.database import engine as default_engine
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+
+# הגרסה שמתארת את מבנה ה-DB כפי שנוצר ב-create_all לפני שהיו מיגרציות
+BASELINE_REVISION = "0001_baseline"
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", 5000))  # כמה שורות מתעדכנות בכל commit במילוי עמודה בטבלה גדולה
+
+# הגדרות Alembic שמשתמשות בחיבור קיים
+def get_alembic_config(connection=None) -> Config:
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    config.attributes["connection"] = connection
+    return config
+
+# זיהוי הגרסה של DB שנוצר ב-create_all לפי העמודות שכבר קיימות בטבלת הטיולים
+def detect_unversioned_revision(connection) -> str:
+    columns = {column["name"] for column in inspect(connection).get_columns("trips")}
+    if "search_vector" in columns:
+        return "0003_trip_search"
+    if "rating_sum" in columns:
+        return "0002_trip_aggregates"
+    return BASELINE_REVISION
+
+# שדרוג ה-DB לגרסה האחרונה
+# DB שנוצר לפני המיגרציות (יש טבלאות אבל אין alembic_version) מסומן קודם לפי המבנה שלו
+# כל מיגרציה רצה בטרנזקציה משלה, כדי שמיגרציה עם autocommit_block (אינדקס CONCURRENTLY) תוכל לסגור אותה
+def run_migrations(engine=None, revision: str = "head"):
+    engine = engine or default_engine
+    with engine.begin() as connection:
+        tables = inspect(connection).get_table_names()
+        if "trips" in tables and "alembic_version" not in tables:
+            command.stamp(get_alembic_config(connection), detect_unversioned_revision(connection))
+    with engine.connect() as connection:
+        command.upgrade(get_alembic_config(connection), revision)
+        connection.commit()
+
+# החזרת ה-DB לגרסה קודמת
+def downgrade_migrations(revision: str, engine=None):
+    engine = engine or default_engine
+    with engine.connect() as connection:
+        command.downgrade(get_alembic_config(connection), revision)
+        connection.commit()
+
+# הגרסה הנוכחית של ה-DB
+def current_revision(engine=None):
+    engine = engine or default_engine
+    with engine.connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision()
+
+# יצירת אינדקס בלי לנעול כתיבה לטבלה - ב-Postgres עם CREATE INDEX CONCURRENTLY מחוץ לטרנזקציה
+def create_index_online(name: str, table: str, columns: list, **kwargs):
+    if op.get_bind().dialect.name != "postgresql":
+        op.create_index(name, table, columns, **kwargs)
+        return
+    with op.get_context().autocommit_block():
+        # אינדקס שנשאר INVALID מהרצה שנכשלה נמחק ונבנה מחדש
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        op.create_index(name, table, columns, postgresql_concurrently=True, **kwargs)
+
+# מחיקת אינדקס בלי לנעול את הטבלה
+def drop_index_online(name: str, table: str):
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index(name, table_name=table)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+# מילוי עמודה לשורות קיימות בקבוצות לפי טווחי id, כל קבוצה ב-commit משלה
+# כך אין טרנזקציה אחת ארוכה שנועלת את כל השורות של הטבלה, כמו ביצירת אינדקס ב-CONCURRENTLY
+def backfill_in_batches(table: str, set_clause: str, batch_size: int = None):
+    batch_size = batch_size or MIGRATION_BATCH_SIZE
+    bind = op.get_bind()
+    low, high = bind.execute(text(f"SELECT min(id), max(id) FROM {table}")).one()
+    if low is None:
+        return
+
+    def run_batches():
+        for start in range(low, high + 1, batch_size):
+            bind.execute(
+                text(f"UPDATE {table} SET {set_clause} WHERE id >= :start AND id < :end"),
+                {"start": start, "end": start + batch_size},
+            )
+
+    if bind.dialect.name != "postgresql":
+        run_batches()
+        return
+    with op.get_context().autocommit_block():
+        run_batches()
+
+# אילוץ ייחודיות בלי לנעול את הטבלה - ב-Postgres האינדקס נבנה קודם ב-CONCURRENTLY והאילוץ נצמד אליו
+def create_unique_constraint_online(name: str, table: str, columns: list):
+    if op.get_bind().dialect.name != "postgresql":
+        with op.batch_alter_table(table) as batch:
+            batch.create_unique_constraint(name, columns)
+        return
+    create_index_online(name, table, columns, unique=True)
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}")
+
+# שורת הפקודה: upgrade [revision] / downgrade <revision> / current
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.db.migrate", description="PlanNGo database migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    upgrade = commands.add_parser("upgrade", help="upgrade the database (default: head)")
+    upgrade.add_argument("revision", nargs="?", default="head")
+    downgrade = commands.add_parser("downgrade", help="downgrade the database to a revision")
+    downgrade.add_argument("revision")
+    commands.add_parser("current", help="print the current revision")
+    args = parser.parse_args(argv)
+
+    if args.command == "upgrade":
+        run_migrations(revision=args.revision)
+    elif args.command == "downgrade":
+        downgrade_migrations(args.revision)
+    print(current_revision())
+
+if __name__ == "__main__":
+    main()
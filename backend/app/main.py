@@ -2,9 +2,9 @@
 # FastAPI קובץ זה אחראי על הפעלת השרת ומגדיר את 
 
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.db.database import Base, engine
-from app.db.database import create_all_tables
 from fastapi.staticfiles import StaticFiles
 from app.routes import auth
 from app.routes import trip
@@ -15,15 +15,34 @@ from app.routes import favorite
 from app.routes import email
 from app.routes import calendar
 from app.routes import ai
-from app.services.email_service import start_reminder_scheduler
+from app.routes import user
+from app.services import ai_service
+from app.services.scheduler_service import start_background_scheduler
+from app.services.mail_queue_service import start_mail_workers
 from app.models.user_model import User
 from app.models.trip_model import Trip
 from app.models.activity_model import Activity
 from app.models.favorite_model import FavoriteTrip, FavoriteRecommendedTrip
 from app.models.rating_model import Rating
 from app.models.comment_model import Comment
+from app.models.outbound_email_model import OutboundEmail
+from app.models.scheduled_job_model import ScheduledJob
 
-app = FastAPI()
+# פתיחת החיבור המשותף לשירות ה-AI, תזמון התזכורות ושולחי המיילים בעליית השרת, וסגירתם בכיבוי
+# עליית השרת לא מריצה DDL - המיגרציות רצות לפני הפריסה (python -m app.db.migrate upgrade)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ai_service.start_ai_client()
+    scheduler = start_background_scheduler()
+    mail_workers = start_mail_workers()
+    yield
+    if scheduler:
+        scheduler.shutdown(wait=False)
+    if mail_workers:
+        mail_workers.stop()
+    await ai_service.close_ai_client()
+
+app = FastAPI(lifespan=lifespan)
 
 # auth מחבר את הנתיבים שתחת 
 app.include_router(auth.router, prefix="/api")
@@ -52,11 +71,8 @@ app.include_router(calendar.router, prefix="/api")
 # AI מחבר את הנתיבים שתחת
 app.include_router(ai.router, prefix="/api")
 
-# פונקציית התראה כמה ימים לפני שטיול מתחיל
-start_reminder_scheduler()
-
-# יוצר טבלאות אם לא קיימות
-create_all_tables()
+# users מחבר את הנתיבים שתחת
+app.include_router(user.router, prefix="/api")
 
 # יצירת תיקיית static אם לא קיימת
 static_dir = os.path.join(os.path.dirname(__file__), "static")
@@ -0,0 +1,26 @@
+# סביבת ההרצה של Alembic - מקבלת חיבור מ-app.db.migrate או פותחת חיבור לפי DATABASE_URL
+
+from alembic import context
+from app.db.database import Base, engine
+import app.models  # noqa: F401 - רישום כל הטבלאות ב-metadata
+
+target_metadata = Base.metadata
+
+# הרצה עם חיבור פתוח
+def run_with_connection(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == "sqlite",  # SQLite לא תומך ב-ALTER מלא
+        transaction_per_migration=True,  # מיגרציה עם autocommit_block לא מבטלת את מה שרץ לפניה
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+connection = context.config.attributes.get("connection")
+if connection is not None:
+    run_with_connection(connection)
+else:
+    with engine.connect() as connection:
+        run_with_connection(connection)
+        connection.commit()
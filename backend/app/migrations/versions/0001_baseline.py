@@ -0,0 +1,95 @@
+"""baseline schema - the tables as they were created by create_all before migrations
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("password", sa.String(), nullable=False),
+        sa.Column("is_admin", sa.Boolean(), nullable=True),
+        sa.Column("profile_image_url", sa.String(), nullable=True),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "trips",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("destination", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("is_recommended", sa.Boolean(), nullable=True),
+        sa.Column("duration_days", sa.Integer(), nullable=True),
+        sa.Column("start_date", sa.Date(), nullable=True),
+        sa.Column("end_date", sa.Date(), nullable=True),
+        sa.Column("image_url", sa.String(), nullable=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("share_uuid", postgresql.UUID(as_uuid=True), nullable=False, unique=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index("ix_trips_id", "trips", ["id"])
+
+    op.create_table(
+        "activities",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id"), nullable=True),
+        sa.Column("day_number", sa.Integer(), nullable=True),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("time", sa.Time(), nullable=True),
+        sa.Column("location_name", sa.String(), nullable=True),
+    )
+    op.create_index("ix_activities_id", "activities", ["id"])
+
+    op.create_table(
+        "ratings",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id", ondelete="CASCADE"), nullable=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=True),
+        sa.Column("rating", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("trip_id", "user_id", name="unique_trip_user_rating"),
+    )
+    op.create_index("ix_ratings_id", "ratings", ["id"])
+
+    op.create_table(
+        "comments",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id"), nullable=False),
+    )
+    op.create_index("ix_comments_id", "comments", ["id"])
+
+    for table in ("favorite_trips", "favorite_recommended_trips"):
+        op.create_table(
+            table,
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id"), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index(f"ix_{table}_id", table, ["id"])
+
+
+def downgrade():
+    for table in ("favorite_recommended_trips", "favorite_trips", "comments", "ratings", "activities", "trips", "users"):
+        op.drop_table(table)
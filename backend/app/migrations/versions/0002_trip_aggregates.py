@@ -0,0 +1,46 @@
+"""rating and favorite counters on trips, backfilled from the ratings and favorites tables
+
+Revision ID: 0002_trip_aggregates
+Revises: 0001_baseline
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from app.db.migrate import create_index_online, drop_index_online
+
+revision = "0002_trip_aggregates"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+RATING_SCORE = "coalesce(CAST(rating_sum AS FLOAT) / CAST(nullif(rating_count, 0) AS FLOAT), 0)"
+
+
+def upgrade():
+    with op.batch_alter_table("trips") as batch:
+        batch.add_column(sa.Column("rating_sum", sa.Integer(), nullable=False, server_default="0"))
+        batch.add_column(sa.Column("rating_count", sa.Integer(), nullable=False, server_default="0"))
+        batch.add_column(sa.Column("favorite_count", sa.Integer(), nullable=False, server_default="0"))
+
+    op.execute("""
+        UPDATE trips SET
+            rating_sum = coalesce((SELECT sum(ratings.rating) FROM ratings WHERE ratings.trip_id = trips.id), 0),
+            rating_count = (SELECT count(ratings.id) FROM ratings WHERE ratings.trip_id = trips.id),
+            favorite_count =
+                (SELECT count(favorite_trips.id) FROM favorite_trips WHERE favorite_trips.trip_id = trips.id)
+                + (SELECT count(favorite_recommended_trips.id) FROM favorite_recommended_trips
+                   WHERE favorite_recommended_trips.trip_id = trips.id)
+    """)
+
+    create_index_online("ix_trips_rating_score", "trips", ["is_recommended", sa.text(RATING_SCORE), "id"])
+    create_index_online("ix_trips_favorite_count", "trips", ["is_recommended", "favorite_count", "id"])
+
+
+def downgrade():
+    drop_index_online("ix_trips_favorite_count", "trips")
+    drop_index_online("ix_trips_rating_score", "trips")
+    with op.batch_alter_table("trips") as batch:
+        batch.drop_column("favorite_count")
+        batch.drop_column("rating_count")
+        batch.drop_column("rating_sum")
@@ -0,0 +1,70 @@
+"""full-text search vector on trips and trigram index on usernames (postgres only)
+
+Revision ID: 0003_trip_search
+Revises: 0002_trip_aggregates
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from app.db.migrate import backfill_in_batches, create_index_online, drop_index_online
+
+revision = "0003_trip_search"
+down_revision = "0002_trip_aggregates"
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION trips_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.destination, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE TRIGGER trips_search_vector_trigger
+BEFORE INSERT OR UPDATE OF title, destination, description ON trips
+FOR EACH ROW EXECUTE FUNCTION trips_search_vector_update()
+"""
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        # ב-SQLite החיפוש רץ על אינדקס בזיכרון ועמודת הווקטור נשארת ריקה
+        with op.batch_alter_table("trips") as batch:
+            batch.add_column(sa.Column("search_vector", sa.Text(), nullable=True))
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column("trips", sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True))
+    op.execute(SEARCH_VECTOR_FUNCTION)
+    op.execute(SEARCH_VECTOR_TRIGGER)
+    # עדכון ריק מפעיל את ה-trigger וממלא את הווקטור לטיולים הקיימים - בקבוצות, בלי לנעול את כל הטבלה
+    backfill_in_batches("trips", "title = title")
+    create_index_online("ix_trips_search_vector", "trips", ["search_vector"], postgresql_using="gin")
+    create_index_online(
+        "ix_users_username_trgm",
+        "users",
+        ["username"],
+        postgresql_using="gin",
+        postgresql_ops={"username": "gin_trgm_ops"},
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        # DROP COLUMN ישיר ולא batch - בניית הטבלה מחדש הייתה מאבדת את אינדקס הביטוי של הדירוג
+        op.execute("ALTER TABLE trips DROP COLUMN search_vector")
+        return
+
+    drop_index_online("ix_users_username_trgm", "users")
+    drop_index_online("ix_trips_search_vector", "trips")
+    op.execute("DROP TRIGGER IF EXISTS trips_search_vector_trigger ON trips")
+    op.execute("DROP FUNCTION IF EXISTS trips_search_vector_update()")
+    op.drop_column("trips", "search_vector")
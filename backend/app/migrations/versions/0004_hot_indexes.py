@@ -0,0 +1,56 @@
+"""composite indexes for the hot filter/sort paths and unique favorites per user
+
+Revision ID: 0004_hot_indexes
+Revises: 0003_trip_search
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+from app.db.migrate import create_index_online, create_unique_constraint_online, drop_index_online
+
+revision = "0004_hot_indexes"
+down_revision = "0003_trip_search"
+branch_labels = None
+depends_on = None
+
+FAVORITE_TABLES = ("favorite_trips", "favorite_recommended_trips")
+
+INDEXES = (
+    ("ix_activities_trip_day_time", "activities", ["trip_id", "day_number", "time"]),
+    ("ix_trips_user_created", "trips", ["user_id", "created_at"]),
+    ("ix_trips_recommended_created", "trips", ["is_recommended", "created_at"]),
+    ("ix_trips_start_date", "trips", ["start_date"]),
+    ("ix_comments_trip_created", "comments", ["trip_id", "created_at"]),
+)
+
+
+def upgrade():
+    # מחיקת מועדפים כפולים (נשאר הראשון) לפני הוספת האילוץ הייחודי
+    for table in FAVORITE_TABLES:
+        op.execute(f"""
+            DELETE FROM {table} WHERE id NOT IN (
+                SELECT min(id) FROM {table} GROUP BY user_id, trip_id
+            )
+        """)
+    op.execute(f"""
+        UPDATE trips SET favorite_count =
+            (SELECT count(id) FROM {FAVORITE_TABLES[0]} WHERE {FAVORITE_TABLES[0]}.trip_id = trips.id)
+            + (SELECT count(id) FROM {FAVORITE_TABLES[1]} WHERE {FAVORITE_TABLES[1]}.trip_id = trips.id)
+    """)
+
+    for table in FAVORITE_TABLES:
+        create_unique_constraint_online(f"uq_{table}_user_trip", table, ["user_id", "trip_id"])
+        create_index_online(f"ix_{table}_trip_id", table, ["trip_id"])
+
+    for name, table, columns in INDEXES:
+        create_index_online(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        drop_index_online(name, table)
+
+    for table in reversed(FAVORITE_TABLES):
+        drop_index_online(f"ix_{table}_trip_id", table)
+        with op.batch_alter_table(table) as batch:
+            batch.drop_constraint(f"uq_{table}_user_trip", type_="unique")
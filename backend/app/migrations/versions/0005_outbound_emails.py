@@ -0,0 +1,38 @@
+"""durable outbound mail queue
+
+Revision ID: 0005_outbound_emails
+Revises: 0004_hot_indexes
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_outbound_emails"
+down_revision = "0004_hot_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "outbound_emails",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("to_email", sa.String(), nullable=False),
+        sa.Column("subject", sa.String(), nullable=False),
+        sa.Column("body_html", sa.Text(), nullable=False),
+        sa.Column("attachment_name", sa.String(), nullable=True),
+        sa.Column("attachment_content", sa.LargeBinary(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("sent_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_outbound_emails_id", "outbound_emails", ["id"])
+    op.create_index("ix_outbound_emails_status_next_attempt", "outbound_emails", ["status", "next_attempt_at"])
+
+
+def downgrade():
+    op.drop_table("outbound_emails")
@@ -0,0 +1,27 @@
+"""time of the last reminder email per trip, so the reminder job can be rerun safely
+
+Revision ID: 0006_trip_reminded_at
+Revises: 0005_outbound_emails
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_trip_reminded_at"
+down_revision = "0005_outbound_emails"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("trips") as batch:
+        batch.add_column(sa.Column("reminded_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    # DROP COLUMN ישיר ולא batch - בניית הטבלה מחדש ב-SQLite הייתה מאבדת את אינדקס הביטוי של הדירוג
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("ALTER TABLE trips DROP COLUMN reminded_at")
+    else:
+        op.drop_column("trips", "reminded_at")
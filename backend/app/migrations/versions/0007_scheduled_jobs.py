@@ -0,0 +1,33 @@
+"""scheduled job leases and run history
+
+Revision ID: 0007_scheduled_jobs
+Revises: 0006_trip_reminded_at
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007_scheduled_jobs"
+down_revision = "0006_trip_reminded_at"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "scheduled_jobs",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("lease_owner", sa.String(), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_duration_seconds", sa.Float(), nullable=True),
+        sa.Column("last_status", sa.String(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("run_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade():
+    op.drop_table("scheduled_jobs")
@@ -0,0 +1,27 @@
+"""content revision per trip, bumped on every change to the trip or its activities
+
+Revision ID: 0008_trip_revision
+Revises: 0007_scheduled_jobs
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008_trip_revision"
+down_revision = "0007_scheduled_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("trips") as batch:
+        batch.add_column(sa.Column("revision", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade():
+    # DROP COLUMN ישיר ולא batch - בניית הטבלה מחדש ב-SQLite הייתה מאבדת את אינדקס הביטוי של הדירוג
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("ALTER TABLE trips DROP COLUMN revision")
+    else:
+        op.drop_column("trips", "revision")
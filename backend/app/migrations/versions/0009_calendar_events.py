@@ -0,0 +1,33 @@
+"""mapping between synced Google Calendar events and trip days / activities
+
+Revision ID: 0009_calendar_events
+Revises: 0008_trip_revision
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009_calendar_events"
+down_revision = "0008_trip_revision"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "calendar_events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("calendar_id", sa.String(), nullable=False),
+        sa.Column("item_key", sa.String(), nullable=False),
+        sa.Column("google_event_id", sa.String(), nullable=False),
+        sa.Column("content_hash", sa.String(), nullable=False),
+        sa.Column("synced_at", sa.DateTime(timezone=True), nullable=True),
+        sa.UniqueConstraint("trip_id", "calendar_id", "item_key", name="uq_calendar_events_trip_item"),
+    )
+    op.create_index("ix_calendar_events_id", "calendar_events", ["id"])
+
+
+def downgrade():
+    op.drop_table("calendar_events")
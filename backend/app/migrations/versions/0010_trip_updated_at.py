@@ -0,0 +1,29 @@
+"""last modification time per trip, for Last-Modified on the trip endpoints
+
+Revision ID: 0010_trip_updated_at
+Revises: 0009_calendar_events
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010_trip_updated_at"
+down_revision = "0009_calendar_events"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("trips") as batch:
+        batch.add_column(sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True))
+    # טיולים קיימים - הזמן האחרון שידוע עליו הוא זמן היצירה
+    op.execute("UPDATE trips SET updated_at = created_at")
+
+
+def downgrade():
+    # DROP COLUMN ישיר ולא batch - בניית הטבלה מחדש ב-SQLite הייתה מאבדת את אינדקס הביטוי של הדירוג
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("ALTER TABLE trips DROP COLUMN updated_at")
+    else:
+        op.drop_column("trips", "updated_at")
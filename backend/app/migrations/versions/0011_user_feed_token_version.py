@@ -0,0 +1,24 @@
+"""calendar feed token version per user, bumped to revoke leaked feed URLs
+
+Revision ID: 0011_user_feed_token_version
+Revises: 0010_trip_updated_at
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0011_user_feed_token_version"
+down_revision = "0010_trip_updated_at"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("users") as batch:
+        batch.add_column(sa.Column("feed_token_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade():
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("feed_token_version")
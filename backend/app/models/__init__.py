@@ -4,3 +4,6 @@ from .user_model import User
 from .comment_model import Comment
 from .activity_model import Activity
 from .favorite_model import FavoriteTrip, FavoriteRecommendedTrip
+from .outbound_email_model import OutboundEmail
+from .scheduled_job_model import ScheduledJob
+from .calendar_event_model import CalendarEvent
@@ -1,7 +1,7 @@
 # DB יוצר טבלת פעילויות ב 
 
 from datetime import time
-from sqlalchemy import Column, Integer, String, ForeignKey, Time
+from sqlalchemy import Column, Integer, String, ForeignKey, Time, Index
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 
@@ -17,3 +17,6 @@ class Activity(Base):
     location_name = Column(String)                     # שם המקום שבו מתבצעת הפעילות
     
     trips = relationship("Trip", back_populates="activities") # קשר הפוך עם הטיול שאליו שייכת הפעילות
+
+    # שליפת הפעילויות של טיול ממוינות לפי יום ושעה מתוך האינדקס
+    __table_args__ = (Index("ix_activities_trip_day_time", "trip_id", "day_number", "time"),)
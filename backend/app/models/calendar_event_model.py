@@ -0,0 +1,23 @@
+# DB יוצר טבלת מיפוי בין אירועים ביומן גוגל לטיולים ולפעילויות ב
+# לפי המיפוי סנכרון חוזר שולח רק את מה שהשתנה ולא יוצר אירועים כפולים
+
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+from app.db.database import Base
+
+class CalendarEvent(Base):
+    __tablename__ = "calendar_events"
+
+    id = Column(Integer, primary_key=True, index=True)                 # מזהה המיפוי
+    trip_id = Column(Integer, ForeignKey("trips.id", ondelete="CASCADE"), nullable=False)  # הטיול שהאירוע שייך לו
+    calendar_id = Column(String, nullable=False, default="primary")    # היומן בגוגל
+    item_key = Column(String, nullable=False)                          # מה האירוע מייצג - day:<מספר יום> או activity:<מזהה פעילות>
+    google_event_id = Column(String, nullable=False)                   # מזהה האירוע ביומן גוגל
+    content_hash = Column(String, nullable=False)                      # hash של תוכן האירוע שנשלח - אירוע שלא השתנה לא נשלח שוב
+    synced_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))  # הסנכרון האחרון
+
+    trips = relationship("Trip", back_populates="calendar_events") # קשר הפוך עם הטיול
+
+    # אירוע אחד לכל יום או פעילות בכל יומן
+    __table_args__ = (UniqueConstraint("trip_id", "calendar_id", "item_key", name="uq_calendar_events_trip_item"),)
@@ -1,6 +1,6 @@
 # DB יוצר טבלת תגובות ב 
 
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from app.db.database import Base
@@ -16,3 +16,6 @@ class Comment(Base):
 
     users = relationship("User", back_populates="comments")
     trips = relationship("Trip", back_populates="comments")
+
+    # התגובות של טיול ממוינות לפי זמן יצירה
+    __table_args__ = (Index("ix_comments_trip_created", "trip_id", "created_at"),)
@@ -1,7 +1,7 @@
 # DB יוצר טבלת טיולים מועדפים וטבלת טיולים מומלצים מועדפים ב 
 
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, UniqueConstraint, Index
 from app.db.database import Base
 from sqlalchemy.orm import relationship
 
@@ -15,6 +15,12 @@ class FavoriteTrip(Base):
     users = relationship("User", back_populates="favorite_trips")
     trips = relationship("Trip", back_populates="favorite_trips")
 
+    # משתמש יכול לסמן טיול כמועדף פעם אחת בלבד; האינדקס על trip_id משמש לספירה ולמחיקה לפי טיול
+    __table_args__ = (
+        UniqueConstraint("user_id", "trip_id", name="uq_favorite_trips_user_trip"),
+        Index("ix_favorite_trips_trip_id", "trip_id"),
+    )
+
 class FavoriteRecommendedTrip(Base):
     __tablename__ = "favorite_recommended_trips"
     id = Column(Integer, primary_key=True, index=True)
@@ -23,4 +29,9 @@ class FavoriteRecommendedTrip(Base):
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
     
     users = relationship("User", back_populates="favorite_recommended_trips")
-    trips = relationship("Trip", back_populates="favorite_recommended_trips")
\ No newline at end of file
+    trips = relationship("Trip", back_populates="favorite_recommended_trips")
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "trip_id", name="uq_favorite_recommended_trips_user_trip"),
+        Index("ix_favorite_recommended_trips_trip_id", "trip_id"),
+    )
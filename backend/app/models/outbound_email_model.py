@@ -0,0 +1,24 @@
+# DB יוצר טבלת תור מיילים יוצאים ב
+
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, Text, DateTime, LargeBinary, Index
+from app.db.database import Base
+
+class OutboundEmail(Base):
+    __tablename__ = "outbound_emails"
+
+    id = Column(Integer, primary_key=True, index=True)               # מזהה המייל בתור
+    to_email = Column(String, nullable=False)                        # כתובת הנמען
+    subject = Column(String, nullable=False)                         # נושא המייל
+    body_html = Column(Text, nullable=False)                         # תוכן המייל (HTML)
+    attachment_name = Column(String, nullable=True)                  # שם הקובץ המצורף (רשות)
+    attachment_content = Column(LargeBinary, nullable=True)          # תוכן הקובץ המצורף
+    status = Column(String, nullable=False, default="pending", server_default="pending")  # pending / sending / sent / failed
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")             # מספר ניסיונות השליחה
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))  # מתי מותר לנסות שוב
+    last_error = Column(Text, nullable=True)                         # השגיאה האחרונה בשליחה
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))  # זמן הכניסה לתור
+    sent_at = Column(DateTime(timezone=True), nullable=True)         # זמן השליחה בפועל
+
+    # שליפת המיילים הבאים לשליחה לפי סטטוס וזמן
+    __table_args__ = (Index("ix_outbound_emails_status_next_attempt", "status", "next_attempt_at"),)
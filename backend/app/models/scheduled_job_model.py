@@ -0,0 +1,18 @@
+# DB יוצר טבלת מצב של משימות מתוזמנות ב
+# כל שורה היא גם "חכירה" - רק תהליך שמחזיק בה מריץ את המשימה, גם כשיש כמה workers או כמה שרתים
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float
+from app.db.database import Base
+
+class ScheduledJob(Base):
+    __tablename__ = "scheduled_jobs"
+
+    name = Column(String, primary_key=True)                       # שם המשימה
+    lease_owner = Column(String, nullable=True)                   # התהליך שמריץ את המשימה כרגע
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)  # עד מתי החכירה תקפה (אחרי זה תהליך אחר יכול לקחת)
+    last_started_at = Column(DateTime(timezone=True), nullable=True)   # תחילת ההרצה האחרונה
+    last_finished_at = Column(DateTime(timezone=True), nullable=True)  # סיום ההרצה האחרונה
+    last_duration_seconds = Column(Float, nullable=True)          # משך ההרצה האחרונה בשניות
+    last_status = Column(String, nullable=True)                   # running / succeeded / failed
+    last_error = Column(Text, nullable=True)                      # השגיאה בהרצה האחרונה שנכשלה
+    run_count = Column(Integer, nullable=False, default=0, server_default="0")  # מספר ההרצות שהסתיימו
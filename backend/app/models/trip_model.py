@@ -1,10 +1,12 @@
 # DB יוצר טבלת טיולים ב 
 
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Boolean, Text, DateTime, func
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, Boolean, Text, DateTime, Float, Index, DDL, cast, event, func, inspect, literal_column
+from sqlalchemy.orm import relationship, deferred, Session
+from sqlalchemy.ext.hybrid import hybrid_property
 from app.db.database import Base
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
 import uuid
+from datetime import datetime, timezone
 
 class Trip(Base):
     __tablename__ = "trips"
@@ -21,6 +23,13 @@ class Trip(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # מזהה המשתמש שיצר את הטיול (רק בטיולים אישיים)
     share_uuid = Column(UUID(as_uuid=True), default=uuid.uuid4, unique=True, nullable=False) # מזהה לשיתוף
     created_at = Column(DateTime(timezone=True), server_default=func.now()) # תאריך יצירת הטיול
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")      # סכום הדירוגים - מתעדכן בכל דירוג
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")    # מספר הדירוגים
+    favorite_count = Column(Integer, nullable=False, default=0, server_default="0")  # מספר המשתמשים שסימנו את הטיול כמועדף
+    reminded_at = Column(DateTime(timezone=True), nullable=True)  # מתי נשלחה התזכורת האחרונה על הטיול
+    revision = Column(Integer, nullable=False, default=1, server_default="1")  # גרסת הטיול - עולה בכל שינוי בטיול או בפעילויות שלו
+    updated_at = Column(DateTime(timezone=True), nullable=True, default=lambda: datetime.now(timezone.utc))  # זמן השינוי האחרון - מתעדכן יחד עם revision
+    search_vector = deferred(Column(TSVECTOR().with_variant(Text(), "sqlite"), nullable=True)) # וקטור חיפוש - מתעדכן ב-trigger בלבד
 
     users = relationship("User", back_populates="trips") # קשר הפוך למשתמש שיצר את הטיול
     activities = relationship("Activity", back_populates="trips", cascade="all, delete") # קשר הפוך עם פעילויות בטיול
@@ -28,3 +37,85 @@ class Trip(Base):
     comments = relationship("Comment", back_populates="trips", cascade="all, delete") # קשר הפוך עם תגובות בטיול
     favorite_trips = relationship("FavoriteTrip", back_populates="trips", cascade="all, delete") # קשר הפוך עם טיולים מועדפים
     favorite_recommended_trips = relationship("FavoriteRecommendedTrip", back_populates="trips", cascade="all, delete") # קשר הפוך עם טיולים מומלצים מועדפים
+    calendar_events = relationship("CalendarEvent", back_populates="trips", cascade="all, delete") # קשר הפוך עם האירועים שסונכרנו ליומן
+
+    # מפתח מיון לפי דירוג ממוצע - טיול בלי דירוגים מקבל 0 ולכן מגיע אחרון
+    @hybrid_property
+    def rating_score(self):
+        return self.rating_sum / self.rating_count if self.rating_count else 0
+
+    @rating_score.expression
+    def rating_score(cls):
+        # קבועים כטקסט ולא כפרמטרים, כדי שהביטוי בשאילתה יהיה זהה לביטוי באינדקס
+        zero = literal_column("0")
+        return func.coalesce(cast(cls.rating_sum, Float) / func.nullif(cls.rating_count, zero, type_=Float), zero)
+
+# אינדקסים למיון טיולים לפי דירוג ולפי מועדפים בלי לסרוק את טבלאות הדירוגים והמועדפים
+Index("ix_trips_rating_score", Trip.is_recommended, Trip.rating_score, Trip.id)
+Index("ix_trips_favorite_count", Trip.is_recommended, Trip.favorite_count, Trip.id)
+# אינדקסים לסינון ולמיון של רשימות הטיולים: טיולים של משתמש, טיולים מומלצים, וטיולים שמתחילים בקרוב
+Index("ix_trips_user_created", Trip.user_id, Trip.created_at)
+Index("ix_trips_recommended_created", Trip.is_recommended, Trip.created_at)
+Index("ix_trips_start_date", Trip.start_date)
+Index("ix_trips_search_vector", Trip.search_vector, postgresql_using="gin").ddl_if(dialect="postgresql")
+
+# trigger שמחשב את וקטור החיפוש בכל הוספה או עדכון של טקסט הטיול
+# משקלים: A כותרת, B יעד, C תיאור - כך אפשר לחפש בכל שדה בנפרד ולדרג לפי רלוונטיות
+TRIP_SEARCH_VECTOR_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION trips_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.destination, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+""")
+
+TRIP_SEARCH_VECTOR_TRIGGER = DDL("""
+CREATE TRIGGER trips_search_vector_trigger
+BEFORE INSERT OR UPDATE OF title, destination, description ON trips
+FOR EACH ROW EXECUTE FUNCTION trips_search_vector_update()
+""")
+
+event.listen(Trip.__table__, "after_create", TRIP_SEARCH_VECTOR_FUNCTION.execute_if(dialect="postgresql"))
+event.listen(Trip.__table__, "after_create", TRIP_SEARCH_VECTOR_TRIGGER.execute_if(dialect="postgresql"))
+
+# עמודות שהשינוי בהן לא משנה את תוכן הטיול - כולל מוני הדירוגים והמועדפים
+REVISION_IGNORED_COLUMNS = {"revision", "updated_at", "reminded_at", "search_vector", "rating_sum", "rating_count", "favorite_count"}
+
+# האם השתנתה עמודה בטיול שמשפיעה על התוכן שלו
+def _trip_content_changed(trip: Trip) -> bool:
+    state = inspect(trip)
+    return any(
+        attr.history.has_changes()
+        for attr in state.attrs
+        if attr.key in Trip.__table__.columns and attr.key not in REVISION_IGNORED_COLUMNS
+    )
+
+# העלאת revision ועדכון updated_at של כל טיול שהוא או אחת הפעילויות שלו השתנו ב-flush הנוכחי
+# ההעלאה היא ביטוי SQL (revision + 1) ולכן נכונה גם כששתי בקשות מעדכנות את אותו טיול במקביל
+@event.listens_for(Session, "before_flush")
+def bump_trip_revisions(session, flush_context, instances):
+    from app.models.activity_model import Activity
+
+    trips = {trip for trip in session.dirty if isinstance(trip, Trip) and _trip_content_changed(trip)}
+    trip_ids = set()
+    for activity in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(activity, Activity) or (activity in session.dirty and not session.is_modified(activity)):
+            continue
+        trip = activity.__dict__.get("trips")
+        trip_ids.add(trip.id if trip is not None else activity.trip_id)
+        trip_ids.update(inspect(activity).attrs.trip_id.history.deleted)  # פעילות שהועברה לטיול אחר
+
+    with session.no_autoflush:
+        for trip_id in trip_ids - {None}:
+            trip = session.get(Trip, trip_id)
+            if trip is not None:
+                trips.add(trip)
+
+    for trip in trips:
+        if trip not in session.new and trip not in session.deleted:
+            trip.revision = Trip.revision + 1
+            trip.updated_at = datetime.now(timezone.utc)
@@ -1,6 +1,6 @@
 # DB יוצר טבלת משתמשים ב
 
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import Column, Integer, String, Boolean, Index, DDL, event
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 
@@ -13,9 +13,20 @@ class User(Base):
     password = Column(String, nullable=False) # סיסמת המשתמש (מוצפנת)
     is_admin = Column(Boolean, default=False) # האם המשתמש הוא מנהל (True) או משתמש רגיל (False)
     profile_image_url = Column(String, nullable=True) # תמונת פרופיל של המשתמש 
+    feed_token_version = Column(Integer, nullable=False, default=0, server_default="0") # גרסת טוקן פיד היומן - העלאה שלה מבטלת את כל כתובות הפיד הקודמות
 
     trips = relationship("Trip", back_populates="users") # קשר הפוך לטיולים שיצר המשתמש
     ratings = relationship("Rating", back_populates="users") # קשר הפוך לדירוגים שיצר המשתמש
     comments = relationship("Comment", back_populates="users", cascade="all, delete") # קשר הפוך לתגובות שיצר המשתמש
     favorite_trips = relationship("FavoriteTrip", back_populates="users", cascade="all, delete") # קשר הפוך לטיולים מועדפים של המשתמש
-    favorite_recommended_trips = relationship("FavoriteRecommendedTrip", back_populates="users", cascade="all, delete") # קשר הפוך לטיולים מומלצים מועדפים של המשתמש
\ No newline at end of file
+    favorite_recommended_trips = relationship("FavoriteRecommendedTrip", back_populates="users", cascade="all, delete") # קשר הפוך לטיולים מומלצים מועדפים של המשתמש
+
+# אינדקס trigram לחיפוש חלקי בשם המשתמש (ILIKE '%...%')
+Index(
+    "ix_users_username_trgm",
+    User.username,
+    postgresql_using="gin",
+    postgresql_ops={"username": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql")
+
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
@@ -1,28 +1,47 @@
 # שקשורים לפעילויות - קבלה, יצירה, עדכון, מחיקה API נתיבי
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response, Header
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.db.database import get_db
+from app.models.trip_model import Trip
 from app.schemas.activity_schema import ActivityCreate, ActivityOut, ActivityUpdate
-from app.services import activity_service
-from app.models.user_model import User
-from app.services.token_service import get_current_user 
+from app.services import activity_service, http_cache_service
+from app.services.token_service import Principal, get_current_principal
 
 router = APIRouter(
     prefix="/trips",
     tags=["Activities"]
 )
 
-# שליפת כל הפעילויות בטיול
+# שליפת כל הפעילויות בטיול - ה-ETag לפי הגרסה של הטיול, ו-304 בלי לשלוף את הפעילויות
 @router.get("/{trip_id}/activities", response_model=List[ActivityOut])
-def get_activities(trip_id: int, db: Session = Depends(get_db)):
-    return activity_service.get_activities_by_trip(db, trip_id)
+def get_activities(
+    trip_id: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None)
+):
+    trip = db.query(Trip).filter(Trip.id == trip_id).first()
+    return http_cache_service.trip_response(
+        trip, response, lambda: activity_service.get_activities_by_trip(db, trip_id), if_none_match, if_modified_since
+    )
 
 # שליפת כל הפעילויות ביום מסוים בטיול
 @router.get("/{trip_id}/activities/day/{day_number}", response_model=List[ActivityOut])
-def get_activities_by_day(trip_id: int, day_number: int, db: Session = Depends(get_db)):
-    return activity_service.get_activities_by_trip_and_day(db, trip_id, day_number)
+def get_activities_by_day(
+    trip_id: int,
+    day_number: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None)
+):
+    trip = db.query(Trip).filter(Trip.id == trip_id).first()
+    return http_cache_service.trip_response(
+        trip, response, lambda: activity_service.get_activities_by_trip_and_day(db, trip_id, day_number), if_none_match, if_modified_since
+    )
 
 # יצירת פעילות חדשה בטיול
 @router.post("/{trip_id}/activities", response_model=ActivityOut)
@@ -30,7 +49,7 @@ def create_activity(
     trip_id: int,
     activity: ActivityCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)):
+    current_user: Principal = Depends(get_current_principal)):
     return activity_service.create_activity(db, activity, trip_id, current_user)
 
 # עדכון פעילות לפי מזהה
@@ -39,7 +58,7 @@ def update_activity(
     activity_id: int,
     updated_data: ActivityUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)):
+    current_user: Principal = Depends(get_current_principal)):
     return activity_service.update_activity(db, activity_id, updated_data, current_user)
 
 # מחיקת פעילות לפי מזהה
@@ -47,5 +66,5 @@ def update_activity(
 def delete_activity(
     activity_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)):
+    current_user: Principal = Depends(get_current_principal)):
     return activity_service.delete_activity(db, activity_id, current_user)
@@ -3,14 +3,15 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.db.database import get_db
-from app.models.user_model import User
 from app.services import admin_service
 from typing import List
 from app.schemas.user_schema import UserOut
 from app.schemas.trip_schema import TripCreate, TripOut
+from app.schemas.job_schema import ScheduledJobOut
+from app.services import scheduler_service
 from app.services import admin_service
 from app.services.admin_service import admin_required
-from app.services.token_service import get_current_user
+from app.services.token_service import Principal
 
 router = APIRouter(
     prefix="/admin",
@@ -19,12 +20,12 @@ router = APIRouter(
 
 # קבלת כל המשתמשים
 @router.get("/users", response_model=List[UserOut])
-def get_all_users(db: Session = Depends(get_db), current_user: User = Depends(admin_required)):
+def get_all_users(db: Session = Depends(get_db), current_user: Principal = Depends(admin_required)):
     return admin_service.get_all_users(db)
 
 # מחיקת משתמש
 @router.delete("/users/{user_id}", response_model=UserOut)
-def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(admin_required)):
+def delete_user(user_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(admin_required)):
     return admin_service.delete_user(db, user_id)
 
 # יצירת טיול מומלץ
@@ -32,7 +33,7 @@ def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User
 def create_recommended_trip(
     trip_data: TripCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(admin_required)):
+    current_user: Principal = Depends(admin_required)):
     return admin_service.admin_create_recommended_trip(trip_data, db)
 
 # עדכון טיול מומלץ
@@ -41,7 +42,7 @@ def update_recommended_trip(
     trip_id: int,
     trip_data: dict,
     db: Session = Depends(get_db),
-    current_user: User = Depends(admin_required)):
+    current_user: Principal = Depends(admin_required)):
     return admin_service.admin_update_recommended_trip(trip_id, trip_data, db)
 
 # מחיקת טיול מומלץ
@@ -49,15 +50,25 @@ def update_recommended_trip(
 def delete_recommended_trip(
     trip_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(admin_required)):
+    current_user: Principal = Depends(admin_required)):
     return admin_service.admin_delete_recommended_trip(trip_id, db)
 
 # סימון טיול כמומלץ
 @router.post("/recommended/convert/{trip_id}", response_model=TripOut)
-def mark_trip_as_recommended(trip_id: int, db: Session = Depends(get_db), current_user: User = Depends(admin_required)):
+def mark_trip_as_recommended(trip_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(admin_required)):
     return admin_service.recommend_trip(trip_id, db, current_user)
 
 # קבלת טיולים של משתמש
 @router.get("/users/{user_id}/trips", response_model=List[TripOut])
 def admin_get_user_trips(user_id: int, db: Session = Depends(get_db)):
-    return admin_service.get_trips_by_user_id(user_id, db)
\ No newline at end of file
+    return admin_service.get_trips_by_user_id(user_id, db)
+
+# מצב המשימות המתוזמנות - הרצה אחרונה, משך ותוצאה
+@router.get("/jobs", response_model=List[ScheduledJobOut])
+def get_scheduled_jobs(db: Session = Depends(get_db), current_user: Principal = Depends(admin_required)):
+    return scheduler_service.get_job_statuses(db)
+
+# מדדי ביצועים של השרת - מאגר הצפנת הסיסמאות
+@router.get("/metrics")
+def get_metrics(current_user: Principal = Depends(admin_required)):
+    return admin_service.get_service_metrics()
@@ -1,6 +1,7 @@
 # AI שקשורים ל API נתיבי
 
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from app.services import ai_service
 from app.schemas.ai_schema import TripRequestAI, TripAdvisorChatRequest, TripAdvisorChatResponse
 
@@ -8,20 +9,29 @@ router = APIRouter(prefix="/ai", tags=["AI Services"])
 
 @router.post("/custom-trip")
 async def create_custom_trip_via_ai(trip_request: TripRequestAI):
-    result = ai_service.create_custom_trip_ai(trip_request.model_dump())
+    result = await ai_service.create_custom_trip_ai(trip_request.model_dump())
     return result
 
+# הזרמת טיול AI - כל יום מועבר ללקוח ברגע שנוצר (NDJSON)
+@router.post("/custom-trip/stream")
+async def stream_custom_trip_via_ai(trip_request: TripRequestAI):
+    stream = await ai_service.stream_custom_trip_ai(trip_request.model_dump())
+    return StreamingResponse(
+        stream,
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/calculate-budget/{trip_id}")
-def calculate_budget_via_ai(trip_id: int, num_travelers: int):
-    print("ai-route")
-    result = ai_service.calculate_budget_ai(trip_id, num_travelers)
+async def calculate_budget_via_ai(trip_id: int, num_travelers: int):
+    result = await ai_service.calculate_budget_ai(trip_id, num_travelers)
     return result
 
 @router.get("/trip-types")
-def trip_types():
-    return ai_service.get_trip_types()
+async def trip_types():
+    return await ai_service.get_trip_types()
 
 @router.post("/trip-advisor-chat", response_model=TripAdvisorChatResponse)
-def trip_advisor_chat_via_ai(req: TripAdvisorChatRequest):
-    result = ai_service.trip_advisor_chat_ai(req.model_dump())
+async def trip_advisor_chat_via_ai(req: TripAdvisorChatRequest):
+    result = await ai_service.trip_advisor_chat_ai(req.model_dump())
     return result
@@ -36,7 +36,7 @@ def read_current_user(current_user: User = Depends(get_current_user)):
     return current_user
 
 # לאיפוס סיסמה API נתיב 
-@router.post("/forgot-password")
+@router.post("/forgot-password", status_code=202)
 def forgot_password(request: ForgotPasswordRequest,db: Session = Depends(get_db)):
     return auth_service.handle_forgot_password(request.email, db)
 
@@ -10,19 +10,19 @@ from app.schemas.ai_schema import AiTripSummaryRequest
 router = APIRouter(prefix="/emails", tags=["Emails"])
 
 # שליחת סיכום טיול
-@router.get("/send-trip-summary/{trip_id}")
+@router.get("/send-trip-summary/{trip_id}", status_code=202)
 def send_trip_summary(trip_id: int, db: Session = Depends(get_db)):
     email_service.send_trip_summary_by_trip_id(trip_id, db)
-    return {"message": f"Trip summary sent successfully!"}
+    return {"message": f"Trip summary will be sent shortly!"}
 
 # שליחת סיכום טיול מומלץ
-@router.post("/send-recommended-summary/{trip_id}")
+@router.post("/send-recommended-summary/{trip_id}", status_code=202)
 def send_recommended_trip_summary(trip_id: int, request: SendSummaryRequest, db: Session = Depends(get_db)):
     email_service.send_recommended_trip_summary(trip_id=trip_id, recipient_email=request.email, db=db)
-    return {"message": f"Trip summary sent to {request.email}!"}
+    return {"message": f"Trip summary will be sent to {request.email} shortly!"}
 
 # AI שליחת סיכום טיול 
-@router.post("/send-ai-summary")
-def send_ai_trip_summary(request: AiTripSummaryRequest):
-    email_service.send_ai_trip_summary_by_data(request)
-    return {"message": f"AI trip summary sent to {request.email}!"}
+@router.post("/send-ai-summary", status_code=202)
+def send_ai_trip_summary(request: AiTripSummaryRequest, db: Session = Depends(get_db)):
+    email_service.send_ai_trip_summary_by_data(request, db)
+    return {"message": f"AI trip summary will be sent to {request.email} shortly!"}
@@ -6,8 +6,7 @@ from typing import List
 from app.db.database import get_db
 from app.services import favorite_service
 from app.schemas.trip_schema import TripOut
-from app.services.token_service import get_current_user
-from app.models.user_model import User
+from app.services.token_service import Principal, get_current_principal
 from fastapi.responses import JSONResponse
 
 router = APIRouter(prefix="/favorites", tags=["Favorites"])
@@ -16,7 +15,7 @@ router = APIRouter(prefix="/favorites", tags=["Favorites"])
 @router.get("/trips", response_model=List[TripOut])
 def get_all_favorite_trips(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)):
+    current_user: Principal = Depends(get_current_principal)):
     return favorite_service.get_all_favorites(current_user, db)
 
 # הוספה או הסרה של טיול ממועדפים
@@ -24,7 +23,7 @@ def get_all_favorite_trips(
 def add_or_remove_favorite_trip(
     trip_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)):
+    current_user: Principal = Depends(get_current_principal)):
     return favorite_service.toggle_favorite_trip(trip_id=trip_id, user=current_user, db=db)
 
 # בדיקה האם טיול נמצא במועדפים
@@ -32,7 +31,7 @@ def add_or_remove_favorite_trip(
 def check_trip_favorite_status(
     trip_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)):
+    current_user: Principal = Depends(get_current_principal)):
     is_fav = favorite_service.is_trip_favorite(current_user, trip_id, db)
     return JSONResponse(content={"is_favorite": is_fav})
 
@@ -40,7 +39,7 @@ def check_trip_favorite_status(
 @router.get("/recommended", response_model=List[TripOut])
 def get_all_recommended_favorite_trips(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)):
+    current_user: Principal = Depends(get_current_principal)):
     return favorite_service.get_all_recommended_favorites(current_user, db)
 
 # הוספה או הסרה של טיול מומלץ ממועדפים
@@ -48,7 +47,7 @@ def get_all_recommended_favorite_trips(
 def add_or_remove_favorite_recommended_trip(
     trip_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)):
+    current_user: Principal = Depends(get_current_principal)):
     return favorite_service.toggle_favorite_recommended_trip(trip_id=trip_id, user=current_user, db=db)
 
 # בדיקה האם טיול מומלץ נמצא במועדפים
@@ -56,6 +55,6 @@ def add_or_remove_favorite_recommended_trip(
 def check_recommended_trip_favorite_status(
     trip_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)):
+    current_user: Principal = Depends(get_current_principal)):
     is_fav = favorite_service.is_recommended_trip_favorite(current_user, trip_id, db)
     return JSONResponse(content={"is_favorite": is_fav})
@@ -1,44 +1,57 @@
 # שקשורים למומלצים - קבלה וסימון כמומלץ API נתיבי
 
-from fastapi import APIRouter, Depends, Query, status, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, Query, status, HTTPException, Response, Header
+from sqlalchemy.orm import Session
 from uuid import UUID
-from typing import List
+from typing import List, Optional
 from app.db.database import get_db
-from app.models.user_model import User
 from app.schemas.trip_schema import AiTripCloneRequest
 from app.schemas.trip_schema import TripOut, SharedTripOut, TripPaginatedResponse
 from app.models.trip_model import Trip
-from app.services.token_service import get_current_user
-from app.services import recommend_service
+from app.services.token_service import Principal, get_current_principal
+from app.services import recommend_service, http_cache_service
 from app.schemas.rating_schema import RateTripRequest
 from app.schemas.comment_schema import CommentCreate, CommentResponse
 
 router = APIRouter(prefix="/recommended",tags=["Recommended Trips"])
 
-# צפייה רק בטיולים מומלצים
+# צפייה רק בטיולים מומלצים - 304 אם אף טיול מומלץ לא השתנה (חוץ ממיון random)
 @router.get("/", response_model=TripPaginatedResponse)
 def get_recommended_trips(
+    response: Response,
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1),
-    sort_by: str = Query("recent", enum=["recent", "top_rated", "favorites", "random"])
+    sort_by: str = Query("recent", enum=["recent", "top_rated", "favorites", "random"]),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    if_none_match: Optional[str] = Header(None)
 ):
-    return recommend_service.get_recommended_trips(db, sort_by, page, limit)
+    return recommend_service.listing_response(
+        db, response, sort_by, if_none_match,
+        lambda version: recommend_service.get_cached_recommended_trips(db, sort_by, page, limit, cursor, include_total, version),
+    )
 
 # חיפוש טיולים מומלצים
 @router.get("/search")
 def search_recommended_trips(
+    response: Response,
     title: str = "",
     description: str = "",
     destination: str = "",
     page: int = 1,
     limit: int = 10,
     sort_by: str = "recent",
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
 ):
-    return recommend_service.handle_search_recommended_trips(
-        title, description, destination, db, page, limit, sort_by
+    return recommend_service.listing_response(
+        db, response, sort_by, if_none_match,
+        lambda version: recommend_service.get_cached_search_results(
+            title, description, destination, db, page, limit, sort_by, cursor, include_total, version
+        ),
     )
 
 # דירוג טיול מומלץ
@@ -46,7 +59,7 @@ def search_recommended_trips(
 def rate_recommended_trip(
     trip_id: int,
     rating_data: RateTripRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)):
     return recommend_service.rate_trip(trip_id, rating_data, current_user, db)
 
@@ -56,7 +69,7 @@ def create_comment_for_recommend_trip(
     trip_id: int,
     comment_data: CommentCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)):
+    current_user: Principal = Depends(get_current_principal)):
     return recommend_service.add_comment_to_trip(trip_id=trip_id, user=current_user, comment_data=comment_data, db=db)
 
 # קבלת כל התגובות לטיול מומלץ
@@ -64,13 +77,13 @@ def create_comment_for_recommend_trip(
 def get_comments_for_recommended_trip(
     trip_id: int,
     db: Session = Depends(get_db)):
-    return recommend_service.get_comments_for_trip(trip_id=trip_id, db=db)
+    return recommend_service.get_cached_comments_for_trip(trip_id=trip_id, db=db)
 
 # מחיקת תגובה לטיול מומלץ
 @router.delete("/comments/{comment_id}")
 def delete_comment_of_recommend_trip(
     comment_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)):
     return recommend_service.delete_comment(comment_id=comment_id, current_user=current_user, db=db)
 
@@ -82,15 +95,21 @@ def share_a_recommended_trip(trip_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Recommended trip not found")
     return {"share_link": f"http://localhost:3000/shared/recommended/{trip.share_uuid}"}
 
-# צפייה בטיול ששותף
+# צפייה בטיול ששותף - הפעילויות נטענות רק אם אין ללקוח כבר את הגרסה הזו
 @router.get("/shared-recommended-trip/{share_uuid}", response_model=SharedTripOut)
-def view_shared_recommended_trip(share_uuid: UUID, db: Session = Depends(get_db)):
-    trip = db.query(Trip).options(joinedload(Trip.activities)).filter_by(share_uuid=share_uuid, is_recommended=True).first()
+def view_shared_recommended_trip(
+    share_uuid: UUID,
+    response: Response,
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None)
+):
+    trip = db.query(Trip).filter_by(share_uuid=share_uuid, is_recommended=True).first()
     if not trip:
         raise HTTPException(status_code=404, detail="Shared recommended trip not found")
-    return trip
+    return http_cache_service.trip_response(trip, response, lambda: trip, if_none_match, if_modified_since, public=True)
 
 # לטיולים מומלצים AI העברת טיול 
 @router.post("/clone-ai-trip", response_model=TripOut)
-def clone_ai_trip_to_recommended(request: AiTripCloneRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def clone_ai_trip_to_recommended(request: AiTripCloneRequest, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     return recommend_service.import_ai_trip_as_recommended(request, db)
@@ -1,16 +1,16 @@
 # שקשורים לטיולים - קבלה, יצירה, עדכון, מחיקה API נתיבי
 
-from fastapi import APIRouter, Depends, status, Query, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, status, Query, HTTPException, Response, Header
+from sqlalchemy.orm import Session
 from uuid import UUID
-from typing import List
+from urllib.parse import quote
+from typing import List, Optional
 from app.db.database import get_db
 from app.schemas.trip_schema import AiTripCloneRequest
-from app.schemas.trip_schema import TripCreate, TripOut, TripUpdate, SharedTripOut, TripPaginatedResponse
-from app.services import trip_service
-from app.models.user_model import User
+from app.schemas.trip_schema import TripCreate, TripOut, TripUpdate, SharedTripOut, TripPaginatedResponse, TripFullOut
+from app.services import trip_service, summary_service, ics_service, http_cache_service
 from app.models.trip_model import Trip
-from app.services.token_service import get_current_user
+from app.services.token_service import Principal, get_current_principal, get_optional_current_principal
 
 router = APIRouter(prefix="/trips",tags=["Trips"])
 
@@ -18,12 +18,14 @@ router = APIRouter(prefix="/trips",tags=["Trips"])
 @router.get("/", response_model=TripPaginatedResponse)
 def get_all_my_trips(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1),
-    sort_by: str = Query("recent", enum=["recent", "random", "start_soonest"])
+    sort_by: str = Query("recent", enum=["recent", "random", "start_soonest"]),
+    cursor: Optional[str] = None,
+    include_total: bool = True
 ):
-    return trip_service.get_trips(db, current_user.id, sort_by, page, limit)
+    return trip_service.get_trips(db, current_user.id, sort_by, page, limit, cursor, include_total)
 
 # חיפוש טיולים
 @router.get("/search")
@@ -35,55 +37,94 @@ def search_trips(
     page: int = 1,
     limit: int = 10,
     sort_by: str = "recent",
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     db: Session = Depends(get_db)
 ):
     return trip_service.handle_search_trips(
-        title, description, destination, creator_name, db, page, limit, sort_by
+        title, description, destination, creator_name, db, page, limit, sort_by, cursor, include_total
     )
     
-# טיול לפי מזהה
+# טיול לפי מזהה - 304 אם הטיול לא השתנה מאז הבקשה הקודמת
 @router.get("/{trip_id}", response_model=TripOut)
-def get_trip_by_id(trip_id: int, db: Session = Depends(get_db)):
-    return trip_service.get_trip_by_id(trip_id, db)
+def get_trip_by_id(
+    trip_id: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None)
+):
+    trip = trip_service.get_trip_by_id(trip_id, db)
+    return http_cache_service.trip_response(trip, response, lambda: trip, if_none_match, if_modified_since)
+
+# דף טיול מלא בבקשה אחת - פעילויות לפי ימים, דירוג, תגובות וסימון מועדף למשתמש המחובר
+@router.get("/{trip_id}/full", response_model=TripFullOut)
+def get_trip_full(trip_id: int, db: Session = Depends(get_db), current_user: Optional[Principal] = Depends(get_optional_current_principal)):
+    return trip_service.get_trip_full(trip_id, db, current_user)
+
+# הורדת סיכום הטיול - text, html או markdown
+@router.get("/{trip_id}/summary")
+def download_trip_summary(
+    trip_id: int,
+    format: str = Query("text", enum=list(summary_service.SUMMARY_FORMATS)),
+    db: Session = Depends(get_db)
+):
+    file_name, content, media_type = summary_service.get_trip_summary(trip_id, format, db)
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(file_name)}"},
+    )
+
+# ייצוא הטיול לקובץ iCalendar - אירוע לכל פעילות, ו-304 אם הטיול לא השתנה מאז הבקשה הקודמת
+@router.get("/{trip_id}/calendar.ics")
+def export_trip_calendar(trip_id: int, db: Session = Depends(get_db), if_none_match: Optional[str] = Header(None)):
+    return ics_service.get_trip_calendar(trip_id, db, if_none_match)
 
 # יצירת טיול חדש
 @router.post("/", response_model=TripOut, status_code=status.HTTP_201_CREATED)
-def create_trip(trip: TripCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_trip(trip: TripCreate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     return trip_service.create_trip(trip, db, current_user)
 
 # עדכון טיול
 @router.put("/{trip_id}", response_model=TripOut)
-def update_trip(trip_id: int, updated_data: TripUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def update_trip(trip_id: int, updated_data: TripUpdate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     return trip_service.update_trip(trip_id, updated_data.dict(exclude_unset=True), db, current_user)
 
 # מחיקת טיול
 @router.delete("/{trip_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_trip(trip_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def delete_trip(trip_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     return trip_service.delete_trip(trip_id, db, current_user)
 
 # העברת טיול מומלץ לטיולים שלי
 @router.post("/{trip_id}/clone", response_model=TripOut)
-def clone_recommend_trip(trip_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def clone_recommend_trip(trip_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     return trip_service.clone_recommended_trip(trip_id, db, current_user)
 
 # קבלת קישור לשיתוף
 @router.get("/{trip_id}/shared-link")
-def share_a_trip(trip_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def share_a_trip(trip_id: int, db: Session = Depends(get_db), user: Principal = Depends(get_current_principal)):
     trip = db.query(Trip).filter_by(id=trip_id, user_id=user.id).first()
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found or unauthorized")
     return {"share_link": f"http://localhost:3000/shared/trips/{trip.share_uuid}"}
 
-# צפייה בטיול ששותף
+# צפייה בטיול ששותף - ציבורי לכל מי שיש לו את הקישור, והפעילויות נטענות רק אם אין ללקוח כבר את הגרסה הזו
 @router.get("/shared-trip/{share_uuid}", response_model=SharedTripOut)
-def view_shared_trip(share_uuid: UUID, db: Session = Depends(get_db)):
-    trip = db.query(Trip).options(joinedload(Trip.activities)).filter_by(share_uuid=share_uuid).first()
+def view_shared_trip(
+    share_uuid: UUID,
+    response: Response,
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None)
+):
+    trip = db.query(Trip).filter_by(share_uuid=share_uuid).first()
     if not trip:
         raise HTTPException(status_code=404, detail="Shared trip not found")
-    return trip
+    return http_cache_service.trip_response(trip, response, lambda: trip, if_none_match, if_modified_since, public=True)
 
 # לטיולים שלי AI העברת טיול 
 @router.post("/clone-ai-trip", response_model=TripOut)
-def clone_ai_trip_to_my_trips(request: AiTripCloneRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def clone_ai_trip_to_my_trips(request: AiTripCloneRequest, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     return trip_service.import_ai_trip(request, db, current_user)
 
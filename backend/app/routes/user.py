@@ -0,0 +1,34 @@
+#  שקשורים לנתונים של המשתמש המחובר - פיד היומן API נתיבי
+
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, Request
+from starlette.datastructures import URL
+from sqlalchemy.orm import Session
+from app.db.database import get_db
+from app.services import ics_service
+from app.services.token_service import Principal, get_current_principal, get_feed_user, get_feed_token, rotate_feed_token
+
+router = APIRouter(prefix="/users", tags=["Users"])
+
+# פיד iCalendar של כל הטיולים של המשתמש - להרשמה באפליקציית יומן
+@router.get("/me/trips.ics")
+def get_my_trips_feed(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_feed_user),
+    if_none_match: Optional[str] = Header(None),
+):
+    return ics_service.get_user_calendar_feed(current_user, db, if_none_match)
+
+# כתובת הפיד עם טוקן הפיד - את הכתובת הזו מוסיפים לאפליקציית היומן
+def _feed_url(request: Request, token: str) -> URL:
+    return request.url_for("get_my_trips_feed").include_query_params(token=token)
+
+# כתובת הפיד הנוכחית - בקשה חוזרת לא מבטלת כתובות שכבר נרשמו
+@router.get("/me/calendar-feed")
+def get_my_calendar_feed_url(request: Request, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    return {"feed_url": str(_feed_url(request, get_feed_token(current_user.id, db)))}
+
+# כתובת פיד חדשה - מבטלת את כל הכתובות הקודמות (למשל אחרי שכתובת דלפה)
+@router.post("/me/calendar-feed/rotate")
+def rotate_my_calendar_feed_url(request: Request, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    return {"feed_url": str(_feed_url(request, rotate_feed_token(current_user.id, db)))}
@@ -6,6 +6,8 @@ class TripRequestAI(BaseModel):
     num_days: int
     num_travelers: int
     trip_type: str
+    parallel: bool = False
+    fresh: bool = False
 
 class AiTripSummaryRequest(BaseModel):
     email: EmailStr
@@ -0,0 +1,19 @@
+# בדיקה ושליטה על אילו שדות יוצאים במצב של משימה מתוזמנת
+
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+from typing import Optional
+
+# מצב משימה מתוזמנת כפי שהוא מוחזר לאדמין
+class ScheduledJobOut(BaseModel):
+    name: str
+    last_status: Optional[str] = None
+    last_started_at: Optional[datetime] = None
+    last_finished_at: Optional[datetime] = None
+    last_duration_seconds: Optional[float] = None
+    last_error: Optional[str] = None
+    run_count: int = 0
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
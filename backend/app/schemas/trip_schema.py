@@ -63,11 +63,23 @@ class SharedTripOut(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+# יום בטיול עם הפעילויות שלו לפי שעה
+class TripDayOut(BaseModel):
+    day_number: int
+    activities: List[ActivityOut] = []
+
+# דף טיול מלא - הטיול, הפעילויות לפי ימים, דירוג, תגובות וסימון מועדף
+class TripFullOut(TripOut):
+    days: List[TripDayOut] = []
+    comment_count: int = 0
+    is_favorite: bool = False
+
 class TripPaginatedResponse(BaseModel):
-    total: int
+    total: Optional[int] = None       # None כשהלקוח ביקש לדלג על הספירה
     page: int
     limit: int
     trips: List[TripOut]
+    next_cursor: Optional[str] = None # סמן לעמוד הבא - None כשאין עוד טיולים או שהמיון לא תומך בסמן
 
 class AiTripCloneRequest(BaseModel):
     destination: str
@@ -6,6 +6,7 @@ from app.models.activity_model import Activity
 from app.models.trip_model import Trip
 from app.models.user_model import User
 from app.schemas.activity_schema import ActivityCreate, ActivityUpdate
+from app.services.token_service import is_admin_user
 from datetime import datetime
 
 # קבלת כל הפעילויות של טיול מסוים
@@ -34,7 +35,7 @@ def create_activity(db: Session, activity: ActivityCreate, trip_id: int, current
 
     # הרשאות
     if trip.is_recommended:
-        if not current_user.is_admin:
+        if not is_admin_user(current_user.id, db):
             raise HTTPException(status_code=403, detail="Only admin can add activities to recommended trips")
     else:
         if trip.user_id != current_user.id:
@@ -73,7 +74,7 @@ def update_activity(db: Session, activity_id: int, updated_data: ActivityUpdate,
 
     # הרשאות
     if trip.is_recommended:
-        if not current_user.is_admin:
+        if not is_admin_user(current_user.id, db):
             raise HTTPException(status_code=403, detail="Only admin can update activities in recommended trips")
     else:
         if trip.user_id != current_user.id:
@@ -107,7 +108,7 @@ def delete_activity(db: Session, activity_id: int, current_user: User):
 
     # הרשאות
     if trip.is_recommended:
-        if not current_user.is_admin:
+        if not is_admin_user(current_user.id, db):
             raise HTTPException(status_code=403, detail="Only admin can delete activities from recommended trips")
     else:
         if trip.user_id != current_user.id:
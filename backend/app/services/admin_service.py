@@ -7,8 +7,11 @@ from app.models.trip_model import Trip
 from app.models.user_model import User
 from app.models.activity_model import Activity
 from app.schemas.trip_schema import TripCreate
-from app.services.token_service import get_current_user
-from app.services.trip_service import get_trip_by_id
+from app.services.token_service import Principal, get_current_principal, get_db, invalidate_user_principals, is_admin_user
+from app.services.trip_service import get_trip_by_id, copy_trip_activities
+from app.services.recommend_service import refresh_trip_aggregates, invalidate_recommended_listings, invalidate_trip_comments
+from app.services.password_service import get_password_metrics
+from app.services.cache_service import cache_stats
 import bcrypt
 from typing import List
 
@@ -24,13 +27,25 @@ def delete_user(db: Session, user_id: int):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    # הטיולים שהמשתמש דירג או סימן כמועדפים - המונים שלהם יחושבו מחדש אחרי המחיקה
+    affected_trip_ids = (
+        {rating.trip_id for rating in user.ratings}
+        | {fav.trip_id for fav in user.favorite_trips}
+        | {fav.trip_id for fav in user.favorite_recommended_trips}
+    )
+
     db.delete(user)
+    db.flush()
+    refresh_trip_aggregates(affected_trip_ids, db)
     db.commit()
+    invalidate_user_principals(user_id)
+    invalidate_recommended_listings()
+    invalidate_trip_comments()
     return user
 
 # סימון טיול כמומלץ (admin בלבד)
 def recommend_trip(trip_id: int, db: Session, current_user: User):
-    if not current_user.is_admin:
+    if not is_admin_user(current_user.id, db):
         raise HTTPException(status_code=403, detail="Only admins can recommend trips.")
 
     # שליפת הטיול המקורי
@@ -50,23 +65,13 @@ def recommend_trip(trip_id: int, db: Session, current_user: User):
     )
 
     db.add(recommended)
+    db.flush()
+
+    # שכפול פעילויות מהטיול המקורי בתוך המסד
+    copy_trip_activities(original.id, recommended.id, db)
     db.commit()
     db.refresh(recommended)
-
-    # שכפול פעילויות מהטיול המקורי
-    original_activities = db.query(Activity).filter(Activity.trip_id == original.id).all()
-    for act in original_activities:
-        cloned_activity = Activity(
-            trip_id=recommended.id,
-            time=act.time,
-            title=act.title,
-            day_number=act.day_number,
-            description=act.description,
-            location_name=act.location_name
-        )
-        db.add(cloned_activity)
-
-    db.commit()  # שמירת כל הפעילויות המשוכפלות
+    invalidate_recommended_listings()
 
     return recommended
 
@@ -95,6 +100,7 @@ def admin_create_recommended_trip(trip_data: TripCreate, db: Session):
     db.add(trip)
     db.commit()
     db.refresh(trip)
+    invalidate_recommended_listings()
     return trip
 
 # עדכון טיול מומלץ 
@@ -115,6 +121,7 @@ def admin_update_recommended_trip(trip_id: int, trip_data: dict, db: Session):
 
     db.commit()
     db.refresh(trip)
+    invalidate_recommended_listings()
     return trip
 
 # מחיקת טיול מומלץ
@@ -128,11 +135,13 @@ def admin_delete_recommended_trip(trip_id: int, db: Session):
 
     db.delete(trip)
     db.commit()
+    invalidate_recommended_listings()
+    invalidate_trip_comments(trip_id)
     return trip
 
 # הרשאה: רק לאדמין
-def admin_required(current_user: User = Depends(get_current_user)):
-    if not current_user.is_admin:
+def admin_required(current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    if not is_admin_user(current_user.id, db):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin privileges required"
@@ -141,4 +150,8 @@ def admin_required(current_user: User = Depends(get_current_user)):
 
 # קבלת טיולים של משתמש 
 def get_trips_by_user_id(user_id: int, db: Session) -> List[Trip]:
-    return db.query(Trip).filter(Trip.user_id == user_id).all()
\ No newline at end of file
+    return db.query(Trip).filter(Trip.user_id == user_id).all()
+
+# מדדי ביצועים של התהליך הנוכחי
+def get_service_metrics() -> dict:
+    return {"password_hashing": get_password_metrics(), "caches": cache_stats()}
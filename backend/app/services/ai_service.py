@@ -1,6 +1,9 @@
 # AI פונקציות שירות הקשורות ל
 from fastapi import HTTPException, status
-import requests
+import asyncio
+import httpx
+import random
+from typing import Optional
 from app.schemas.ai_schema import BudgetResponse
 import os
 
@@ -10,8 +13,75 @@ if os.getenv("TESTING") == "1":
 else:
     TRIP_AI_SERVICE_URL = os.getenv("TRIP_AI_SERVICE_URL", "http://ai-service:8000")
 
+AI_SERVICE_CONNECT_TIMEOUT = float(os.getenv("AI_SERVICE_CONNECT_TIMEOUT", 5))   # זמן מקסימלי לפתיחת חיבור
+AI_SERVICE_READ_TIMEOUT = float(os.getenv("AI_SERVICE_READ_TIMEOUT", 300))       # יצירת טיול ארוך יכולה לקחת כמה דקות
+AI_SERVICE_MAX_CONNECTIONS = int(os.getenv("AI_SERVICE_MAX_CONNECTIONS", 50))    # גודל מאגר החיבורים
+AI_SERVICE_MAX_RETRIES = int(os.getenv("AI_SERVICE_MAX_RETRIES", 2))             # מספר ניסיונות חוזרים אחרי כישלון
+AI_SERVICE_RETRY_BACKOFF = float(os.getenv("AI_SERVICE_RETRY_BACKOFF", 0.5))     # המתנה בסיסית בשניות בין ניסיונות
 
-def create_custom_trip_ai(trip_data: dict):
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+# חיבור משותף לשירות ה-AI - נפתח פעם אחת בעליית השרת
+_client: Optional[httpx.AsyncClient] = None
+
+def start_ai_client():
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=TRIP_AI_SERVICE_URL,
+            timeout=httpx.Timeout(AI_SERVICE_READ_TIMEOUT, connect=AI_SERVICE_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=AI_SERVICE_MAX_CONNECTIONS,
+                max_keepalive_connections=AI_SERVICE_MAX_CONNECTIONS
+            )
+        )
+    return _client
+
+async def close_ai_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_ai_client() -> httpx.AsyncClient:
+    return _client or start_ai_client()
+
+# זמן המתנה לפני ניסיון חוזר - גדל בכל ניסיון עם רכיב אקראי כדי שלא כולם ינסו יחד
+def get_retry_delay(attempt: int) -> float:
+    return AI_SERVICE_RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+# שליחת בקשה לשירות ה-AI עם ניסיונות חוזרים
+# POST חוזר רק אם החיבור לא נפתח בכלל, כדי לא לייצר טיול פעמיים
+async def send_to_ai_service(method: str, url: str, stream: bool = False, **kwargs) -> httpx.Response:
+    client = get_ai_client()
+    idempotent = method == "GET"
+
+    for attempt in range(AI_SERVICE_MAX_RETRIES + 1):
+        last_attempt = attempt == AI_SERVICE_MAX_RETRIES
+        try:
+            request = client.build_request(method, url, **kwargs)
+            response = await client.send(request, stream=stream)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            if last_attempt:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="AI service is unavailable"
+                ) from e
+        except httpx.TimeoutException as e:
+            if last_attempt or not idempotent:
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail="AI service did not respond in time"
+                ) from e
+        else:
+            if not (idempotent and response.status_code in RETRYABLE_STATUS_CODES) or last_attempt:
+                return response
+            await response.aclose()
+
+        await asyncio.sleep(get_retry_delay(attempt))
+
+# בדיקת שדות חובה לפני שליחה לשירות ה-AI
+def validate_custom_trip_data(trip_data: dict):
     required_fields = ["destination", "num_days", "num_travelers", "trip_type"]
     for field in required_fields:
         value = trip_data.get(field)
@@ -20,32 +90,56 @@ def create_custom_trip_ai(trip_data: dict):
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"{field.capitalize()} is required."
             )
-        
-    response = requests.post(f"{TRIP_AI_SERVICE_URL}/trip-ai/custom-trip", json=trip_data)
+
+async def create_custom_trip_ai(trip_data: dict):
+    validate_custom_trip_data(trip_data)
+
+    response = await send_to_ai_service("POST", "/trip-ai/custom-trip", json=trip_data)
     if response.status_code != 200:
         raise Exception("Failed to create custom trip via AI service")
     return response.json()
 
-def calculate_budget_ai(trip_id: int, num_travelers: int):
-    print("start calc")
-    response = requests.post(
-        f"{TRIP_AI_SERVICE_URL}/trip-ai/calculate-budget/{trip_id}",
+# פתיחת הזרמה של טיול AI - הימים מועברים ללקוח כפי שהם מגיעים, בלי לחכות לסוף
+async def stream_custom_trip_ai(trip_data: dict):
+    validate_custom_trip_data(trip_data)
+
+    response = await send_to_ai_service("POST", "/trip-ai/custom-trip/stream", stream=True, json=trip_data)
+    if response.status_code != 200:
+        await response.aclose()
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Failed to create custom trip via AI service"
+        )
+
+    async def passthrough():
+        try:
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        finally:
+            await response.aclose()
+
+    return passthrough()
+
+async def calculate_budget_ai(trip_id: int, num_travelers: int):
+    response = await send_to_ai_service(
+        "POST",
+        f"/trip-ai/calculate-budget/{trip_id}",
         params={"num_travelers": num_travelers},
     )
-    print(f"response {response}")
     if response.status_code != 200:
         raise Exception("Failed to calculate budget via AI service")
     return response.json()
 
-def get_trip_types():
-    response = requests.get(f"{TRIP_AI_SERVICE_URL}/trip-ai/trip-types")
+async def get_trip_types():
+    response = await send_to_ai_service("GET", "/trip-ai/trip-types")
     if response.status_code != 200:
         raise Exception("Failed to fetch trip types")
     return response.json()
 
-def trip_advisor_chat_ai(chat_data: dict):
-    response = requests.post(
-        f"{TRIP_AI_SERVICE_URL}/trip-ai/trip-advisor",
+async def trip_advisor_chat_ai(chat_data: dict):
+    response = await send_to_ai_service(
+        "POST",
+        "/trip-ai/trip-advisor",
         json=chat_data
     )
 
@@ -1,6 +1,5 @@
 # פונקציות שירות הקשורות למשתמשים: יצירה, התחברות והצפנת סיסמה
 
-import bcrypt
 from sqlalchemy.orm import Session
 from app.models.user_model import User
 from app.schemas.user_schema import UserCreate
@@ -8,8 +7,10 @@ from app.schemas.user_schema import UserLogin
 from fastapi import HTTPException, status
 from datetime import datetime, timezone, timedelta
 from jose import jwt, JWTError
-from app.services.token_service import SECRET_KEY, ALGORITHM
+from app.services.token_service import SECRET_KEY, ALGORITHM, invalidate_user_principals, revoke_feed_tokens
 from app.services.email_service import send_reset_email
+from app.services.password_service import hash_password, verify_password, password_needs_rehash
+from app.services.recommend_service import invalidate_trip_comments
 from app.schemas.user_schema import ResetPasswordRequest
 from app.schemas.user_schema import UpdateProfileRequest
 
@@ -73,17 +74,14 @@ def login_user(login_data: UserLogin, db: Session):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
+
+    # סיסמה שהוצפנה בעלות ישנה מוצפנת מחדש בעלות הנוכחית, כשהסיסמה עצמה זמינה
+    if password_needs_rehash(user.password):
+        user.password = hash_password(login_data.password)
+        db.commit()
     
     return user  # בעתיד נחליף את זה בטוקן
 
-# פונקציות להצפנת סיסמאות
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-# פונקציה שבודקת אם הסיסמה שהוזנה תואמת לסיסמה המוצפנת
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
-
 # פונקציה ליצירת טוקן איפוס סיסמה
 def create_reset_token(user_id: int, expires_minutes: int = 15):
     expire = datetime.now(timezone.utc) + timedelta(minutes=expires_minutes)
@@ -102,7 +100,7 @@ def handle_forgot_password(email: str, db: Session):
     reset_token = create_reset_token(user.id)
 
     # נשלח מייל לאיפוס סיסמה
-    send_reset_email(user.email, reset_token)
+    send_reset_email(user.email, reset_token, db)
 
     return {"message": "If this email exists, a reset link was sent"}
 
@@ -122,7 +120,9 @@ def reset_user_password(request: ResetPasswordRequest, db: Session):
         raise HTTPException(status_code=404, detail="User not found")
 
     user.password = hash_password(request.new_password)
+    revoke_feed_tokens(user)
     db.commit()
+    invalidate_user_principals(user.id)
 
     return {"message": "Password has been reset successfully"}
 
@@ -147,11 +147,15 @@ def update_user_profile(current_user: User, request: UpdateProfileRequest, db):
     # עדכון סיסמה אם נשלחה
     if request.update_password:
         current_user.password = hash_password(request.update_password)
+        revoke_feed_tokens(current_user)
 
     # עדכון תמונת פרופיל אם נשלחה
     if request.update_profile_image_url:
         current_user.profile_image_url = str(request.update_profile_image_url)
 
     db.commit()
+    invalidate_user_principals(current_user.id)
+    if request.update_username is not None:
+        invalidate_trip_comments()  # שם המשתמש מופיע בתגובות שלו
     db.refresh(current_user)
     return current_user
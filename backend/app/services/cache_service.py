@@ -0,0 +1,102 @@
+# מטמון בזיכרון של התהליך - שומר תוצאות שחישובן יקר ומפנה את הפריטים שלא היו בשימוש הכי הרבה זמן
+
+import time
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+# המטמונים שנוצרו עם שם - למדדים של האדמין
+_named_caches = {}
+
+# מטמון LRU בגודל קבוע שבטוח לשימוש מכמה threads
+# עם ttl (בשניות) כל פריט גם פג תוקף אחרי הזמן הזה, גם אם המטמון לא מלא
+# עם name המטמון נרשם, ומוני הפגיעות וההחטאות שלו מופיעים ב-cache_stats
+class LRUCache:
+    def __init__(self, maxsize: int = 256, ttl: float = None, name: str = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._items = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._generation = 0  # עולה בכל מחיקה, כדי שערך שחושב לפני המחיקה לא יישמר אחריה
+        if name:
+            _named_caches[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key, _MISSING)
+            if item is _MISSING:
+                self._misses += 1
+                return default
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._items[key]
+                self._misses += 1
+                return default
+            self._items.move_to_end(key)
+            self._hits += 1
+            return value
+
+    # ttl לפריט הזה בלבד - למשל כשהערך עצמו פג תוקף לפני זמן ברירת המחדל
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._items[key] = (expires_at, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    # הערך מהמטמון, או חישוב ושמירה שלו אם הוא חסר
+    # אם המטמון נוקה בזמן החישוב הערך מוחזר אבל לא נשמר - ייתכן שהוא חושב מנתונים שכבר השתנו
+    def get_or_set(self, key, factory):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            generation = self._generation
+            value = factory()
+            with self._lock:
+                if generation != self._generation:
+                    return value
+            self.set(key, value)
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._generation += 1
+            self._items.pop(key, None)
+
+    # מחיקת כל הפריטים שהערך שלהם מקיים את התנאי - מחזיר כמה נמחקו
+    def delete_where(self, predicate) -> int:
+        with self._lock:
+            self._generation += 1
+            keys = [key for key, (_, value) in self._items.items() if predicate(value)]
+            for key in keys:
+                del self._items[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._items.clear()
+
+    # גודל המטמון ומוני הפגיעות וההחטאות מאז שהתהליך עלה
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0,
+            }
+
+    def __len__(self):
+        return len(self._items)
+
+# המדדים של כל המטמונים שנרשמו עם שם
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in _named_caches.items()}
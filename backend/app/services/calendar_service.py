@@ -1,12 +1,19 @@
 # פונקציות שירות הקשורות לסנכרון ליומן 
+# כל האירועים של טיול נשלחים בבקשת batch אחת ל-Google Calendar, והמיפוי בין האירועים לימים ולפעילויות נשמר בטבלת calendar_events
+# סנכרון חוזר שולח רק אירועים חדשים, אירועים שהתוכן שלהם השתנה, ומחיקות של ימים ופעילויות שכבר לא קיימים
 
 import os
-from datetime import timedelta
+import json
+import hashlib
+from datetime import datetime, timedelta
 from app.models.trip_model import Trip
+from app.models.calendar_event_model import CalendarEvent
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
 from google.oauth2.credentials import Credentials
 
 # זיכרון זמני לשמירת טוקנים של משתמשים
@@ -23,6 +30,11 @@ SCOPES = [
 
 REDIRECT_URI = "http://localhost:8000/api/calendar/callback"
 
+GOOGLE_API_ROOT = os.getenv("GOOGLE_API_ROOT", "https://www.googleapis.com/")       # כתובת ה-API של גוגל (אפשר להפנות ל-API מקומי בבדיקות)
+CALENDAR_BATCH_SIZE = int(os.getenv("CALENDAR_BATCH_SIZE", 50))                     # כמה פעולות נשלחות בכל בקשת batch (גוגל ממליצים עד 50)
+CALENDAR_TIMEZONE = os.getenv("CALENDAR_TIMEZONE", "Asia/Jerusalem")                 # אזור הזמן של פעילויות עם שעה
+CALENDAR_ACTIVITY_MINUTES = int(os.getenv("CALENDAR_ACTIVITY_MINUTES", 60))         # משך אירוע של פעילות ביומן
+
 def get_google_flow():
     return Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE,
@@ -30,8 +42,144 @@ def get_google_flow():
         redirect_uri=REDIRECT_URI
     )
 
+# חיבור ל-Calendar API
+def build_calendar_service(credentials: Credentials):
+    return build(
+        "calendar", "v3",
+        credentials=credentials,
+        client_options={"api_endpoint": f"{GOOGLE_API_ROOT}calendar/v3/"},
+        cache_discovery=False,
+    )
+
+# בקשת batch חדשה - כתובת ה-batch נלקחת מ-GOOGLE_API_ROOT ולא ממסמך ה-discovery
+def new_batch_request(callback) -> BatchHttpRequest:
+    return BatchHttpRequest(callback=callback, batch_uri=f"{GOOGLE_API_ROOT}batch/calendar/v3")
+
+# האירועים שהטיול צריך שיהיו לו ביומן, לפי מפתח: day:<מספר יום> לכל יום בטיול, ו-activity:<מזהה> לכל פעילות עם שעה
+# פעילויות בלי שעה מופיעות בתיאור של היום שלהן
+def build_trip_events(trip: Trip) -> dict[str, dict]:
+    events = {}
+    untimed = {}
+    trip_days = (trip.end_date - trip.start_date).days + 1
+
+    for activity in sorted(trip.activities, key=lambda a: (a.day_number or 0, a.time or datetime.min.time(), a.id)):
+        if not activity.day_number or not 1 <= activity.day_number <= trip_days:
+            continue
+        if activity.time is None:
+            untimed.setdefault(activity.day_number, []).append(activity)
+            continue
+
+        start = datetime.combine(trip.start_date + timedelta(days=activity.day_number - 1), activity.time)
+        end = start + timedelta(minutes=CALENDAR_ACTIVITY_MINUTES)
+        events[f"activity:{activity.id}"] = {
+            "summary": activity.title,
+            "location": activity.location_name,
+            "description": activity.description or "",
+            "start": {"dateTime": start.isoformat(), "timeZone": CALENDAR_TIMEZONE},
+            "end": {"dateTime": end.isoformat(), "timeZone": CALENDAR_TIMEZONE},
+        }
+
+    for day in range(1, trip_days + 1):
+        current_date = trip.start_date + timedelta(days=day - 1)
+        description = [f"Trip day in {trip.destination}"]
+        description += [f"- {activity.title}" for activity in untimed.get(day, [])]
+        events[f"day:{day}"] = {
+            "summary": f"{trip.title} - {trip.destination}",
+            "description": "\n".join(description),
+            "start": {"date": current_date.isoformat()},
+            "end": {"date": (current_date + timedelta(days=1)).isoformat()},
+        }
+
+    return events
+
+# hash של תוכן האירוע - משווים אותו למה שנשלח בסנכרון הקודם
+def event_content_hash(event: dict) -> str:
+    return hashlib.sha256(json.dumps(event, sort_keys=True).encode("utf-8")).hexdigest()
+
+# הפעולות שצריך לשלוח כדי שהיומן יתאים לטיול: insert, update ו-delete, ומספר האירועים שלא השתנו
+def diff_trip_events(desired: dict[str, dict], existing: dict[str, CalendarEvent]) -> tuple[list[tuple], int]:
+    operations = []
+    unchanged = 0
+
+    for key, event in desired.items():
+        content_hash = event_content_hash(event)
+        mapping = existing.get(key)
+        if mapping is None:
+            operations.append(("insert", key, event, content_hash))
+        elif mapping.content_hash != content_hash:
+            operations.append(("update", key, event, content_hash))
+        else:
+            unchanged += 1
+
+    for key in existing.keys() - desired.keys():
+        operations.append(("delete", key, None, None))
+
+    return operations, unchanged
+
+# שליחת הפעולות ב-batch (בקשת HTTP אחת לכל CALENDAR_BATCH_SIZE פעולות) ועדכון המיפוי לפי התשובות
+# אירוע שנמחק ידנית מהיומן (404/410) נוצר מחדש בעדכון, ונחשב כמחוק במחיקה; יצירה שקיבלה 404/410 (יומן שנמחק) נכשלת
+def _execute_operations(db: Session, service, trip: Trip, calendar_id: str, existing: dict, operations: list[tuple], result: dict):
+    retry = []
+
+    for i in range(0, len(operations), CALENDAR_BATCH_SIZE):
+        chunk = {key: (action, event, content_hash) for action, key, event, content_hash in operations[i:i + CALENDAR_BATCH_SIZE]}
+
+        def callback(request_id, response, exception):
+            action, event, content_hash = chunk[request_id]
+            gone = action != "insert" and isinstance(exception, HttpError) and exception.resp.status in (404, 410)
+
+            if exception is not None and not gone:
+                print(f"Calendar {action} of {request_id} for trip {trip.id} failed:", str(exception))
+                result["failed"] += 1
+            elif action == "insert":
+                mapping = existing.get(request_id)
+                if mapping is None:
+                    mapping = CalendarEvent(trip_id=trip.id, calendar_id=calendar_id, item_key=request_id)
+                    db.add(mapping)
+                    existing[request_id] = mapping
+                mapping.google_event_id = response["id"]
+                mapping.content_hash = content_hash
+                result["created"] += 1
+            elif action == "update" and gone:
+                retry.append(("insert", request_id, event, content_hash))
+            elif action == "update":
+                existing[request_id].content_hash = content_hash
+                result["updated"] += 1
+            else:
+                db.delete(existing.pop(request_id))
+                result["deleted"] += 1
+
+        batch = new_batch_request(callback)
+        for key, (action, event, content_hash) in chunk.items():
+            if action == "insert":
+                request = service.events().insert(calendarId=calendar_id, body=event)
+            elif action == "update":
+                request = service.events().update(calendarId=calendar_id, eventId=existing[key].google_event_id, body=event)
+            else:
+                request = service.events().delete(calendarId=calendar_id, eventId=existing[key].google_event_id)
+            batch.add(request, request_id=key)
+        batch.execute()
+
+    if retry:
+        _execute_operations(db, service, trip, calendar_id, existing, retry, result)
+
+# סנכרון האירועים של טיול ליומן לפי המיפוי השמור - מחזיר כמה אירועים נוצרו, עודכנו, נמחקו, לא השתנו ונכשלו
+# אירוע שנכשל לא נשמר במיפוי (או נשאר עם ה-hash הישן), ולכן יישלח שוב בסנכרון הבא
+def sync_trip_events(db: Session, service, trip: Trip, calendar_id: str = "primary") -> dict:
+    existing = {
+        mapping.item_key: mapping
+        for mapping in db.query(CalendarEvent).filter_by(trip_id=trip.id, calendar_id=calendar_id)
+    }
+    operations, unchanged = diff_trip_events(build_trip_events(trip), existing)
+
+    result = {"created": 0, "updated": 0, "deleted": 0, "unchanged": unchanged, "failed": 0}
+    if operations:
+        _execute_operations(db, service, trip, calendar_id, existing, operations, result)
+        db.commit()
+    return result
+
 # סנכרון טיול ליומן גוגל
-def sync_trip_to_google_calendar(trip_id: int, user, db: Session, credentials: Credentials = None):
+def sync_trip_to_google_calendar(trip_id: int, user, db: Session, credentials: Credentials = None, calendar_id: str = "primary") -> dict:
     # שליפת הטיול
     trip = db.query(Trip).filter_by(id=trip_id, is_recommended=False).first()
 
@@ -49,15 +197,5 @@ def sync_trip_to_google_calendar(trip_id: int, user, db: Session, credentials: C
     if not credentials:
         raise HTTPException(status_code=401, detail="Missing calendar authorization – please reconnect via /calendar/authorize")
 
-    service = build("calendar", "v3", credentials=credentials)
-
-    current_date = trip.start_date
-    while current_date <= trip.end_date:
-        event = {
-            "summary": f"{trip.title} - {trip.destination}",
-            "description": f"Trip day in {trip.destination}",
-            "start": {"date": current_date.isoformat()},
-            "end": {"date": (current_date + timedelta(days=1)).isoformat()},
-        }
-        service.events().insert(calendarId="primary", body=event).execute()
-        current_date += timedelta(days=1)
+    service = build_calendar_service(credentials)
+    return sync_trip_events(db, service, trip, calendar_id)
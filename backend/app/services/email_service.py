@@ -1,56 +1,34 @@
 # פונקציות שירות הקשורות לשליחת מיילים 
 
-import smtplib
 import os
 from fastapi import HTTPException
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-from dotenv import load_dotenv
-from app.services.trip_service import get_upcoming_trips
-from app.services.trip_service import build_trip_summary_text
+from typing import Optional
+from sqlalchemy import update
+from app.services import mail_queue_service
+from app.services.trip_service import stream_trips_to_remind
+from app.services import summary_service
 from app.models.user_model import User
 from app.models.trip_model import Trip
 from sqlalchemy.orm import Session
-from datetime import date
-import tempfile
+from datetime import date, datetime, time, timezone
 from app.schemas.ai_schema import AiTripSummaryRequest
-from apscheduler.schedulers.background import BackgroundScheduler
-from app.db.database import SessionLocal
 
-load_dotenv()
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", 500))  # כמה טיולים נטענים ונכנסים לתור בכל מנה
 
-EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
-EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
-EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
-
-# פונקציה לשליחת מיילים
-def send_email(subject: str, to_email: str, body_html: str, attachment=None):
-    try:
-        msg = MIMEMultipart()
-        msg["From"] = EMAIL_ADDRESS
-        msg["To"] = to_email
-        msg["Subject"] = subject
-
-        msg.attach(MIMEText(body_html, "html"))
-
-        if attachment:
-            msg.attach(attachment)
-
-        with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as server:
-            server.starttls()
-            server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            server.send_message(msg)
-
-        print(f"Email sent successfully to {to_email}!")
-
-    except Exception as e:
-        print("Error sending email to", to_email, ":", str(e))
-        raise
+# פונקציה לשליחת מיילים - המייל נכנס לתור ונשלח ברקע (mail_queue_service)
+def send_email(subject: str, to_email: str, body_html: str, db: Session,
+               attachment_name: Optional[str] = None, attachment_content: Optional[bytes] = None):
+    return mail_queue_service.enqueue_email(
+        db,
+        subject=subject,
+        to_email=to_email,
+        body_html=body_html,
+        attachment_name=attachment_name,
+        attachment_content=attachment_content,
+    )
 
 # מייל איפוס סיסמה
-def send_reset_email(to_email: str, reset_token: str):
+def send_reset_email(to_email: str, reset_token: str, db: Session):
     reset_link = f"http://localhost:3000/reset-password/{reset_token}"
 
     body = f"""
@@ -63,62 +41,74 @@ def send_reset_email(to_email: str, reset_token: str):
     send_email(
         subject="PlanNGo - Reset Your Password",
         to_email=to_email,
-        body_html=body
+        body_html=body,
+        db=db,
     )
 
 # מייל תזכורת טיול מתקרב
-def send_upcoming_trip_reminders(db: Session):
-    upcoming_trips = get_upcoming_trips(db)
+# הטיולים נטענים במנות יחד עם המשתמשים, המיילים נכנסים לתור ב-INSERT אחד לכל מנה,
+# והשליחה עצמה נעשית ב-workers של mail_queue_service עם חיבורי SMTP קבועים
+# התזכורות וסימון reminded_at נשמרים באותה טרנזקציה, כך שהרצה חוזרת באותו יום לא שולחת שוב
+def send_upcoming_trip_reminders(db: Session) -> int:
     today = date.today()
+    now = datetime.now(timezone.utc)
+    start_of_today = datetime.combine(today, time.min).astimezone(timezone.utc)
+    queued = 0
+
+    for trips in stream_trips_to_remind(db, start_of_today, REMINDER_BATCH_SIZE):
+        emails = [build_reminder_email(trip, today) for trip in trips if trip.users.email]
+        mail_queue_service.enqueue_emails(db, emails)
+        db.execute(
+            update(Trip).where(Trip.id.in_([trip.id for trip in trips])).values(reminded_at=now),
+            execution_options={"synchronize_session": False},
+        )
+        queued += len(emails)
+
+    db.commit()
+    mail_queue_service.notify_workers()
+    print(f"Queued {queued} trip reminders")
+    return queued
+
+# תוכן מייל התזכורת לטיול
+def build_reminder_email(trip: Trip, today: date) -> dict:
+    user: User = trip.users
+    days_until = (trip.start_date - today).days
 
-    for trip in upcoming_trips:
-        user: User = trip.users
-        if not user or not user.email:
-            continue
-
-        days_until = (trip.start_date - today).days
-
-        if days_until == 0:
-            timing_text = "Today"
-        elif days_until == 1:
-            timing_text = "Tomorrow"
-        else:
-            timing_text = "In 2 days"
-
-        subject = f"Your trip starts {timing_text}! ✈️"
-        
-        body = f"""
-        <h3>Hi {user.username},</h3>
+    if days_until == 0:
+        timing_text = "Today"
+    elif days_until == 1:
+        timing_text = "Tomorrow"
+    else:
+        timing_text = "In 2 days"
 
-        <p>This is a reminder that your trip is starting <b>{timing_text}</b>.</p>
+    subject = f"Your trip starts {timing_text}! ✈️"
+    
+    body = f"""
+    <h3>Hi {user.username},</h3>
 
-        <p>
-        <b>📍 Destination:</b> {trip.destination}<br>
-        <b>📅 Dates:</b> {trip.start_date} to {trip.end_date}<br>
-        <b>📝 Title:</b> {trip.title}
-        </p>
+    <p>This is a reminder that your trip is starting <b>{timing_text}</b>.</p>
 
-        <p>
-        We wish you a wonderful experience!<br>
-        The PlanNGo Team 🌍
-        </p>
-        """
+    <p>
+    <b>📍 Destination:</b> {trip.destination}<br>
+    <b>📅 Dates:</b> {trip.start_date} to {trip.end_date}<br>
+    <b>📝 Title:</b> {trip.title}
+    </p>
 
-        send_email(subject=subject, to_email=user.email, body_html=body)
+    <p>
+    We wish you a wonderful experience!<br>
+    The PlanNGo Team 🌍
+    </p>
+    """
 
-# תזמון שליחת מייל תזכורת כל יום בשעה 8:00
-def start_reminder_scheduler():
-    scheduler = BackgroundScheduler()
+    return {"subject": subject, "to_email": user.email, "body_html": body}
 
-    def job():
-        db = SessionLocal()
-        try:
-            send_upcoming_trip_reminders(db)
-        finally:
-            db.close()
+# בניית קובץ מצורף מטקסט הסיכום, בזיכרון ולא בקובץ זמני
+def build_summary_attachment(file_name: str, summary_text: str) -> tuple[str, bytes]:
+    return file_name, summary_text.encode("utf-8")
 
-    scheduler.add_job(job, 'cron', hour=8, minute=0, timezone='Asia/Jerusalem')  # כל יום בשעה 08:00
-    scheduler.start()
+# קובץ הסיכום של טיול - מהמטמון של summary_service, שבונה אותו פעם אחת לכל גרסה של הטיול
+def build_trip_summary_attachment(trip: Trip) -> tuple[str, bytes]:
+    return summary_service.summary_file_name(trip), summary_service.render_trip_summary(trip)
 
 # מייל סיכום טיול אישי
 def send_trip_summary_by_trip_id(trip_id: int, db):
@@ -130,26 +120,18 @@ def send_trip_summary_by_trip_id(trip_id: int, db):
     if not user or not user.email:
         raise HTTPException(status_code=400, detail="Trip has no associated user with email")
 
-    summary_text = build_trip_summary_text(trip)
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".txt") as temp_file:
-        temp_file.write(summary_text.encode("utf-8"))
-        temp_file_path = temp_file.name
-        file_name = f"{trip.title}_summary.txt"
+    file_name, content = build_trip_summary_attachment(trip)
 
-    with open(temp_file_path, "rb") as f:
-        attachment = MIMEApplication(f.read(), _subtype="txt")
-        attachment.add_header('Content-Disposition', 'attachment', filename=file_name)
-
-        subject = f"Your Trip Summary: {trip.title}"
-        body = f"""
-        <h3>Hello {user.username},</h3>
-        <p>Attached is your personalized trip summary to <b>{trip.destination}</b>.</p>
-        <p>We hope you had a memorable journey!</p>
-        <p>Thanks for using PlanNGo 🌍</p>
-        """
+    subject = f"Your Trip Summary: {trip.title}"
+    body = f"""
+    <h3>Hello {user.username},</h3>
+    <p>Attached is your personalized trip summary to <b>{trip.destination}</b>.</p>
+    <p>We hope you had a memorable journey!</p>
+    <p>Thanks for using PlanNGo 🌍</p>
+    """
 
-        send_email(subject=subject, to_email=user.email, body_html=body, attachment=attachment)
+    send_email(subject=subject, to_email=user.email, body_html=body, db=db,
+               attachment_name=file_name, attachment_content=content)
 
 # מייל סיכום טיול מומלץ
 def send_recommended_trip_summary(trip_id: int, recipient_email: str, db: Session):
@@ -157,29 +139,21 @@ def send_recommended_trip_summary(trip_id: int, recipient_email: str, db: Sessio
     if not trip:
         raise HTTPException(status_code=404, detail="Recommended trip not found")
 
-    summary_text = build_trip_summary_text(trip)
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".txt") as temp_file:
-        temp_file.write(summary_text.encode("utf-8"))
-        temp_file_path = temp_file.name
-        file_name = f"{trip.title}_summary.txt"
-
-    with open(temp_file_path, "rb") as f:
-        attachment = MIMEApplication(f.read(), _subtype="txt")
-        attachment.add_header('Content-Disposition', 'attachment', filename=file_name)
+    file_name, content = build_trip_summary_attachment(trip)
 
-        subject = f"Recommended Trip Summary: {trip.title}"
-        body = f"""
-        <h3>Hello Traveler,</h3>
-        <p>Attached is the full summary of our recommended trip to <b>{trip.destination}</b>.</p>
-        <p>We hope it inspires your next adventure!</p>
-        <p>With love,<br>PlanNGo Team 🌍</p>
-        """
+    subject = f"Recommended Trip Summary: {trip.title}"
+    body = f"""
+    <h3>Hello Traveler,</h3>
+    <p>Attached is the full summary of our recommended trip to <b>{trip.destination}</b>.</p>
+    <p>We hope it inspires your next adventure!</p>
+    <p>With love,<br>PlanNGo Team 🌍</p>
+    """
 
-        send_email(subject=subject, to_email=recipient_email, body_html=body, attachment=attachment)
+    send_email(subject=subject, to_email=recipient_email, body_html=body, db=db,
+               attachment_name=file_name, attachment_content=content)
 
 # AI מייל סיכום טיול שנוצר ב
-def send_ai_trip_summary_by_data(request: AiTripSummaryRequest):
+def send_ai_trip_summary_by_data(request: AiTripSummaryRequest, db: Session):
     summary_lines = [
         f"Destination: {request.destination}",
         f"Duration: {request.days} days",
@@ -197,23 +171,15 @@ def send_ai_trip_summary_by_data(request: AiTripSummaryRequest):
                 f"- {activity['time']} - {activity['title']} at {activity['location_name']}: {activity['description']}"
             )
 
-    summary_text = "\n".join(summary_lines)
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".txt") as temp_file:
-        temp_file.write(summary_text.encode("utf-8"))
-        temp_file_path = temp_file.name
-        file_name = f"AI_Trip_to_{request.destination}_Summary.txt"
+    file_name, content = build_summary_attachment(f"AI_Trip_to_{request.destination}_Summary.txt", "\n".join(summary_lines))
 
-    with open(temp_file_path, "rb") as f:
-        attachment = MIMEApplication(f.read(), _subtype="txt")
-        attachment.add_header('Content-Disposition', 'attachment', filename=file_name)
-
-        subject = f"Your AI Trip Plan to {request.destination}"
-        body = f"""
-        <h3>Hello Traveler,</h3>
-        <p>Attached is the summary of your AI-generated trip to <b>{request.destination}</b>.</p>
-        <p>We hope it helps you plan an amazing trip.</p>
-        <p>Best wishes,<br>PlanNGo Team 🌍</p>
-        """
+    subject = f"Your AI Trip Plan to {request.destination}"
+    body = f"""
+    <h3>Hello Traveler,</h3>
+    <p>Attached is the summary of your AI-generated trip to <b>{request.destination}</b>.</p>
+    <p>We hope it helps you plan an amazing trip.</p>
+    <p>Best wishes,<br>PlanNGo Team 🌍</p>
+    """
 
-        send_email(subject=subject, to_email=request.email, body_html=body, attachment=attachment)
+    send_email(subject=subject, to_email=request.email, body_html=body, db=db,
+               attachment_name=file_name, attachment_content=content)
@@ -0,0 +1,88 @@
+# בקשות מותנות (ETag, Last-Modified, 304) וכותרות Cache-Control לנתיבי הקריאה של טיולים
+# ה-ETag של טיול מחושב ממזהה הטיול ומ-Trip.revision, כך שאפשר לענות 304 לפני שטוענים את הפעילויות ובונים את התשובה
+
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Optional
+from fastapi import Response
+from app.models.trip_model import Trip
+
+PUBLIC_CACHE_MAX_AGE = int(os.getenv("PUBLIC_CACHE_MAX_AGE", 60))  # כמה שניות CDN או דפדפן יכולים להגיש תוכן ציבורי בלי לבדוק מול השרת
+
+PUBLIC_CACHE_CONTROL = f"public, max-age={PUBLIC_CACHE_MAX_AGE}"  # טיולים מומלצים וטיולים ששותפו בקישור
+PRIVATE_CACHE_CONTROL = "private, no-cache"                       # טיולים אישיים - רק הדפדפן שומר, ובודק מול השרת בכל פעם
+
+# האם ה-ETag ששמור אצל הלקוח (If-None-Match) הוא עדיין הגרסה הנוכחית
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or any(value.removeprefix("W/") == etag for value in candidates)
+
+# תאריך בפורמט של HTTP ("Sun, 18 Oct 2026 10:00:00 GMT") - תאריך בלי אזור זמן נחשב UTC
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+# האם ללקוח כבר יש את הגרסה הנוכחית - לפי If-None-Match, ורק אם הוא לא נשלח לפי If-Modified-Since
+def is_not_modified(etag: str, last_modified: Optional[datetime], if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+# 304 אם ללקוח כבר יש את הגרסה הזו, אחרת הכותרות נוספות לתשובה ו-build בונה את התוכן
+def conditional_response(
+    response: Response,
+    etag: str,
+    cache_control: str,
+    build: Callable,
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[str] = None,
+    last_modified: Optional[datetime] = None,
+):
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    if is_not_modified(etag, last_modified, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return build()
+
+# ה-ETag של טיול - משתנה בכל שינוי בטיול או בפעילויות שלו, ובדירוג (הדירוג הממוצע חלק מהתשובה ולא מעלה את revision)
+# לא כולל את share_uuid - הוא הרשאת גישה סודית, וה-ETag נשלח גם לבקשות לא מחוברות
+def trip_etag(trip: Trip) -> str:
+    return f'"{trip.id}-{trip.revision}-{trip.rating_count}-{trip.rating_sum}"'
+
+# תשובה מותנית לנתיב שמחזיר טיול או חלק ממנו - טיול מומלץ או משותף הוא ציבורי, טיול אישי פרטי
+# בלי טיול (למשל מזהה שלא קיים) התשובה נבנית כרגיל, בלי כותרות
+def trip_response(
+    trip: Optional[Trip],
+    response: Response,
+    build: Callable,
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[str] = None,
+    public: bool = False,
+):
+    if trip is None:
+        return build()
+    return conditional_response(
+        response,
+        trip_etag(trip),
+        PUBLIC_CACHE_CONTROL if public or trip.is_recommended else PRIVATE_CACHE_CONTROL,
+        build,
+        if_none_match,
+        if_modified_since,
+        last_modified=trip.updated_at or trip.created_at,
+    )
@@ -0,0 +1,139 @@
+# ייצוא טיולים כקובץ iCalendar (RFC 5545) - אירוע אחד לכל פעילות, לפי day_number ו-time
+# הקובץ נשלח בהזרמה, וה-ETag מחושב מגרסאות הטיולים (Trip.revision) בלי לבנות את הקובץ,
+# כך שאפליקציית יומן שבודקת את הפיד שוב ושוב מקבלת 304 בזול
+
+import os
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, Optional
+from zoneinfo import ZoneInfo
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+from app.models.trip_model import Trip
+from app.models.user_model import User
+from app.services.calendar_service import CALENDAR_TIMEZONE, CALENDAR_ACTIVITY_MINUTES
+from app.services.http_cache_service import etag_matches, trip_etag
+
+ICS_FEED_BATCH_SIZE = int(os.getenv("ICS_FEED_BATCH_SIZE", 100))  # כמה טיולים נטענים בכל מנה בזמן הזרמת הפיד
+ICS_MEDIA_TYPE = "text/calendar; charset=utf-8"
+
+# תווים מיוחדים בטקסט של iCalendar
+def ics_escape(text: Optional[str]) -> str:
+    return (
+        (text or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+# קיפול שורה ארוכה - עד 75 בתים בשורה, והמשך בשורה שמתחילה ברווח
+def fold_line(line: str) -> str:
+    parts = []
+    current = ""
+    current_size = 0
+    for char in line:
+        size = len(char.encode("utf-8"))
+        limit = 75 if not parts else 74
+        if current_size + size > limit:
+            parts.append(current)
+            current, current_size = "", 0
+        current += char
+        current_size += size
+    parts.append(current)
+    return "\r\n ".join(parts) + "\r\n"
+
+def _format_utc(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+# שורות ה-VEVENT של כל הפעילויות בטיול
+# פעילות עם שעה היא אירוע עם שעת התחלה וסיום, ופעילות בלי שעה היא אירוע של יום שלם
+def trip_event_lines(trip: Trip) -> Iterator[str]:
+    if not trip.start_date:
+        return
+    trip_days = (trip.end_date - trip.start_date).days + 1 if trip.end_date else None
+    local_zone = ZoneInfo(CALENDAR_TIMEZONE)
+    # זמן קבוע לכל גרסה של הטיול, כדי שאותו ETag תמיד יחזיר את אותו תוכן
+    stamp = _format_utc(trip.created_at.replace(tzinfo=trip.created_at.tzinfo or timezone.utc)) if trip.created_at else "19700101T000000Z"
+
+    for activity in sorted(trip.activities, key=lambda a: (a.day_number or 0, a.time or datetime.min.time(), a.id)):
+        if not activity.day_number or activity.day_number < 1 or (trip_days and activity.day_number > trip_days):
+            continue
+        day = trip.start_date + timedelta(days=activity.day_number - 1)
+
+        yield "BEGIN:VEVENT"
+        yield f"UID:activity-{activity.id}@planngo"
+        yield f"DTSTAMP:{stamp}"
+        yield f"SEQUENCE:{trip.revision}"
+        if activity.time:
+            start = datetime.combine(day, activity.time, tzinfo=local_zone)
+            yield f"DTSTART:{_format_utc(start)}"
+            yield f"DTEND:{_format_utc(start + timedelta(minutes=CALENDAR_ACTIVITY_MINUTES))}"
+        else:
+            yield f"DTSTART;VALUE=DATE:{day.strftime('%Y%m%d')}"
+            yield f"DTEND;VALUE=DATE:{(day + timedelta(days=1)).strftime('%Y%m%d')}"
+        yield f"SUMMARY:{ics_escape(activity.title)}"
+        if activity.location_name:
+            yield f"LOCATION:{ics_escape(activity.location_name)}"
+        description = f"{trip.title} - {trip.destination}"
+        if activity.description:
+            description = f"{activity.description}\n{description}"
+        yield f"DESCRIPTION:{ics_escape(description)}"
+        yield "END:VEVENT"
+
+# הזרמת קובץ iCalendar - כותרת, האירועים של כל טיול (מנה לכל טיול), וסיום
+def stream_calendar(trips: Iterable[Trip], name: str) -> Iterator[bytes]:
+    header = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//PlanNGo//Trips//EN", "CALSCALE:GREGORIAN", "METHOD:PUBLISH",
+              f"X-WR-CALNAME:{ics_escape(name)}"]
+    yield "".join(fold_line(line) for line in header).encode("utf-8")
+
+    for trip in trips:
+        chunk = "".join(fold_line(line) for line in trip_event_lines(trip))
+        if chunk:
+            yield chunk.encode("utf-8")
+
+    yield fold_line("END:VCALENDAR").encode("utf-8")
+
+# תשובת 304 אם ללקוח כבר יש את הגרסה הזו, אחרת הזרמת הקובץ
+def calendar_response(etag: str, if_none_match: Optional[str], chunks, file_name: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Disposition"] = f'inline; filename="{file_name}"'
+    return StreamingResponse(chunks(), media_type=ICS_MEDIA_TYPE, headers=headers)
+
+# קובץ היומן של טיול אחד - ה-ETag לפי מזהה הטיול ו-revision, והפעילויות נטענות רק כשצריך לשלוח את הקובץ
+def get_trip_calendar(trip_id: int, db: Session, if_none_match: Optional[str] = None) -> Response:
+    trip = db.query(Trip).filter(Trip.id == trip_id).first()
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    if not trip.start_date:
+        raise HTTPException(status_code=400, detail="Trip must have a start date to export to calendar")
+
+    return calendar_response(trip_etag(trip), if_none_match, lambda: stream_calendar([trip], trip.title), f"trip-{trip.id}.ics")
+
+# ETag של הפיד של המשתמש - hash של מזהי הטיולים והגרסאות שלהם, בשאילתה אחת בלי לטעון פעילויות
+def user_feed_etag(db: Session, user_id: int) -> str:
+    rows = db.execute(
+        select(Trip.id, Trip.revision).where(Trip.user_id == user_id, Trip.start_date.is_not(None)).order_by(Trip.id)
+    ).all()
+    digest = hashlib.sha256(",".join(f"{trip_id}:{revision}" for trip_id, revision in rows).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+# הטיולים של המשתמש במנות, כל מנה עם הפעילויות שלה
+def stream_user_trips(db: Session, user_id: int, batch_size: int = ICS_FEED_BATCH_SIZE) -> Iterator[Trip]:
+    yield from db.scalars(
+        select(Trip)
+        .where(Trip.user_id == user_id, Trip.start_date.is_not(None))
+        .options(selectinload(Trip.activities))
+        .order_by(Trip.start_date, Trip.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+# פיד היומן של המשתמש - כל הטיולים שלו עם תאריכים
+def get_user_calendar_feed(user: User, db: Session, if_none_match: Optional[str] = None) -> Response:
+    etag = user_feed_etag(db, user.id)
+    return calendar_response(etag, if_none_match, lambda: stream_calendar(stream_user_trips(db, user.id), "PlanNGo Trips"), "trips.ics")
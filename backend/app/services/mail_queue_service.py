@@ -0,0 +1,227 @@
+# תור מיילים יוצאים - בקשות ה-API רק מכניסות מייל לטבלה, ומאגר workers שולח אותם ברקע
+# כל worker מחזיק חיבור SMTP מאומת אחד ושולח בו את כל המיילים שמחכים, עם ניסיונות חוזרים והמתנה שהולכת וגדלה
+
+import os
+import smtplib
+import threading
+from datetime import datetime, timedelta, timezone
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.mime.application import MIMEApplication
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy import select, update, insert
+from sqlalchemy.orm import Session
+from app.db.database import SessionLocal
+from app.models.outbound_email_model import OutboundEmail
+
+load_dotenv()
+
+EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
+EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "1") == "1"           # STARTTLS לפני ההתחברות
+EMAIL_TIMEOUT = float(os.getenv("EMAIL_TIMEOUT", 30))            # זמן מקסימלי לפעולת SMTP בודדת
+
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", 2))                 # מספר ה-workers ששולחים מיילים (0 - בלי שליחה בתהליך הזה)
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 20))          # כמה מיילים worker לוקח מהתור בכל סבב
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", 5))   # המתנה בשניות כשהתור ריק
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 5))       # אחרי כמה ניסיונות מייל מסומן כנכשל
+MAIL_RETRY_BACKOFF = float(os.getenv("MAIL_RETRY_BACKOFF", 30))  # המתנה בסיסית בשניות לפני ניסיון חוזר - מוכפלת בכל ניסיון
+MAIL_SEND_TIMEOUT = float(os.getenv("MAIL_SEND_TIMEOUT", 300))   # מייל שתקוע ב-sending יותר מזה (worker שנפל) חוזר לתור
+
+# מעיר את ה-workers כשמייל חדש נכנס לתור, כדי שלא יחכו לסבב הבא
+_wakeup = threading.Event()
+
+def _now():
+    return datetime.now(timezone.utc)
+
+# הכנסת מייל לתור השליחה
+def enqueue_email(db: Session, subject: str, to_email: str, body_html: str,
+                  attachment_name: Optional[str] = None, attachment_content: Optional[bytes] = None) -> OutboundEmail:
+    email = OutboundEmail(
+        subject=subject,
+        to_email=to_email,
+        body_html=body_html,
+        attachment_name=attachment_name,
+        attachment_content=attachment_content,
+    )
+    db.add(email)
+    db.commit()
+    notify_workers()
+    return email
+
+# הכנסת הרבה מיילים לתור ב-INSERT אחד, בלי commit - הקורא שומר אותם יחד עם שאר השינויים שלו
+# כל מייל הוא מילון עם subject, to_email, body_html (ואופציונלית attachment_name, attachment_content)
+def enqueue_emails(db: Session, emails: list[dict]):
+    if emails:
+        db.execute(insert(OutboundEmail), emails)
+
+# הערת ה-workers אחרי שמיילים חדשים נשמרו בתור
+def notify_workers():
+    _wakeup.set()
+
+# בניית הודעת המייל מהשורה בתור
+def build_message(email: OutboundEmail) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg["From"] = EMAIL_ADDRESS
+    msg["To"] = email.to_email
+    msg["Subject"] = email.subject
+
+    msg.attach(MIMEText(email.body_html, "html"))
+
+    if email.attachment_content is not None:
+        attachment = MIMEApplication(email.attachment_content, _subtype="txt")
+        attachment.add_header("Content-Disposition", "attachment", filename=email.attachment_name)
+        msg.attach(attachment)
+
+    return msg
+
+# חיבור SMTP מאומת שנפתח פעם אחת ומשמש לשליחת הרבה מיילים
+class SMTPConnection:
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT, timeout=EMAIL_TIMEOUT)
+        try:
+            if EMAIL_USE_TLS:
+                server.starttls()
+            if EMAIL_PASSWORD:
+                server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def send(self, msg):
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # השרת סגר חיבור שעמד פתוח - פותחים חדש ומנסים פעם אחת
+            self._server = self._connect()
+            self._server.send_message(msg)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException):
+            # השרת דחה את ההודעה אבל החיבור תקין
+            raise
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            self._server.close()
+        self._server = None
+
+# שגיאה קבועה (כתובת לא קיימת, 5xx) - אין טעם לנסות שוב
+def _is_permanent_error(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+# לקיחת מיילים מהתור בפקודת UPDATE אחת - כמה workers (גם בתהליכים שונים) עובדים במקביל בלי לשלוח פעמיים
+# ב-Postgres שורות שנעולות אצל worker אחר מדולגות (SKIP LOCKED); ב-SQLite הפקודה כולה אטומית
+def claim_emails(db: Session, limit: int) -> list[OutboundEmail]:
+    now = _now()
+    due = (
+        select(OutboundEmail.id)
+        .where(OutboundEmail.status.in_(("pending", "sending")), OutboundEmail.next_attempt_at <= now)
+        .order_by(OutboundEmail.next_attempt_at, OutboundEmail.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    emails = db.scalars(
+        update(OutboundEmail)
+        .where(OutboundEmail.id.in_(due.scalar_subquery()))
+        .values(status="sending", next_attempt_at=now + timedelta(seconds=MAIL_SEND_TIMEOUT))
+        .returning(OutboundEmail)
+    ).all()
+    db.commit()
+    return sorted(emails, key=lambda email: email.id)
+
+# עדכון מייל שנכשל - ניסיון חוזר אחרי המתנה, או כישלון סופי
+def _record_failure(email: OutboundEmail, error: Exception):
+    email.last_error = f"{type(error).__name__}: {error}"
+    if _is_permanent_error(error) or email.attempts >= MAIL_MAX_ATTEMPTS:
+        email.status = "failed"
+        print(f"Email {email.id} to {email.to_email} failed: {email.last_error}")
+        return
+    email.status = "pending"
+    email.next_attempt_at = _now() + timedelta(seconds=MAIL_RETRY_BACKOFF * 2 ** (email.attempts - 1))
+
+# שליחת המיילים הבאים בתור בחיבור אחד - מחזיר כמה מיילים נלקחו
+def deliver_pending_emails(db: Session, connection: SMTPConnection, limit: Optional[int] = None) -> int:
+    emails = claim_emails(db, limit or MAIL_BATCH_SIZE)
+
+    for email in emails:
+        email.attempts += 1
+        try:
+            connection.send(build_message(email))
+        except Exception as e:
+            _record_failure(email, e)
+        else:
+            email.status = "sent"
+            email.sent_at = _now()
+            email.last_error = None
+        # שמירה אחרי כל מייל, כדי שנפילה באמצע לא תגרום לשליחה כפולה
+        db.commit()
+
+    return len(emails)
+
+# מאגר workers ששולחים את המיילים מהתור ברקע
+class MailWorkerPool:
+    def __init__(self, workers: Optional[int] = None, session_factory=SessionLocal):
+        self.workers = MAIL_WORKERS if workers is None else workers
+        self._session_factory = session_factory
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"mail-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        connection = SMTPConnection()
+        try:
+            while not self._stop.is_set():
+                db = self._session_factory(expire_on_commit=False)
+                try:
+                    taken = deliver_pending_emails(db, connection)
+                except Exception as e:
+                    print("Mail worker error:", str(e))
+                    db.rollback()
+                    taken = 0
+                finally:
+                    db.close()
+
+                if taken == 0:
+                    # התור ריק - סוגרים את החיבור ומחכים למייל חדש או לסבב הבא
+                    connection.close()
+                    _wakeup.wait(MAIL_POLL_INTERVAL)
+                    _wakeup.clear()
+        finally:
+            connection.close()
+
+# הפעלת ה-workers בעליית השרת
+def start_mail_workers() -> Optional[MailWorkerPool]:
+    if MAIL_WORKERS <= 0:
+        return None
+    pool = MailWorkerPool()
+    pool.start()
+    return pool
@@ -0,0 +1,127 @@
+# פונקציות עימוד לרשימות טיולים: עימוד לפי עמוד (OFFSET) ועימוד לפי סמן (keyset)
+# הסמן שומר את ערכי המיון של הטיול האחרון בעמוד, כך שהעמוד הבא מתחיל ממנו בלי לדלג על שורות
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, func, literal, tuple_
+from app.models.trip_model import Trip
+
+# תאריך התחלה לטיולים בלי תאריך - כך הם מגיעים בסוף גם ב-PostgreSQL וגם ב-SQLite
+NO_START_DATE = date(9999, 12, 31)
+
+# מיונים שתומכים בסמן: כיוון המיון ולכל מפתח - ביטוי SQL והדרך לקרוא אותו מהטיול
+TRIP_KEYSET_ORDERS = {
+    "recent": ("desc", [
+        (Trip.created_at, lambda trip: trip.created_at),
+        (Trip.id, lambda trip: trip.id),
+    ]),
+    "start_soonest": ("asc", [
+        (func.coalesce(Trip.start_date, NO_START_DATE), lambda trip: trip.start_date or NO_START_DATE),
+        (Trip.id, lambda trip: trip.id),
+    ]),
+    "top_rated": ("desc", [
+        (Trip.rating_score, lambda trip: trip.rating_score),
+        (Trip.id, lambda trip: trip.id),
+    ]),
+    "favorites": ("desc", [
+        (Trip.favorite_count, lambda trip: trip.favorite_count),
+        (Trip.id, lambda trip: trip.id),
+    ]),
+}
+
+# JSON-המרת ערך מיון לערך שאפשר לשמור ב
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        raise ValueError("Unknown cursor value")
+    return value
+
+# יצירת סמן אטום מערכי המיון של הטיול האחרון
+def encode_cursor(sort_by: str, values: list) -> str:
+    payload = {"s": sort_by, "v": [_encode_value(value) for value in values]}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+# פענוח סמן - 400 אם הוא פגום או שייך למיון אחר
+def decode_cursor(cursor: str, sort_by: str) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = [_decode_value(value) for value in payload["v"]]
+    except (binascii.Error, ValueError, KeyError, TypeError, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    if payload.get("s") != sort_by:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor does not match sort order")
+    return values
+
+# SQLite שומר תאריכים כטקסט, לפעמים עם מיקרו-שניות ולפעמים בלי, ולכן משווים שם בפורמט אחיד
+def _comparable(expression, dialect_name: str):
+    if dialect_name == "sqlite" and isinstance(expression.type, DateTime):
+        return func.strftime("%Y-%m-%d %H:%M:%f", expression)
+    return expression
+
+# עימוד שאילתת טיולים
+# במיונים שתומכים בסמן המיון נקבע כאן, ובשאר המיונים השאילתה מגיעה ממוינת
+# total מחושב רק כשמבקשים אותו - ספירה מלאה עולה כמו השאילתה עצמה
+def paginate_trips(query, sort_by: str, page: int, limit: int, cursor: Optional[str] = None, include_total: bool = True):
+    keyset = TRIP_KEYSET_ORDERS.get(sort_by)
+    if cursor and keyset is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cursor pagination is not supported for sort '{sort_by}'"
+        )
+
+    total = query.count() if include_total else None
+
+    if keyset:
+        direction, keys = keyset
+        dialect_name = query.session.get_bind().dialect.name
+        expressions = [_comparable(expression, dialect_name) for expression, _ in keys]
+        query = query.order_by(*(getattr(expression, direction)() for expression in expressions))
+
+        if cursor:
+            values = decode_cursor(cursor, sort_by)
+            if len(values) != len(keys):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+            position = tuple_(*expressions)
+            boundary = tuple_(*(
+                _comparable(literal(value, expression.type), dialect_name)
+                for (expression, _), value in zip(keys, values)
+            ))
+            query = query.filter(position < boundary if direction == "desc" else position > boundary)
+        else:
+            query = query.offset((page - 1) * limit)
+    else:
+        query = query.offset((page - 1) * limit)
+
+    # שורה אחת נוספת מגלה אם יש עמוד הבא בלי לספור
+    trips = query.limit(limit + 1).all()
+    has_more = len(trips) > limit
+    trips = trips[:limit]
+
+    next_cursor = None
+    if keyset and has_more:
+        next_cursor = encode_cursor(sort_by, [getter(trips[-1]) for _, getter in keyset[1]])
+
+    return {
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "trips": trips,
+        "next_cursor": next_cursor
+    }
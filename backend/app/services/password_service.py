@@ -0,0 +1,105 @@
+# הצפנה ובדיקה של סיסמאות עם bcrypt במאגר threads נפרד ומוגבל
+# bcrypt הוא חישוב כבד - במאגר נפרד גל של התחברויות לא תופס את כל ה-threads של השרת ולא מעכב את שאר הנתיבים
+# כשהתור מלא בקשה חדשה נדחית מיד עם 503, במקום לחכות ולתפוס עוד thread של השרת
+
+import os
+import time
+import threading
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from fastapi import HTTPException, status
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))                          # עלות bcrypt לסיסמאות חדשות - סיסמה עם עלות אחרת מוצפנת מחדש בהתחברות
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", min(4, os.cpu_count() or 1)))  # כמה סיסמאות מחושבות במקביל
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", 16))           # כמה בקשות יכולות לחכות בתור לפני שנדחות עם 503
+
+# מאגר threads מוגבל לחישובי bcrypt, עם מדדים על התור
+# bcrypt משחרר את ה-GIL בזמן החישוב, כך ש-threads מספיקים ולא צריך תהליכים
+class PasswordHasher:
+    def __init__(self, workers: Optional[int] = None, queue_limit: Optional[int] = None):
+        self.workers = PASSWORD_WORKERS if workers is None else workers
+        self.queue_limit = PASSWORD_QUEUE_LIMIT if queue_limit is None else queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password")
+        self._lock = threading.Lock()
+        self._in_flight = 0   # בקשות שבתור או בחישוב
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._queue_wait_total = 0.0
+
+    # הרצת החישוב במאגר והמתנה לתוצאה - או 503 מיד אם התור מלא
+    def run(self, func, *args):
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_limit:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, please try again shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+
+        submitted_at = time.monotonic()
+
+        def task():
+            with self._lock:
+                self._running += 1
+                self._queue_wait_total += time.monotonic() - submitted_at
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._in_flight -= 1
+                    self._completed += 1
+
+        try:
+            future = self._executor.submit(task)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        return future.result()
+
+    # מצב המאגר - לנתיב המדדים של האדמין
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "running": self._running,
+                "queued": self._in_flight - self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "average_queue_wait_ms": round(self._queue_wait_total / self._completed * 1000, 2) if self._completed else 0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+_hasher = PasswordHasher()
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+# הצפנת סיסמה
+def hash_password(password: str) -> str:
+    return _hasher.run(_hash, password)
+
+# בדיקה אם הסיסמה שהוזנה תואמת לסיסמה המוצפנת
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return _hasher.run(_verify, plain_password, hashed_password)
+
+# האם הסיסמה מוצפנת בעלות אחרת מ-BCRYPT_ROUNDS ("$2b$12$...")
+def password_needs_rehash(hashed_password: str) -> bool:
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def get_password_metrics() -> dict:
+    return _hasher.metrics()
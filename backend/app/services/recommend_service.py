@@ -1,50 +1,48 @@
 # פונקציות שירות הקשורות לטיולים מומלצים: קבלה וסימון כמומלץ 
 
+import os
+import hashlib
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, or_, nulls_last
-from fastapi import HTTPException, status
+from sqlalchemy import func, desc, or_, select
+from typing import Optional
+from fastapi import HTTPException, Response, status
 from app.models.trip_model import Trip
 from app.models.user_model import User
 from app.models.rating_model import Rating
-from app.models.favorite_model import FavoriteRecommendedTrip
-from app.services.trip_service import get_trip_by_id
+from app.models.favorite_model import FavoriteTrip, FavoriteRecommendedTrip
+from app.services.trip_service import get_trip_by_id, import_ai_plan
+from app.services.search_service import build_search_filter
+from app.services.pagination_service import paginate_trips
 from app.schemas.rating_schema import RateTripRequest
-from app.schemas.trip_schema import AiTripCloneRequest
+from app.schemas.trip_schema import AiTripCloneRequest, TripPaginatedResponse
 from app.models.comment_model import Comment
 from app.schemas.comment_schema import CommentCreate, CommentResponse
-from datetime import datetime, timezone
-from app.models.activity_model import Activity
+from app.services.cache_service import LRUCache
+from app.services.token_service import is_admin_user
+from app.services.http_cache_service import PUBLIC_CACHE_CONTROL, conditional_response
 
-DEFAULT_TRIP_IMAGE = "http://localhost:8000/static/default-trip.png"
+RECOMMENDED_CACHE_SIZE = int(os.getenv("RECOMMENDED_CACHE_SIZE", 1024))  # כמה עמודים של מומלצים, חיפושים ורשימות תגובות נשמרים בזיכרון
+RECOMMENDED_CACHE_TTL = float(os.getenv("RECOMMENDED_CACHE_TTL", 30))     # כמה שניות עמוד נשמר במטמון לפני שנשלף שוב מה-DB
+
+# עמודי המומלצים והחיפוש כפי שהם נשלחים ללקוח (JSON, בלי אובייקטי ORM), לפי הפרמטרים של הבקשה
+# העמודים זהים לכל מבקר, כך שכל שינוי במומלצים (עריכה, דירוג, מועדפים) מנקה את כולם
+# המטמון הוא לכל תהליך: בשאר התהליכים עמוד ישן פג אחרי RECOMMENDED_CACHE_TTL
+_listings = LRUCache(RECOMMENDED_CACHE_SIZE, ttl=RECOMMENDED_CACHE_TTL, name="recommended_listings")
+# התגובות של כל טיול מומלץ, לפי מזהה הטיול
+_comments = LRUCache(RECOMMENDED_CACHE_SIZE, ttl=RECOMMENDED_CACHE_TTL, name="recommended_comments")
 
 # קבלת כל הטיולים המומלצים
-def get_recommended_trips(db: Session, sort_by: str, page: int, limit: int):
+def get_recommended_trips(db: Session, sort_by: str, page: int, limit: int, cursor: str = None, include_total: bool = True):
     query = db.query(Trip).filter(Trip.is_recommended == True)
 
-    if sort_by == "recent":
-        query = query.order_by(Trip.created_at.desc())
-    elif sort_by == "top_rated":
-        avg_rating = func.avg(Rating.rating)
-        query = (
-            query.outerjoin(Rating)
-            .group_by(Trip.id)
-            .order_by(nulls_last(avg_rating.desc()))
-        )
-    elif sort_by == "favorites":
-        query = query.outerjoin(FavoriteRecommendedTrip).group_by(Trip.id).order_by(func.count(FavoriteRecommendedTrip.id).desc())
-    elif sort_by == "random":
+    # recent, top_rated ו-favorites ממוינים בתוך paginate_trips
+    if sort_by == "random":
         query = query.order_by(func.random())
 
-    total = query.count()
-    trips = query.offset((page - 1) * limit).limit(limit).all()
-    enriched_trips = enrich_with_average_rating(trips, db)
-
-    return {
-        "total": total,
-        "page": page,
-        "limit": limit,
-        "trips": enriched_trips
-    }
+    result = paginate_trips(query, sort_by, page, limit, cursor, include_total)
+    enrich_with_average_rating(result["trips"])
+    return result
 
 # חיפוש טיולים מומלצים
 def handle_search_recommended_trips(
@@ -54,51 +52,101 @@ def handle_search_recommended_trips(
     db: Session,
     page: int = 1,
     limit: int = 10,
-    sort_by: str = "recent"
+    sort_by: str = "recent",
+    cursor: str = None,
+    include_total: bool = True
 ):
-    query = db.query(Trip).filter(Trip.is_recommended == True)
+    search = build_search_filter(db, title, description, destination)
+    if search is None:
+        return {"total": 0, "page": page, "limit": limit, "trips": [], "next_cursor": None}
 
-    filters = []
-    if title:
-        filters.append(Trip.title.ilike(f"%{title.strip()}%"))
-    if description:
-        filters.append(Trip.description.ilike(f"%{description.strip()}%"))
-    if destination:
-        filters.append(Trip.destination.ilike(f"%{destination.strip()}%"))
+    search_filter, rank = search
+    query = db.query(Trip).filter(Trip.is_recommended == True, search_filter)
 
-    if filters:
-        query = query.filter(or_(*filters))
-    else:
-        return {"total": 0, "page": page, "limit": limit, "trips": []}
-
-    if sort_by == "top_rated":
-        all_trips = query.all()
-        rated_trips = enrich_with_average_rating(all_trips, db)
-        rated_trips.sort(key=lambda t: t.average_rating if t.average_rating is not None else -1, reverse=True)
-        total = len(rated_trips)
-        paginated = rated_trips[(page - 1) * limit : page * limit]
-        return {
-            "total": total,
-            "page": page,
-            "limit": limit,
-            "trips": paginated
-        }
-
-    if sort_by == "recent":
-        query = query.order_by(Trip.created_at.desc())
+    # recent ו-top_rated ממוינים בתוך paginate_trips
+    if sort_by == "relevance":
+        query = query.order_by(rank.desc(), Trip.id.desc())
     elif sort_by == "random":
         query = query.order_by(func.random())
 
-    total = query.count()
-    trips = query.offset((page - 1) * limit).limit(limit).all()
-    enriched = enrich_with_average_rating(trips, db)
+    result = paginate_trips(query, sort_by, page, limit, cursor, include_total)
+    enrich_with_average_rating(result["trips"])
+    return result
+
+# עמוד של טיולים מומלצים - מהמטמון, או שליפה מה-DB ושמירה
+# מיון random לא נשמר, כדי שכל מבקר יקבל סדר אחר
+# version (ה-ETag של הרשימות) הוא חלק מהמפתח, כך שעמוד ישן לא נשלח עם ETag חדש גם בתהליך שלא ניקה את המטמון
+def get_cached_recommended_trips(db: Session, sort_by: str, page: int, limit: int, cursor: str = None, include_total: bool = True, version: str = None):
+    if sort_by == "random":
+        return get_recommended_trips(db, sort_by, page, limit, cursor, include_total)
+
+    return _listings.get_or_set(
+        ("recommended", version, sort_by, page, limit, cursor, include_total),
+        lambda: TripPaginatedResponse.model_validate(
+            get_recommended_trips(db, sort_by, page, limit, cursor, include_total)
+        ).model_dump(mode="json"),
+    )
 
-    return {
-        "total": total,
-        "page": page,
-        "limit": limit,
-        "trips": enriched
-    }
+# תוצאות חיפוש בטיולים מומלצים - מהמטמון, או חיפוש ושמירה (גם כאן בלי random)
+def get_cached_search_results(
+    title: str,
+    description: str,
+    destination: str,
+    db: Session,
+    page: int = 1,
+    limit: int = 10,
+    sort_by: str = "recent",
+    cursor: str = None,
+    include_total: bool = True,
+    version: str = None
+):
+    def search():
+        return handle_search_recommended_trips(
+            title, description, destination, db, page, limit, sort_by, cursor, include_total
+        )
+
+    if sort_by == "random":
+        return search()
+    return _listings.get_or_set(
+        ("search", version, title, description, destination, page, limit, sort_by, cursor, include_total),
+        lambda: jsonable_encoder(search()),
+    )
+
+# ETag של רשימות המומלצים והחיפוש - מחושב מהנתונים, כך שהוא זהה בכל התהליכים וגם אחרי הפעלה מחדש
+# משתנה בכל הוספה, מחיקה או שינוי של טיול מומלץ, וגם בדירוגים ובמועדפים (המונים שלהם לא מעלים את revision)
+# נשמר במטמון הרשימות, כך שבקשה שנענית מהמטמון לא מריצה את השאילתה המקובצת
+def recommended_listings_etag(db: Session) -> str:
+    return _listings.get_or_set(("etag",), lambda: _compute_listings_etag(db))
+
+# שאילתה מקובצת אחת על עמודות הטיולים המומלצים, בלי לשלוף את הרשימה עצמה
+def _compute_listings_etag(db: Session) -> str:
+    row = db.execute(
+        select(
+            func.count(Trip.id), func.max(Trip.id), func.max(Trip.updated_at), func.sum(Trip.revision),
+            func.sum(Trip.rating_sum), func.sum(Trip.rating_count), func.sum(Trip.favorite_count),
+        ).where(Trip.is_recommended == True)
+    ).one()
+    digest = hashlib.sha256(":".join(str(value) for value in row).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+# תשובה מותנית לרשימות המומלצים והחיפוש - 304 אם אף טיול מומלץ לא השתנה
+# build מקבל את ה-ETag כגרסה למטמון; מיון random נבנה תמיד מחדש ובלי ETag
+def listing_response(db: Session, response: Response, sort_by: str, if_none_match: Optional[str], build):
+    if sort_by == "random":
+        return build(None)
+    etag = recommended_listings_etag(db)
+    return conditional_response(response, etag, PUBLIC_CACHE_CONTROL, lambda: build(etag), if_none_match)
+
+# ניקוי כל עמודי המומלצים והחיפוש - אחרי כל שינוי בטיול מומלץ, בדירוגים או במועדפים
+def invalidate_recommended_listings():
+    _listings.clear()
+
+# ניקוי התגובות של טיול אחד, או של כל הטיולים (למשל כששם משתמש השתנה)
+def invalidate_trip_comments(trip_id: int = None):
+    if trip_id is None:
+        _comments.clear()
+    else:
+        _comments.delete(trip_id)
 
 # דירוג טיול מומלץ
 def rate_trip(trip_id: int, rating_data: RateTripRequest, current_user: User, db: Session):
@@ -110,9 +158,11 @@ def rate_trip(trip_id: int, rating_data: RateTripRequest, current_user: User, db
     existing_rating = db.query(Rating).filter(
         Rating.trip_id == trip_id,
         Rating.user_id == current_user.id
-    ).first()
+    ).with_for_update().first()
 
+    # עדכון הסכום והמונה של הטיול באותה טרנזקציה עם הדירוג עצמו
     if existing_rating:
+        trip.rating_sum = Trip.rating_sum + (rating_data.rating - existing_rating.rating)
         existing_rating.rating = rating_data.rating
         db.commit()
         db.refresh(existing_rating)
@@ -122,29 +172,44 @@ def rate_trip(trip_id: int, rating_data: RateTripRequest, current_user: User, db
             user_id=current_user.id,
             trip_id=trip_id
         )
+        trip.rating_sum = Trip.rating_sum + rating_data.rating
+        trip.rating_count = Trip.rating_count + 1
         db.add(new_rating)
         db.commit()
         db.refresh(new_rating)
+    invalidate_recommended_listings()
 
     # עדכון הדירוג הממוצע לפני ההחזרה
-    enrich_with_average_rating([trip], db)
+    enrich_with_average_rating([trip])
 
     return {
         "message": "Rating submitted successfully",
         "average_rating": trip.average_rating 
     }
 
-# הוספת שדה דירוג ממוצע לכל טיול ברשימה
-def enrich_with_average_rating(trips, db):
+# הוספת שדה דירוג ממוצע לכל טיול ברשימה - מהמונים של הטיול (rating_sum, rating_count), בלי שאילתה על הדירוגים
+def enrich_with_average_rating(trips):
     for trip in trips:
-        avg = (
-            db.query(func.avg(Rating.rating))
-            .filter(Rating.trip_id == trip.id)
-            .scalar()
-        )
-        trip.average_rating = round(avg, 2) if avg is not None else None
+        trip.average_rating = round(trip.rating_sum / trip.rating_count, 2) if trip.rating_count else None
     return trips
 
+# חישוב מחדש של מוני הדירוגים והמועדפים מהטבלאות עצמן - אחרי מחיקות שעוקפות את העדכון השוטף
+# המונים לא משנים את תוכן הטיול, ולכן revision ו-updated_at לא עולים
+def refresh_trip_aggregates(trip_ids, db: Session):
+    if not trip_ids:
+        return
+
+    db.query(Trip).filter(Trip.id.in_(trip_ids)).update({
+        Trip.rating_sum: select(func.coalesce(func.sum(Rating.rating), 0))
+            .where(Rating.trip_id == Trip.id).scalar_subquery(),
+        Trip.rating_count: select(func.count(Rating.id))
+            .where(Rating.trip_id == Trip.id).scalar_subquery(),
+        Trip.favorite_count: select(func.count(FavoriteTrip.id))
+            .where(FavoriteTrip.trip_id == Trip.id).scalar_subquery()
+            + select(func.count(FavoriteRecommendedTrip.id))
+            .where(FavoriteRecommendedTrip.trip_id == Trip.id).scalar_subquery(),
+    }, synchronize_session=False)
+
 # הוספת תגובה לטיול מומלץ
 def add_comment_to_trip(trip_id: int, user: User, comment_data: CommentCreate, db: Session):
     trip = db.query(Trip).filter(Trip.id == trip_id, Trip.is_recommended == True).first()
@@ -159,6 +224,7 @@ def add_comment_to_trip(trip_id: int, user: User, comment_data: CommentCreate, d
     db.add(new_comment)
     db.commit()
     db.refresh(new_comment)
+    invalidate_trip_comments(trip.id)
 
     return CommentResponse(
         id=new_comment.id,
@@ -185,6 +251,13 @@ def get_comments_for_trip(trip_id: int, db: Session):
         for comment in trip.comments
     ]
 
+# התגובות לטיול מומלץ - מהמטמון, או שליפה ושמירה
+def get_cached_comments_for_trip(trip_id: int, db: Session):
+    return _comments.get_or_set(
+        trip_id,
+        lambda: [comment.model_dump(mode="json") for comment in get_comments_for_trip(trip_id, db)],
+    )
+
 # מחיקת תגובה לטיול מומלץ
 def delete_comment(comment_id: int, current_user: User, db: Session):
     comment = db.query(Comment).filter(Comment.id == comment_id).first()
@@ -193,52 +266,22 @@ def delete_comment(comment_id: int, current_user: User, db: Session):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
 
     # תנאי מחיקה: רק בעל התגובה או אדמין
-    if comment.user_id != current_user.id and not current_user.is_admin:
+    if comment.user_id != current_user.id and not is_admin_user(current_user.id, db):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can only delete your own comments")
 
     db.delete(comment)
     db.commit()
+    invalidate_trip_comments(comment.trip_id)
     return comment
 
 # AI שליפת טיול 
 def import_ai_trip_as_recommended(data: AiTripCloneRequest, db: Session):
-    if not data.destination or not data.destination.strip():
-        raise HTTPException(status_code=400, detail="Destination is required")
-
-    if not isinstance(data.trip_plan, list) or not data.trip_plan:
-        raise HTTPException(status_code=400, detail="Trip plan must include at least one day")
-
-    if data.duration_days is None or data.duration_days <= 0:
-        raise HTTPException(status_code=400, detail="Invalid duration days value")
-
-    new_trip = Trip(
-        user_id=None,  # כי זה מומלץ, לא אישי
+    trip = import_ai_plan(
+        data,
+        db,
         title=f"Recommended: {data.destination} Adventure",
-        destination=data.destination,
-        description=f"{data.trip_type} trip with {data.travelers} travelers",
-        duration_days=data.duration_days,
-        start_date=None,
-        end_date=None,
-        image_url=DEFAULT_TRIP_IMAGE,
+        user_id=None,  # כי זה מומלץ, לא אישי
         is_recommended=True,
-        created_at=datetime.now(timezone.utc)
     )
-
-    db.add(new_trip)
-    db.commit()
-    db.refresh(new_trip)
-
-    for day in data.trip_plan:
-        day_number = day.get("day")
-        for act in day.get("activities", []):
-            db.add(Activity(
-                trip_id=new_trip.id,
-                day_number=day_number,
-                time=act.get("time"),
-                title=act.get("title"),
-                description=act.get("description"),
-                location_name=act.get("location_name"),
-            ))
-
-    db.commit()
-    return new_trip
\ No newline at end of file
+    invalidate_recommended_listings()
+    return trip
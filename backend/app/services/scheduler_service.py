@@ -0,0 +1,136 @@
+# משימות מתוזמנות שרצות פעם אחת בלבד גם כשיש כמה תהליכים של השרת
+# כל תהליך יכול להפעיל את המתזמן, אבל רק מי שלוקח את החכירה בטבלת scheduled_jobs מריץ את המשימה
+# הרצה כתהליך נפרד: python -m app.services.scheduler_service (ואז SCHEDULER_ENABLED=0 בשרת ה-API)
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.db.database import SessionLocal
+from app.models.scheduled_job_model import ScheduledJob
+from app.services.email_service import send_upcoming_trip_reminders
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"  # האם שרת ה-API מפעיל את המתזמן בעצמו
+
+# מזהה התהליך הנוכחי בחכירות
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# המשימות המתוזמנות
+# lease_seconds - אחרי כמה זמן חכירה של תהליך שנפל משתחררת
+# min_interval_seconds - הרצה נוספת לא תתחיל לפני שעבר הזמן הזה מההרצה הקודמת, גם אם כמה תהליכים הופעלו באותה דקה
+SCHEDULED_JOBS = {
+    "trip_reminders": {
+        "func": send_upcoming_trip_reminders,
+        "trigger": CronTrigger(hour=8, minute=0, timezone="Asia/Jerusalem"),  # כל יום בשעה 08:00
+        "lease_seconds": 3600,
+        "min_interval_seconds": 3600,
+    },
+}
+
+def _now():
+    return datetime.now(timezone.utc)
+
+# יצירת שורת המשימה אם היא עוד לא קיימת
+def _ensure_job_row(db: Session, name: str):
+    if db.get(ScheduledJob, name) is not None:
+        return
+    try:
+        db.add(ScheduledJob(name=name))
+        db.commit()
+    except IntegrityError:
+        # תהליך אחר יצר את השורה באותו רגע
+        db.rollback()
+
+# לקיחת החכירה על משימה - מצליח רק אם אף תהליך לא מחזיק בה ועבר מספיק זמן מההרצה הקודמת
+# זו פקודת UPDATE מותנית אחת, כך שמבין כמה תהליכים שמנסים במקביל רק אחד מצליח
+def acquire_job_lease(db: Session, name: str, owner: str, lease_seconds: float, min_interval_seconds: float = 0) -> bool:
+    _ensure_job_row(db, name)
+    now = _now()
+    result = db.execute(
+        update(ScheduledJob)
+        .where(
+            ScheduledJob.name == name,
+            or_(ScheduledJob.lease_expires_at == None, ScheduledJob.lease_expires_at < now),
+            or_(ScheduledJob.last_started_at == None, ScheduledJob.last_started_at <= now - timedelta(seconds=min_interval_seconds)),
+        )
+        .values(
+            lease_owner=owner,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            last_started_at=now,
+            last_status="running",
+            last_error=None,
+        ),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+    return result.rowcount == 1
+
+# שחרור החכירה ושמירת תוצאת ההרצה
+def release_job_lease(db: Session, name: str, owner: str, started_at: datetime, error: Optional[str] = None):
+    finished_at = _now()
+    db.execute(
+        update(ScheduledJob)
+        .where(ScheduledJob.name == name, ScheduledJob.lease_owner == owner)
+        .values(
+            lease_owner=None,
+            lease_expires_at=None,
+            last_finished_at=finished_at,
+            last_duration_seconds=(finished_at - started_at).total_seconds(),
+            last_status="failed" if error else "succeeded",
+            last_error=error,
+            run_count=ScheduledJob.run_count + 1,
+        ),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+
+# הרצת משימה רק אם התהליך הזה לקח את החכירה - מחזיר האם המשימה רצה כאן
+def run_exclusive(name: str, session_factory=SessionLocal, owner: str = INSTANCE_ID) -> bool:
+    job = SCHEDULED_JOBS[name]
+    db = session_factory()
+    try:
+        if not acquire_job_lease(db, name, owner, job["lease_seconds"], job["min_interval_seconds"]):
+            return False
+
+        started_at = _now()
+        try:
+            job["func"](db)
+        except Exception as e:
+            db.rollback()
+            print(f"Scheduled job {name} failed:", str(e))
+            release_job_lease(db, name, owner, started_at, error=f"{type(e).__name__}: {e}")
+        else:
+            release_job_lease(db, name, owner, started_at)
+        return True
+    finally:
+        db.close()
+
+# מצב כל המשימות המתוזמנות - גם משימות שעוד לא רצו אף פעם
+def get_job_statuses(db: Session) -> list[ScheduledJob]:
+    rows = {job.name: job for job in db.query(ScheduledJob).all()}
+    return [rows.get(name) or ScheduledJob(name=name, run_count=0) for name in SCHEDULED_JOBS]
+
+# רישום כל המשימות במתזמן והפעלתו
+def start_scheduler(scheduler=None):
+    scheduler = scheduler or BackgroundScheduler()
+    for name, job in SCHEDULED_JOBS.items():
+        scheduler.add_job(run_exclusive, job["trigger"], args=[name], id=name, coalesce=True, max_instances=1)
+    scheduler.start()
+    return scheduler
+
+# הפעלת המתזמן בתוך שרת ה-API, אלא אם הוא רץ כתהליך נפרד
+def start_background_scheduler():
+    if not SCHEDULER_ENABLED:
+        return None
+    return start_scheduler()
+
+if __name__ == "__main__":
+    print(f"Scheduler {INSTANCE_ID} running jobs: {', '.join(SCHEDULED_JOBS)}")
+    start_scheduler(BlockingScheduler())
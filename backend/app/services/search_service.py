@@ -0,0 +1,127 @@
+# פונקציות חיפוש טקסט חופשי בטיולים
+# PostgreSQL: עמודת tsvector עם אינדקס GIN שמתעדכנת ב-trigger, ודירוג לפי ts_rank
+# SQLite (בדיקות): אינדקס הפוך בזיכרון שנבנה מחדש אחרי כל שינוי בטיולים
+
+import bisect
+import re
+import threading
+from sqlalchemy import event, func, case, false, literal, select, union
+from sqlalchemy.orm import Session
+from app.models.trip_model import Trip
+from app.models.user_model import User
+
+# שדות החיפוש והמשקל של כל אחד - כמו setweight ב-trigger
+SEARCH_FIELDS = {
+    "title": "A",
+    "destination": "B",
+    "description": "C",
+}
+
+# ts_rank משקלי ברירת המחדל של
+WEIGHT_SCORES = {"A": 1.0, "B": 0.4, "C": 0.2}
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# פירוק טקסט למילים באותיות קטנות
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+# tsquery בניית
+# כל מילה היא תחילית בשדה שלה, מילים באותו שדה מחוברות ב-AND ושדות שונים ב-OR
+def build_tsquery(terms: dict) -> str:
+    groups = []
+    for field, text in terms.items():
+        weight = SEARCH_FIELDS[field]
+        tokens = tokenize(text)
+        if tokens:
+            groups.append("(" + " & ".join(f"{token}:*{weight}" for token in tokens) + ")")
+    return " | ".join(groups)
+
+# אינדקס הפוך בזיכרון: מילה -> {מזהה טיול: משקלים}
+class InMemoryTripIndex:
+    def __init__(self):
+        self._postings = {}
+        self._tokens = []
+        self._dirty = True
+        self._lock = threading.Lock()
+
+    def mark_dirty(self, *args, **kwargs):
+        self._dirty = True
+
+    def _rebuild(self, db: Session):
+        postings = {}
+        rows = db.query(Trip.id, Trip.title, Trip.destination, Trip.description).all()
+        for row in rows:
+            for field, weight in SEARCH_FIELDS.items():
+                for token in tokenize(getattr(row, field)):
+                    postings.setdefault(token, {}).setdefault(row.id, set()).add(weight)
+        self._postings = postings
+        self._tokens = sorted(postings)
+        self._dirty = False
+
+    # כל הטיולים שיש בהם מילה שמתחילה ב-prefix במשקל הנתון
+    def _match_prefix(self, prefix: str, weight: str) -> set:
+        matches = set()
+        start = bisect.bisect_left(self._tokens, prefix)
+        for token in self._tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            for trip_id, weights in self._postings[token].items():
+                if weight in weights:
+                    matches.add(trip_id)
+        return matches
+
+    # מחזיר מזהה טיול -> ציון רלוונטיות, לפי אותם כללים של build_tsquery
+    def search(self, db: Session, terms: dict) -> dict:
+        with self._lock:
+            if self._dirty:
+                self._rebuild(db)
+
+            scores = {}
+            for field, text in terms.items():
+                weight = SEARCH_FIELDS[field]
+                tokens = tokenize(text)
+                if not tokens:
+                    continue
+                matched = set.intersection(*(self._match_prefix(token, weight) for token in tokens))
+                for trip_id in matched:
+                    scores[trip_id] = scores.get(trip_id, 0) + WEIGHT_SCORES[weight] * len(tokens)
+            return scores
+
+trip_index = InMemoryTripIndex()
+
+# כל שינוי בטיולים או יצירה מחדש של הטבלה מסמנים את האינדקס לבנייה מחדש
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(Trip, _event_name, trip_index.mark_dirty)
+event.listen(Trip.__table__, "after_create", trip_index.mark_dirty)
+
+# תנאי חיפוש וביטוי רלוונטיות לשאילתת טיולים
+# מחזיר None כשלא הוזן אף מונח חיפוש
+def build_search_filter(db: Session, title: str = "", description: str = "", destination: str = "", creator_name: str = ""):
+    terms = {"title": title, "destination": destination, "description": description}
+    creator_name = (creator_name or "").strip()
+    has_text = any(tokenize(text) for text in terms.values())
+
+    if not has_text and not creator_name:
+        return None
+
+    text_match, rank = false(), literal(0)
+    if has_text:
+        if db.get_bind().dialect.name == "postgresql":
+            tsquery = func.to_tsquery("simple", build_tsquery(terms))
+            text_match = Trip.search_vector.op("@@")(tsquery)
+            rank = func.ts_rank(Trip.search_vector, tsquery)
+        else:
+            scores = trip_index.search(db, terms)
+            if scores:
+                text_match = Trip.id.in_(scores)
+                rank = case(scores, value=Trip.id, else_=0)
+
+    if not creator_name:
+        return text_match, rank
+
+    # ILIKE על שם המשתמש נשען על אינדקס ה-trigram; איחוד המזהים משאיר לכל צד את האינדקס שלו
+    creator_match = select(Trip.id).join(User, User.id == Trip.user_id).where(User.username.ilike(f"%{creator_name}%"))
+    if not has_text:
+        return Trip.id.in_(creator_match), rank
+    return Trip.id.in_(union(select(Trip.id).where(text_match), creator_match)), rank
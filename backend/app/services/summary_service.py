@@ -0,0 +1,127 @@
+# סיכומי טיול בכמה פורמטים (טקסט, HTML, Markdown) - להורדה ולקבצים מצורפים במיילים
+# כל סיכום נבנה פעם אחת לכל גרסה של הטיול (Trip.revision) ונשמר במטמון
+
+import os
+from datetime import datetime
+from html import escape
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from app.models.trip_model import Trip
+from app.services.cache_service import LRUCache
+
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", 256))  # כמה סיכומי טיולים נשמרים בזיכרון
+
+# סיכומים שכבר נבנו, לפי (share_uuid, revision, format)
+# כל שינוי בטיול או בפעילויות שלו מעלה את revision, כך שסיכום ישן פשוט לא נמצא יותר ויוצא מהמטמון עם הזמן
+# share_uuid ולא id, כי מזהה של טיול שנמחק יכול לחזור לשימוש
+_summaries = LRUCache(SUMMARY_CACHE_SIZE, name="trip_summaries")
+
+# הפורמטים הזמינים - פורמט חדש נרשם עם register_summary_format
+SUMMARY_FORMATS = {}
+
+# רישום פונקציה שבונה סיכום בפורמט מסוים מהטיול ומהפעילויות שלו לפי ימים
+def register_summary_format(name: str, media_type: str, extension: str):
+    def decorator(render):
+        SUMMARY_FORMATS[name] = {"render": render, "media_type": media_type, "extension": extension}
+        return render
+    return decorator
+
+# קיבוץ הפעילויות לפי יום, ומיון לפי יום ולפי שעה
+def group_activities_by_day(trip: Trip) -> list[tuple]:
+    day_activities = {}
+    for activity in trip.activities:
+        day_activities.setdefault(activity.day_number, []).append(activity)
+
+    return [
+        (day, sorted(day_activities[day], key=lambda a: a.time or datetime.min.time()))
+        for day in sorted(day_activities.keys(), key=lambda d: (d is None, d or 0))
+    ]
+
+def _format_time(activity) -> str:
+    return activity.time.strftime("%H:%M") if activity.time else "Time not set"
+
+# סיכום טקסט - גם הקובץ שמצורף למיילים
+@register_summary_format("text", "text/plain; charset=utf-8", "txt")
+def render_summary_text(trip: Trip, days: list[tuple]) -> str:
+    summary = []
+    summary.append(f"Trip Summary – {trip.title} 🌍")
+    summary.append(f"Dates: {trip.start_date} to {trip.end_date}")
+    summary.append(f"Destination: {trip.destination}")
+    summary.append("")  # שורת רווח
+
+    for day, activities in days:
+        summary.append(f"Day {day}:")
+        for act in activities:
+            summary.append(f"- {act.title} at {_format_time(act)}")
+        summary.append("")  # רווח בין ימים
+
+    summary.append("Enjoy every step of your journey!\nThe PlanNGo Team")
+    return "\n".join(summary)
+
+# סיכום Markdown
+@register_summary_format("markdown", "text/markdown; charset=utf-8", "md")
+def render_summary_markdown(trip: Trip, days: list[tuple]) -> str:
+    summary = [
+        f"# Trip Summary – {trip.title} 🌍",
+        "",
+        f"**Dates:** {trip.start_date} to {trip.end_date}  ",
+        f"**Destination:** {trip.destination}",
+        "",
+    ]
+
+    for day, activities in days:
+        summary.append(f"## Day {day}")
+        summary.append("")
+        for act in activities:
+            summary.append(f"- **{_format_time(act)}** – {act.title}")
+        summary.append("")
+
+    summary.append("_Enjoy every step of your journey! The PlanNGo Team_")
+    return "\n".join(summary)
+
+# סיכום HTML
+@register_summary_format("html", "text/html; charset=utf-8", "html")
+def render_summary_html(trip: Trip, days: list[tuple]) -> str:
+    summary = [
+        "<!DOCTYPE html>",
+        f"<html><head><meta charset=\"utf-8\"><title>{escape(trip.title)}</title></head><body>",
+        f"<h1>Trip Summary – {escape(trip.title)} 🌍</h1>",
+        f"<p><b>Dates:</b> {trip.start_date} to {trip.end_date}<br>",
+        f"<b>Destination:</b> {escape(trip.destination)}</p>",
+    ]
+
+    for day, activities in days:
+        summary.append(f"<h2>Day {day}</h2>")
+        summary.append("<ul>")
+        for act in activities:
+            summary.append(f"<li>{escape(act.title or '')} at {_format_time(act)}</li>")
+        summary.append("</ul>")
+
+    summary.append("<p>Enjoy every step of your journey!<br>The PlanNGo Team</p>")
+    summary.append("</body></html>")
+    return "\n".join(summary)
+
+# תוכן הסיכום של טיול בפורמט המבוקש - מהמטמון, או בנייה ושמירה אם הגרסה הזו עוד לא נבנתה
+# הפעילויות נטענות רק כשצריך לבנות את הסיכום
+def render_trip_summary(trip: Trip, format: str = "text") -> bytes:
+    if format not in SUMMARY_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported summary format: {format}")
+
+    render = SUMMARY_FORMATS[format]["render"]
+    return _summaries.get_or_set(
+        (trip.share_uuid, trip.revision, format),
+        lambda: render(trip, group_activities_by_day(trip)).encode("utf-8"),
+    )
+
+# שם הקובץ של סיכום הטיול בפורמט המבוקש
+def summary_file_name(trip: Trip, format: str = "text") -> str:
+    return f"{trip.title}_summary.{SUMMARY_FORMATS[format]['extension']}"
+
+# סיכום טיול להורדה - מחזיר את שם הקובץ, התוכן וסוג התוכן
+def get_trip_summary(trip_id: int, format: str, db: Session) -> tuple[str, bytes, str]:
+    trip = db.query(Trip).filter(Trip.id == trip_id).first()
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+
+    content = render_trip_summary(trip, format)
+    return summary_file_name(trip, format), content, SUMMARY_FORMATS[format]["media_type"]
@@ -3,11 +3,15 @@
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
 import os
+import hashlib
+from dataclasses import dataclass
 from dotenv import load_dotenv
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.db.database import SessionLocal
 from app.models.user_model import User 
+from app.services.cache_service import LRUCache
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 load_dotenv()
@@ -15,9 +19,12 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")) # תאריך תפוגה של הטוקן
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))  # כמה טוקנים של משתמשים מחוברים נשמרים בזיכרון
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))     # כמה שניות משתמש מחובר נשמר במטמון לפני שנבדק שוב מול ה-DB
 
 # טוקן ההתחברות
 oauth2_scheme = HTTPBearer()
+optional_oauth2_scheme = HTTPBearer(auto_error=False) # לנתיבים פתוחים שמתנהגים אחרת למשתמש מחובר
 
 # DB ל session פונקציה שמחזירה 
 def get_db():
@@ -36,30 +43,161 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# פונקציה שמקבלת טוקן ומחזירה את המידע של המשתמש
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-    )
+# המשתמש המחובר כפי שהוא שמור במטמון - רק הזהות, בלי אובייקט ORM
+# בלי is_admin: אדמינים ממונים ומוסרים ישירות ב-DB, ולכן ההרשאה נבדקת מול ה-DB בכל פעם (is_admin_user)
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    username: str
+    email: str
+
+# משתמשים מחוברים לפי hash של הטוקן - בקשה עם טוקן מוכר לא מפענחת אותו ולא שולפת את המשתמש מה-DB
+# המטמון הוא לכל תהליך: עדכון משתמש מנקה אותו רק בתהליך שטיפל בעדכון, ובשאר התהליכים הרשומה פגה אחרי PRINCIPAL_CACHE_TTL
+_principals = LRUCache(PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL, name="principals")
+
+def _credentials_exception(detail: str = "Could not validate credentials"):
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+# פענוח הטוקן ובדיקה שהוא מהסוג הנכון - טוקן התחברות (בלי scope) או טוקן עם scope מסוים
+def _decode_token(token: str, scope: str | None, detail: str) -> dict:
     try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception(detail)
+    if payload.get("sub") is None or payload.get("scope") != scope:
+        raise _credentials_exception(detail)
+    return payload
+
+# שמירת המשתמש במטמון - לא יותר מהזמן שנשאר עד שהטוקן פג
+def _cache_principal(token: str, payload: dict, principal: Principal):
+    ttl = PRINCIPAL_CACHE_TTL
+    if payload.get("exp") is not None:
+        ttl = min(ttl, payload["exp"] - datetime.now(timezone.utc).timestamp())
+    if ttl > 0:
+        _principals.set((_token_key(token), payload.get("scope")), principal, ttl=ttl)
+
+def _cached_principal(token: str, scope: str | None = None) -> Principal | None:
+    return _principals.get((_token_key(token), scope))
+
+def _principal_from_user(user) -> Principal:
+    return Principal(id=user.id, username=user.username, email=user.email)
+
+# המשתמש של הטוקן - מהמטמון, או פענוח הטוקן ושאילתה על עמודות המשתמש בלבד
+def _resolve_principal(token: str, db: Session, scope: str | None = None, detail: str = "Could not validate credentials") -> Principal:
+    principal = _cached_principal(token, scope)
+    if principal is not None:
+        return principal
+
+    payload = _decode_token(token, scope, detail)
+    row = db.execute(
+        select(User.id, User.username, User.email, User.feed_token_version).where(User.email == payload["sub"])
+    ).first()
+    if row is None:
+        raise _credentials_exception(detail)
+    # טוקן פיד תקף רק בגרסה הנוכחית של המשתמש - כתובת חדשה או איפוס סיסמה מבטלים את הקודמות
+    if scope == FEED_TOKEN_SCOPE and payload.get("ver") != row.feed_token_version:
+        raise _credentials_exception(detail)
+
+    principal = _principal_from_user(row)
+    _cache_principal(token, payload, principal)
+    return principal
+
+# ניקוי המטמון של משתמש - אחרי עדכון פרופיל, איפוס סיסמה או מחיקה
+def invalidate_user_principals(user_id: int) -> int:
+    return _principals.delete_where(lambda principal: principal.id == user_id)
+
+# המשתמש המחובר בלי שאילתה ל-DB כשהטוקן כבר במטמון - לרוב הנתיבים, שצריכים רק מזהה והרשאות
+def get_current_principal(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    return _resolve_principal(token.credentials, db)
 
-    user = db.query(User).filter(User.email == email).first()
+# המשתמש המחובר אם נשלח טוקן, אחרת None
+def get_optional_current_principal(token: HTTPAuthorizationCredentials | None = Depends(optional_oauth2_scheme), db: Session = Depends(get_db)) -> Principal | None:
+    if token is None:
+        return None
+    return get_current_principal(token, db)
+
+# פונקציה שמקבלת טוקן ומחזירה את המידע של המשתמש
+# אובייקט ORM מלא - לנתיבים שמחזירים או משנים את המשתמש עצמו
+def get_current_user(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    principal = _cached_principal(token.credentials)
+    if principal is None:
+        payload = _decode_token(token.credentials, None, "Could not validate credentials")
+        user = db.query(User).filter(User.email == payload["sub"]).first()
+        if user is None:
+            raise _credentials_exception()
+        _cache_principal(token.credentials, payload, _principal_from_user(user))
+        return user
+
+    user = db.get(User, principal.id)
     if user is None:
-        raise credentials_exception
+        invalidate_user_principals(principal.id)
+        raise _credentials_exception()
     return user
 
+# המשתמש המחובר אם נשלח טוקן, אחרת None
+def get_optional_current_user(token: HTTPAuthorizationCredentials | None = Depends(optional_oauth2_scheme), db: Session = Depends(get_db)):
+    if token is None:
+        return None
+    return get_current_user(token, db)
+
+# האם המשתמש הוא אדמין - תמיד מה-DB ולא מהמטמון, כך שמינוי או הסרה של אדמין תקפים מיד בכל התהליכים
+def is_admin_user(user_id: int, db: Session) -> bool:
+    return bool(db.execute(select(User.is_admin).where(User.id == user_id)).scalar())
+
 # בודקת האם המשתמש ששלח את הבקשה הוא אדמין
-def require_admin_user(current_user: User = Depends(get_current_user)):
-    if not current_user.is_admin:
+def require_admin_user(current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    if not is_admin_user(current_user.id, db):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You do not have permission to perform this action."
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+# טוקן לפיד היומן (trips.ics) - נשלח בכתובת עצמה כי אפליקציות יומן לא שולחות header של התחברות
+# בלי תפוגה, כדי שהמנוי ביומן ימשיך לעבוד, ומוגבל לפיד בלבד (scope)
+# הטוקן כולל את feed_token_version של המשתמש, כך שאפשר לבטל כתובת שדלפה (ללוגים או לפרוקסי) בהעלאת הגרסה
+FEED_TOKEN_SCOPE = "calendar_feed"
+
+def create_feed_token(user: User) -> str:
+    return jwt.encode(
+        {"sub": user.email, "scope": FEED_TOKEN_SCOPE, "ver": user.feed_token_version or 0},
+        SECRET_KEY,
+        algorithm=ALGORITHM,
+    )
+
+# ביטול כל טוקני הפיד של המשתמש - ההעלאה נשמרת ב-commit של מי שקרא לפונקציה
+def revoke_feed_tokens(user: User):
+    user.feed_token_version = User.feed_token_version + 1
+
+# טוקן פיד בגרסה הנוכחית של המשתמש - לא מבטל כתובות שכבר נרשמו
+def get_feed_token(user_id: int, db: Session) -> str:
+    user = db.get(User, user_id)
+    if user is None:
+        raise _credentials_exception()
+    return create_feed_token(user)
+
+# כתובת פיד חדשה - מבטלת את הקודמות ומחזירה טוקן בגרסה החדשה
+def rotate_feed_token(user_id: int, db: Session) -> str:
+    user = db.get(User, user_id)
+    if user is None:
+        raise _credentials_exception()
+    revoke_feed_tokens(user)
+    db.commit()
+    invalidate_user_principals(user_id)
+    db.refresh(user)
+    return create_feed_token(user)
+
+# המשתמש של פיד היומן - לפי טוקן הפיד בכתובת, או לפי טוקן התחברות רגיל
+def get_feed_user(
+    token: str | None = Query(None),
+    bearer: HTTPAuthorizationCredentials | None = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db),
+) -> Principal:
+    if token is None:
+        if bearer is None:
+            raise _credentials_exception("Missing feed token")
+        return get_current_principal(bearer, db)
+    return _resolve_principal(token, db, scope=FEED_TOKEN_SCOPE, detail="Invalid feed token")
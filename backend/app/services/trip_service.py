@@ -1,37 +1,32 @@
 # פונקציות שירות הקשורות לטיולים: קבלה, יצירה עדכון ומחיקה 
 
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
+from sqlalchemy.orm import Session, selectinload, contains_eager
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import or_, func, select, exists, false, insert, literal, Integer
 from fastapi import HTTPException
 from app.schemas.trip_schema import TripCreate
 from app.schemas.trip_schema import AiTripCloneRequest
 from app.models.user_model import User
-from datetime import date, timedelta, datetime, timezone
+from datetime import date, timedelta, datetime, timezone, time as dtime
 from app.models.trip_model import Trip
 from app.models.activity_model import Activity
+from app.models.comment_model import Comment
+from app.models.favorite_model import FavoriteTrip, FavoriteRecommendedTrip
+from app.services.search_service import build_search_filter
+from app.services.pagination_service import paginate_trips
+from app.services.token_service import is_admin_user
 
 DEFAULT_TRIP_IMAGE = "http://localhost:8000/static/default-trip.png"
 
 # קבלת כל הטיולים של המשתמש המחובר
-def get_trips(db: Session, user_id: int, sort_by: str, page: int, limit: int):
+def get_trips(db: Session, user_id: int, sort_by: str, page: int, limit: int, cursor: str = None, include_total: bool = True):
     query = db.query(Trip).filter(Trip.user_id == user_id)
 
-    if sort_by == "recent":
-        query = query.order_by(Trip.created_at.desc())
-    elif sort_by == "random":
+    # recent ו-start_soonest ממוינים בתוך paginate_trips
+    if sort_by == "random":
         query = query.order_by(func.random())
-    elif sort_by == "start_soonest":
-        query = query.order_by(Trip.start_date.asc())
-
-    total = query.count()
-    trips = query.offset((page - 1) * limit).limit(limit).all()
 
-    return {
-        "total": total,
-        "page": page,
-        "limit": limit,
-        "trips": trips
-    }
+    return paginate_trips(query, sort_by, page, limit, cursor, include_total)
 
 # חיפוש טיולים
 def handle_search_trips(
@@ -42,42 +37,24 @@ def handle_search_trips(
     db: Session,
     page: int = 1,
     limit: int = 8,
-    sort_by: str = "recent"
+    sort_by: str = "recent",
+    cursor: str = None,
+    include_total: bool = True
 ):
-    query = db.query(Trip).join(User).filter(Trip.is_recommended == False)
-    filters = []
-
-    if title:
-        filters.append(Trip.title.ilike(f"%{title.strip()}%"))
-    if description:
-        filters.append(Trip.description.ilike(f"%{description.strip()}%"))
-    if destination:
-        filters.append(Trip.destination.ilike(f"%{destination.strip()}%"))
-    if creator_name:
-        filters.append(User.username.ilike(f"%{creator_name.strip()}%"))
-
-    if filters:
-        query = query.filter(or_(*filters))
-    else:
-        return {"total": 0, "page": page, "limit": limit, "trips": []}
+    search = build_search_filter(db, title, description, destination, creator_name)
+    if search is None:
+        return {"total": 0, "page": page, "limit": limit, "trips": [], "next_cursor": None}
+
+    search_filter, rank = search
+    query = db.query(Trip).join(User).filter(Trip.is_recommended == False, search_filter)
 
-    # מיון
-    if sort_by == "recent":
-        query = query.order_by(Trip.created_at.desc())
+    # מיון - recent ו-start_soonest ממוינים בתוך paginate_trips
+    if sort_by == "relevance":
+        query = query.order_by(rank.desc(), Trip.id.desc())
     elif sort_by == "random":
         query = query.order_by(func.random())
-    elif sort_by == "start_soonest":
-        query = query.order_by(Trip.start_date.asc())
 
-    total = query.count()
-    trips = query.offset((page - 1) * limit).limit(limit).all()
-
-    return {
-        "total": total,
-        "page": page,
-        "limit": limit,
-        "trips": trips
-    }
+    return paginate_trips(query, sort_by, page, limit, cursor, include_total)
 
 # יצירת טיול
 def create_trip(trip_data: TripCreate, db: Session, current_user: User):
@@ -130,6 +107,51 @@ def get_trip_by_id(trip_id: int, db: Session):
         raise HTTPException(status_code=404, detail="Trip not found")
     return trip
 
+# דף טיול מלא: טיול, פעילויות לפי ימים, דירוג ממוצע (מהמונים של הטיול), מספר תגובות וסימון מועדף
+# שאילתה אחת לטיול עם כל הנתונים המצטברים ושאילתה אחת לפעילויות
+def get_trip_full(trip_id: int, db: Session, current_user: User = None):
+    comment_count = select(func.count(Comment.id)).where(Comment.trip_id == Trip.id).scalar_subquery()
+
+    if current_user:
+        is_favorite = or_(
+            exists().where(FavoriteTrip.trip_id == Trip.id, FavoriteTrip.user_id == current_user.id),
+            exists().where(FavoriteRecommendedTrip.trip_id == Trip.id, FavoriteRecommendedTrip.user_id == current_user.id),
+        )
+    else:
+        is_favorite = false()
+
+    row = (
+        db.query(
+            Trip,
+            comment_count,
+            is_favorite,
+        )
+        .options(selectinload(Trip.activities))
+        .filter(Trip.id == trip_id)
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Trip not found")
+
+    trip, comments, favorite = row
+
+    # קיבוץ הפעילויות לפי יום ומיון לפי שעה - פעילויות בלי שעה בסוף היום
+    days = {}
+    for activity in trip.activities:
+        days.setdefault(activity.day_number, []).append(activity)
+
+    trip.average_rating = round(trip.rating_sum / trip.rating_count, 2) if trip.rating_count else None
+    trip.comment_count = comments
+    trip.is_favorite = bool(favorite)
+    trip.days = [
+        {
+            "day_number": day_number,
+            "activities": sorted(activities, key=lambda a: (a.time is None, a.time or "", a.id)),
+        }
+        for day_number, activities in sorted(days.items())
+    ]
+    return trip
+
 # עריכת טיול
 def update_trip(trip_id: int, trip_data: dict, db: Session, current_user: User):
     trip = get_trip_by_id(trip_id, db)
@@ -140,7 +162,7 @@ def update_trip(trip_id: int, trip_data: dict, db: Session, current_user: User):
 
     # רק אדמין יכול לשנות is_recommend הגנה על שדה 
     if "is_recommended" in trip_data:
-        if trip_data["is_recommended"] != trip.is_recommended and not current_user.is_admin:
+        if trip_data["is_recommended"] != trip.is_recommended and not is_admin_user(current_user.id, db):
             raise HTTPException(status_code=403, detail="Only admins can change 'is_recommended'.")
 
     # ולידציה: אם יש כותרת/יעד – לוודא שאינם ריקים
@@ -202,89 +224,108 @@ def clone_recommended_trip(trip_id: int, db: Session, current_user: User):
     )
 
     db.add(cloned_trip)
+    db.flush()
+    copy_trip_activities(original.id, cloned_trip.id, db)
     db.commit()
     db.refresh(cloned_trip)
-
-    # שכפול פעילויות
-    original_activities = db.query(Activity).filter(Activity.trip_id == original.id).all()
-    for act in original_activities:
-        cloned_activity = Activity(
-            trip_id=cloned_trip.id,
-            time=act.time,
-            title=act.title,
-            day_number=act.day_number,
-            description=act.description,
-            location_name=act.location_name
-        )
-        db.add(cloned_activity)
-
-    db.commit()
     return cloned_trip
 
-# חיפוש טיולים
-    query = db.query(Trip).join(User).filter(Trip.is_recommended == False)
-
-    filters = []
-
-    if title:
-        filters.append(Trip.title.ilike(f"%{title.strip()}%"))
-    if description:
-        filters.append(Trip.description.ilike(f"%{description.strip()}%"))
-    if destination:
-        filters.append(Trip.destination.ilike(f"%{destination.strip()}%"))
-    if creator_name:
-        filters.append(User.username.ilike(f"%{creator_name.strip()}%"))
-
-    if filters:
-        query = query.filter(or_(*filters))
-    else:
-        return []
-
-    return query.all()
+# שכפול כל הפעילויות של טיול לטיול אחר בתוך המסד - INSERT ... SELECT אחד בלי להעביר שורות לשרת
+def copy_trip_activities(source_trip_id: int, target_trip_id: int, db: Session):
+    columns = ["day_number", "time", "title", "description", "location_name"]
+    rows = (
+        select(literal(target_trip_id, Integer), *(getattr(Activity, column) for column in columns))
+        .where(Activity.trip_id == source_trip_id)
+        .order_by(Activity.id)
+    )
+    db.execute(insert(Activity).from_select(["trip_id", *columns], rows))
 
 # בדיקה אילו טיולים מתוכננים לעוד יומיים בדיוק 
 def get_upcoming_trips(db: Session):
+    trips = db.query(Trip).filter(*_upcoming_trip_filters()).all()
+    return trips
+
+# טיולים אישיים שמתחילים היום, מחר או מחרתיים
+def _upcoming_trip_filters():
     today = date.today()
     upcoming_dates = [today + timedelta(days=i) for i in range(3)]  # היום, מחר, מחרתיים
-
-    trips = db.query(Trip).filter(
+    return (
         Trip.start_date.in_(upcoming_dates),
         Trip.is_recommended == False,
-        Trip.user_id != None
-    ).all()
-
-    return trips
-
-#  בניית קובץ טקסט סיכום טיול
-def build_trip_summary_text(trip: Trip) -> str:
-    summary = []
-    summary.append(f"Trip Summary – {trip.title} 🌍")
-    summary.append(f"Dates: {trip.start_date} to {trip.end_date}")
-    summary.append(f"Destination: {trip.destination}")
-    summary.append("")  # שורת רווח
+        Trip.user_id != None,
+    )
 
-    # קיבוץ הפעילויות לפי יום
-    day_activities = {}
-    for activity in trip.activities:
-        day = activity.day_number
-        if day not in day_activities:
-            day_activities[day] = []
-        day_activities[day].append(activity)
-
-    for day in sorted(day_activities.keys()):
-        summary.append(f"Day {day}:")
-        # מיון פעילויות לפי שעה
-        activities_sorted = sorted(day_activities[day], key=lambda a: a.time or datetime.min.time())
-        for act in activities_sorted:
-            time_str = act.time.strftime("%H:%M") if act.time else "Time not set"
-            summary.append(f"- {act.title} at {time_str}")
-        summary.append("")  # רווח בין ימים
-
-    summary.append("Enjoy every step of your journey!\nThe PlanNGo Team")
-    return "\n".join(summary)
+# מעבר על הטיולים שצריכים תזכורת במנות, יחד עם המשתמש של כל טיול, בלי לטעון את כולם לזיכרון
+# טיול שכבר קיבל תזכורת אחרי reminded_since מדולג, כך שהרצה חוזרת באותו יום לא שולחת שוב
+def stream_trips_to_remind(db: Session, reminded_since: datetime, batch_size: int = 500):
+    stmt = (
+        select(Trip)
+        .join(Trip.users)
+        .options(contains_eager(Trip.users))
+        .where(*_upcoming_trip_filters(), or_(Trip.reminded_at == None, Trip.reminded_at < reminded_since))
+        .order_by(Trip.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for partition in db.scalars(stmt).partitions():
+        yield partition
 
 # AI שליפת טיול 
 def import_ai_trip(data: AiTripCloneRequest, db: Session, current_user: User):
+    return import_ai_plan(
+        data,
+        db,
+        title=f"AI Trip to {data.destination}",
+        user_id=current_user.id,
+        is_recommended=False,
+    )
+
+# "HH:MM" פירוק שעת פעילות מטקסט בפורמט
+def parse_activity_time(value):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, dtime):
+        return value
+
+    for time_format in ("%H:%M", "%H:%M:%S"):
+        try:
+            return datetime.strptime(str(value).strip(), time_format).time()
+        except ValueError:
+            continue
+    raise HTTPException(status_code=400, detail=f"Invalid activity time: {value}")
+
+# AI בדיקה ופירוק של כל תוכנית ה
+# הכל נבדק לפני שנכתבת שורה אחת, כך שתוכנית פגומה לא משאירה טיול חלקי
+def build_ai_activity_rows(trip_plan: list) -> list:
+    rows = []
+    for day in trip_plan:
+        if not isinstance(day, dict):
+            raise HTTPException(status_code=400, detail="Each trip plan day must be an object")
+
+        day_number = day.get("day")
+        if not isinstance(day_number, int) or isinstance(day_number, bool) or day_number <= 0:
+            raise HTTPException(status_code=400, detail=f"Invalid day number: {day_number}")
+
+        activities = day.get("activities") or []
+        if not isinstance(activities, list):
+            raise HTTPException(status_code=400, detail=f"Activities of day {day_number} must be a list")
+
+        for act in activities:
+            if not isinstance(act, dict) or not str(act.get("title") or "").strip():
+                raise HTTPException(status_code=400, detail=f"Every activity on day {day_number} needs a title")
+
+            rows.append({
+                "day_number": day_number,
+                "time": parse_activity_time(act.get("time")),
+                "title": act.get("title"),
+                "description": act.get("description"),
+                "location_name": act.get("location_name"),
+            })
+    return rows
+
+# AI ייבוא משותף של טיול
+# הטיול נכתב דרך ה-ORM והפעילויות בהכנסה מרובה אחת, הכל בטרנזקציה אחת
+# הטיול מוחזר עם הפעילויות שלו בלי שאילתה נוספת
+def import_ai_plan(data: AiTripCloneRequest, db: Session, title: str, user_id: int = None, is_recommended: bool = False):
     if not data.destination or not data.destination.strip():
         raise HTTPException(status_code=400, detail="Destination is required")
 
@@ -294,34 +335,44 @@ def import_ai_trip(data: AiTripCloneRequest, db: Session, current_user: User):
     if data.duration_days is None or data.duration_days <= 0:
         raise HTTPException(status_code=400, detail="Invalid duration days value")
 
-    # יצירת הטיול
+    rows = build_ai_activity_rows(data.trip_plan)
+
     new_trip = Trip(
-        user_id=current_user.id,
-        title=f"AI Trip to {data.destination}",
+        user_id=user_id,
+        title=title,
         destination=data.destination,
         description=f"{data.trip_type} trip with {data.travelers} travelers",
         duration_days=data.duration_days,
         start_date=None,
         end_date=None,
         image_url=DEFAULT_TRIP_IMAGE,
-        is_recommended=False,
+        is_recommended=is_recommended,
         created_at=datetime.now(timezone.utc)
     )
-    db.add(new_trip)
-    db.commit()
-    db.refresh(new_trip)
 
-    for day in data.trip_plan:
-        day_number = day.get("day")
-        for act in day.get("activities", []):
-            db.add(Activity(
-                trip_id=new_trip.id,
-                day_number=day_number,
-                time=act.get("time"),
-                title=act.get("title"),
-                description=act.get("description"),
-                location_name=act.get("location_name"),
-            ))
+    try:
+        db.add(new_trip)
+        db.flush()
+
+        activities = []
+        if rows:
+            # render_nulls שומר את כל השורות באותה צורה כדי שיישלחו באצווה אחת
+            activities = db.scalars(
+                insert(Activity).returning(Activity, sort_by_parameter_order=True),
+                [{**row, "trip_id": new_trip.id} for row in rows],
+                execution_options={"render_nulls": True},
+            ).all()
+        set_committed_value(new_trip, "activities", activities)
+
+        # בלי expire אחרי commit - הערכים בזיכרון הם בדיוק מה שנכתב
+        expire_on_commit = db.expire_on_commit
+        db.expire_on_commit = False
+        try:
+            db.commit()
+        finally:
+            db.expire_on_commit = expire_on_commit
+    except Exception:
+        db.rollback()
+        raise
 
-    db.commit()
     return new_trip
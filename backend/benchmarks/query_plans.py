@@ -0,0 +1,98 @@
+# השוואת תוכניות השאילתות החמות לפני ואחרי מיגרציית האינדקסים (0004_hot_indexes)
+# הרצה: cd backend && python -m benchmarks.query_plans [DATABASE_URL]
+# בלי כתובת נוצר DB זמני ב-SQLite; עם כתובת של Postgres ריק אפשר לראות את התוכניות האמיתיות
+
+import os
+import sys
+import random
+import tempfile
+import uuid
+from sqlalchemy import create_engine, text
+from app.db.migrate import run_migrations
+
+BEFORE_REVISION = "0003_trip_search"
+
+USERS = 200
+TRIPS = 5000
+ACTIVITIES_PER_TRIP = 8
+
+HOT_QUERIES = {
+    "activities of a trip": "SELECT * FROM activities WHERE trip_id = 42 ORDER BY day_number, time",
+    "user's trips": "SELECT * FROM trips WHERE user_id = 7 ORDER BY created_at DESC LIMIT 20",
+    "recommended trips": "SELECT * FROM trips WHERE is_recommended = true ORDER BY created_at DESC LIMIT 20",
+    "reminder scan": "SELECT * FROM trips WHERE start_date = '2026-01-10'",
+    "ratings of a trip": "SELECT avg(rating) FROM ratings WHERE trip_id = 42",
+    "comments of a trip": "SELECT * FROM comments WHERE trip_id = 42 ORDER BY created_at",
+    "favorite toggle lookup": "SELECT id FROM favorite_trips WHERE user_id = 7 AND trip_id = 42",
+    "trip favorites count": "SELECT count(*) FROM favorite_trips WHERE trip_id = 42",
+}
+
+# מילוי נתונים כדי שהמתכנן יעדיף אינדקס על פני סריקה
+def seed(connection):
+    random.seed(0)
+    connection.execute(
+        text("INSERT INTO users (id, username, email, password, is_admin) VALUES (:id, :u, :e, 'x', false)"),
+        [{"id": i, "u": f"user{i}", "e": f"user{i}@example.com"} for i in range(1, USERS + 1)],
+    )
+    connection.execute(
+        text("""INSERT INTO trips (id, title, destination, is_recommended, start_date, user_id, share_uuid, created_at)
+                VALUES (:id, :t, 'Somewhere', :rec, :start, :user, :uuid, CURRENT_TIMESTAMP)"""),
+        [
+            {
+                "id": i, "t": f"Trip {i}", "rec": i % 10 == 0,
+                "start": f"2026-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+                "user": None if i % 10 == 0 else random.randint(1, USERS),
+                "uuid": str(uuid.UUID(int=i)),
+            }
+            for i in range(1, TRIPS + 1)
+        ],
+    )
+    connection.execute(
+        text("INSERT INTO activities (trip_id, day_number, title, time) VALUES (:trip, :day, 'a', '10:00:00')"),
+        [{"trip": t, "day": d % 3 + 1} for t in range(1, TRIPS + 1) for d in range(ACTIVITIES_PER_TRIP)],
+    )
+    connection.execute(
+        text("INSERT INTO ratings (trip_id, user_id, rating) VALUES (:trip, :user, 4)"),
+        [{"trip": t, "user": u} for t in range(1, TRIPS + 1, 5) for u in range(1, 4)],
+    )
+    connection.execute(
+        text("INSERT INTO comments (content, user_id, trip_id, created_at) VALUES ('c', :user, :trip, CURRENT_TIMESTAMP)"),
+        [{"trip": t, "user": random.randint(1, USERS)} for t in range(1, TRIPS + 1, 3)],
+    )
+    connection.execute(
+        text("INSERT INTO favorite_trips (user_id, trip_id) VALUES (:user, :trip)"),
+        [{"user": u, "trip": t} for u in range(1, USERS + 1) for t in random.sample(range(1, TRIPS + 1), 20)],
+    )
+
+# תוכנית הביצוע של כל שאילתה חמה
+def explain_all(engine):
+    prefix = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    plans = {}
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+        for name, sql in HOT_QUERIES.items():
+            rows = connection.execute(text(f"{prefix} {sql}")).all()
+            plans[name] = [str(row[-1]) for row in rows]
+    return plans
+
+def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else None
+    if url is None:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'query_plans.db')}"
+    engine = create_engine(url)
+
+    run_migrations(engine, BEFORE_REVISION)
+    with engine.begin() as connection:
+        seed(connection)
+    before = explain_all(engine)
+
+    run_migrations(engine)
+    after = explain_all(engine)
+
+    for name in HOT_QUERIES:
+        print(f"== {name}")
+        print("  before:", " | ".join(before[name]))
+        print("  after: ", " | ".join(after[name]))
+
+if __name__ == "__main__":
+    main()
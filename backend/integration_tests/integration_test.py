@@ -1,5 +1,6 @@
 import pytest
 from app.models.user_model import User
+from app.models.outbound_email_model import OutboundEmail
 from app.db.database import SessionLocal
 
 @pytest.mark.asyncio
@@ -91,9 +92,13 @@ async def test_full_flow(async_client):
     resp = await async_client.post(f"/api/recommended/{recommended_id}/rate", json={"rating": 5})
     assert resp.status_code == 200
 
-    # שליחת סיכום למייל
+    # שליחת סיכום למייל - המייל נכנס לתור ונשלח ברקע
     resp = await async_client.get(f"/api/emails/send-trip-summary/{trip_id}")
-    assert resp.status_code == 200
+    assert resp.status_code == 202
+    db = SessionLocal()
+    queued = db.query(OutboundEmail).filter(OutboundEmail.to_email == "testuser@example.com").count()
+    db.close()
+    assert queued == 1
 
     # יצירת טיול AI
     ai_payload = {
@@ -110,4 +115,30 @@ async def test_full_flow(async_client):
     # צפייה בפעילויות
     resp = await async_client.get(f"/api/trips/{trip_id}/activities")
     assert resp.status_code == 200
-    assert isinstance(resp.json(), list)
\ No newline at end of file
+    assert isinstance(resp.json(), list)
+
+@pytest.mark.asyncio
+async def test_calendar_feed_url(async_client):
+    # הרשמה והתחברות
+    await async_client.post("/api/auth/signup", json={
+        "username": "feeduser",
+        "email": "feeduser@example.com",
+        "password": "feedpass",
+        "confirm_password": "feedpass"
+    })
+    resp = await async_client.post("/api/auth/login", json={"email": "feeduser@example.com", "password": "feedpass"})
+    assert resp.status_code == 200
+    headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+    # שתי בקשות לכתובת הפיד - שתי הכתובות עובדות
+    first = (await async_client.get("/api/users/me/calendar-feed", headers=headers)).json()["feed_url"]
+    second = (await async_client.get("/api/users/me/calendar-feed", headers=headers)).json()["feed_url"]
+    assert (await async_client.get(first)).status_code == 200
+    assert (await async_client.get(second)).status_code == 200
+
+    # כתובת חדשה מבטלת את הקודמות
+    resp = await async_client.post("/api/users/me/calendar-feed/rotate", headers=headers)
+    assert resp.status_code == 200
+    rotated = resp.json()["feed_url"]
+    assert (await async_client.get(first)).status_code == 401
+    assert (await async_client.get(rotated)).status_code == 200
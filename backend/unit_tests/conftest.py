@@ -4,6 +4,7 @@ from sqlalchemy.orm import sessionmaker
 from app.db.database import Base
 from app.models.user_model import User
 from app.services.auth_service import hash_password 
+from app.services import token_service, recommend_service
 
 
 # --- הגדרת בסיס נתוני זמני ---
@@ -34,6 +35,9 @@ def get_admin_user():
 def db():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    token_service._principals.clear()  # משתמשים מחוברים שנשמרו בבדיקה קודמת
+    recommend_service.invalidate_recommended_listings()  # עמודים שנשמרו בבדיקה קודמת
+    recommend_service.invalidate_trip_comments()
     db = TestingSessionLocal()
 
     user = get_test_user()
@@ -2,8 +2,10 @@ import pytest
 from fastapi import HTTPException
 from app.models.trip_model import Trip
 from app.models.activity_model import Activity
+from app.models.user_model import User
 from app.schemas.trip_schema import TripCreate
-from app.services import admin_service, trip_service
+from app.services import admin_service, trip_service, favorite_service
+from app.services.token_service import Principal, create_access_token, get_current_principal
 from unit_tests.conftest import get_test_user, get_admin_user
 from datetime import date
 
@@ -27,6 +29,27 @@ def test_delete_user_success(db):
     assert deleted.id == user.id
     assert db.query(admin_service.User).filter_by(id=user.id).first() is None
 
+# אחרי מחיקה הטוקן של המשתמש כבר לא מתקבל, גם אם הוא היה במטמון
+def test_delete_user_invalidates_principal(db):
+    class Token:
+        credentials = create_access_token({"sub": user.email})
+
+    get_current_principal(Token(), db)
+    admin_service.delete_user(db, user.id)
+    with pytest.raises(HTTPException) as e:
+        get_current_principal(Token(), db)
+    assert e.value.status_code == 401
+
+# מחיקת משתמש מעדכנת את מונה המועדפים של הטיולים שסימן
+def test_delete_user_refreshes_trip_counts(db):
+    trip = Trip(title="Fav", destination="X", is_recommended=True)
+    db.add(trip)
+    db.commit()
+    favorite_service.toggle_favorite_recommended_trip(trip.id, user, db)
+    admin_service.delete_user(db, user.id)
+    db.refresh(trip)
+    assert trip.favorite_count == 0
+
 # ניסיון למחוק משתמש שלא קיים
 def test_delete_user_not_found(db):
     with pytest.raises(HTTPException) as e:
@@ -153,14 +176,23 @@ def test_admin_delete_recommended_trip_not_recommended(db):
 
 # --- admin_required ---
 # אדמין מורשה לעבור
-def test_admin_required_success():
-    result = admin_service.admin_required(admin)
+def test_admin_required_success(db):
+    result = admin_service.admin_required(admin, db)
     assert result == admin
 
 # משתמש רגיל לא מורשה
-def test_admin_required_forbidden():
+def test_admin_required_forbidden(db):
     with pytest.raises(HTTPException) as e:
-        admin_service.admin_required(user)
+        admin_service.admin_required(user, db)
+    assert e.value.status_code == 403
+
+# הסרת הרשאת אדמין ב-DB תקפה מיד, גם כשהמשתמש המחובר שמור במטמון
+def test_admin_required_reads_role_from_db(db):
+    principal = Principal(id=admin.id, username=admin.username, email=admin.email)
+    db.query(User).filter(User.id == admin.id).update({User.is_admin: False})
+    db.commit()
+    with pytest.raises(HTTPException) as e:
+        admin_service.admin_required(principal, db)
     assert e.value.status_code == 403
 
 
@@ -171,3 +203,11 @@ def test_get_trips_by_user_id(db):
     trip2 = trip_service.create_trip(TripCreate(title="B", destination="Y"), db, user)
     results = admin_service.get_trips_by_user_id(user.id, db)
     assert trip1 in results and trip2 in results
+
+
+# --- get_service_metrics ---
+# מדדי מאגר הצפנת הסיסמאות
+def test_get_service_metrics():
+    metrics = admin_service.get_service_metrics()
+    assert {"workers", "queue_limit", "running", "queued", "rejected"} <= metrics["password_hashing"].keys()
+    assert {"principals", "recommended_listings", "recommended_comments"} <= metrics["caches"].keys()
@@ -1,6 +1,8 @@
 import pytest
+import pytest_asyncio
+import httpx
 from fastapi import HTTPException
-from unittest.mock import patch, Mock
+from unittest.mock import patch
 from app.services import ai_service
 from unit_tests.conftest import get_test_user, get_admin_user
 
@@ -8,97 +10,164 @@ from unit_tests.conftest import get_test_user, get_admin_user
 user = get_test_user()
 admin = get_admin_user()
 
+# AI פיקסטורה שמחליפה את החיבור המשותף לשירות ה  בשרת מדומה
+@pytest_asyncio.fixture
+async def ai_mock():
+    routes = {}
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request)
+        responder = routes[(request.method, request.url.path)]
+        return responder(request) if callable(responder) else responder
+
+    ai_service._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler),
+        base_url=ai_service.TRIP_AI_SERVICE_URL
+    )
+    with patch("app.services.ai_service.asyncio.sleep"):
+        yield routes, calls
+    await ai_service.close_ai_client()
+
+TRIP_DATA = {
+    "destination": "Rome",
+    "num_days": 5,
+    "num_travelers": 2,
+    "trip_type": "Romantic"
+}
+
 
 # --- create_custom_trip_ai ---
 # יצירת טיול מותאם אישית בהצלחה עם נתונים תקינים
-@patch("app.services.ai_service.requests.post")
-def test_create_custom_trip_ai_success(mock_post):
-    mock_response = Mock(status_code=200)
-    mock_response.json.return_value = {"trip": "customized"}
-    mock_post.return_value = mock_response
-
-    trip_data = {
-        "destination": "Rome",
-        "num_days": 5,
-        "num_travelers": 2,
-        "trip_type": "Romantic"
-    }
-
-    result = ai_service.create_custom_trip_ai(trip_data)
+@pytest.mark.asyncio
+async def test_create_custom_trip_ai_success(ai_mock):
+    routes, calls = ai_mock
+    routes[("POST", "/trip-ai/custom-trip")] = httpx.Response(200, json={"trip": "customized"})
+
+    result = await ai_service.create_custom_trip_ai(TRIP_DATA)
     assert result["trip"] == "customized"
-    mock_post.assert_called_once()
+    assert len(calls) == 1
 
 # בדיקה של חסר שדה חובה (destination ריק)
-def test_create_custom_trip_ai_missing_field():
-    trip_data = {
-        "destination": "",
-        "num_days": 5,
-        "num_travelers": 2,
-        "trip_type": "Romantic"
-    }
+@pytest.mark.asyncio
+async def test_create_custom_trip_ai_missing_field():
+    trip_data = {**TRIP_DATA, "destination": ""}
 
     with pytest.raises(HTTPException) as e:
-        ai_service.create_custom_trip_ai(trip_data)
+        await ai_service.create_custom_trip_ai(trip_data)
     assert e.value.status_code == 400
     assert "Destination is required" in str(e.value.detail)
 
 # כישלון תקשורת עם שירות ה-AI (סטטוס שגוי)
-@patch("app.services.ai_service.requests.post")
-def test_create_custom_trip_ai_failure(mock_post):
-    mock_post.return_value = Mock(status_code=500)
-
-    trip_data = {
-        "destination": "Paris",
-        "num_days": 3,
-        "num_travelers": 1,
-        "trip_type": "Solo"
-    }
+@pytest.mark.asyncio
+async def test_create_custom_trip_ai_failure(ai_mock):
+    routes, calls = ai_mock
+    routes[("POST", "/trip-ai/custom-trip")] = httpx.Response(500)
 
     with pytest.raises(Exception) as e:
-        ai_service.create_custom_trip_ai(trip_data)
+        await ai_service.create_custom_trip_ai(TRIP_DATA)
     assert "Failed to create custom trip" in str(e.value)
 
+# POST לא נשלח שוב אחרי שהבקשה כבר הגיעה לשירות
+@pytest.mark.asyncio
+async def test_create_custom_trip_ai_not_retried_on_gateway_error(ai_mock):
+    routes, calls = ai_mock
+    routes[("POST", "/trip-ai/custom-trip")] = httpx.Response(503)
+
+    with pytest.raises(Exception):
+        await ai_service.create_custom_trip_ai(TRIP_DATA)
+    assert len(calls) == 1
+
+# שירות לא זמין - מספר ניסיונות מוגבל ואז 503
+@pytest.mark.asyncio
+async def test_create_custom_trip_ai_connect_error_retries(ai_mock):
+    routes, calls = ai_mock
+
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    routes[("POST", "/trip-ai/custom-trip")] = refuse
+
+    with pytest.raises(HTTPException) as e:
+        await ai_service.create_custom_trip_ai(TRIP_DATA)
+    assert e.value.status_code == 503
+    assert len(calls) == ai_service.AI_SERVICE_MAX_RETRIES + 1
+
+
+# --- stream_custom_trip_ai ---
+# הזרמת טיול מועברת ללקוח כפי שהיא מתקבלת
+@pytest.mark.asyncio
+async def test_stream_custom_trip_ai_passthrough(ai_mock):
+    routes, calls = ai_mock
+    body = b'{"type": "day"}\n{"type": "budget"}\n'
+    routes[("POST", "/trip-ai/custom-trip/stream")] = httpx.Response(200, content=body)
+
+    stream = await ai_service.stream_custom_trip_ai(TRIP_DATA)
+    chunks = [chunk async for chunk in stream]
+    assert b"".join(chunks) == body
+
+# כישלון בפתיחת ההזרמה מול שירות ה-AI
+@pytest.mark.asyncio
+async def test_stream_custom_trip_ai_failure(ai_mock):
+    routes, calls = ai_mock
+    routes[("POST", "/trip-ai/custom-trip/stream")] = httpx.Response(500)
+
+    with pytest.raises(HTTPException) as e:
+        await ai_service.stream_custom_trip_ai(TRIP_DATA)
+    assert e.value.status_code == 502
+
 
 # --- calculate_budget_ai ---
 # חישוב תקציב מוצלח לפי מזהה טיול ומספר מטיילים
-@patch("app.services.ai_service.requests.post")
-def test_calculate_budget_ai_success(mock_post):
-    mock_response = Mock(status_code=200)
-    mock_response.json.return_value = {"estimated_budget": 1500}
-    mock_post.return_value = mock_response
+@pytest.mark.asyncio
+async def test_calculate_budget_ai_success(ai_mock):
+    routes, calls = ai_mock
+    routes[("POST", "/trip-ai/calculate-budget/123")] = httpx.Response(200, json={"estimated_budget": 1500})
 
-    result = ai_service.calculate_budget_ai(trip_id=123, num_travelers=2)
+    result = await ai_service.calculate_budget_ai(trip_id=123, num_travelers=2)
     assert result["estimated_budget"] == 1500
-    mock_post.assert_called_once()
+    assert calls[0].url.params["num_travelers"] == "2"
 
 # כישלון בקבלת תקציב מה-AI (סטטוס שגוי)
-@patch("app.services.ai_service.requests.post")
-def test_calculate_budget_ai_failure(mock_post):
-    mock_post.return_value = Mock(status_code=502)
+@pytest.mark.asyncio
+async def test_calculate_budget_ai_failure(ai_mock):
+    routes, calls = ai_mock
+    routes[("POST", "/trip-ai/calculate-budget/321")] = httpx.Response(502)
 
     with pytest.raises(Exception) as e:
-        ai_service.calculate_budget_ai(trip_id=321, num_travelers=1)
+        await ai_service.calculate_budget_ai(trip_id=321, num_travelers=1)
     assert "Failed to calculate budget" in str(e.value)
 
 
 # --- get_trip_types ---
 # שליפה תקינה של סוגי טיולים
-@patch("app.services.ai_service.requests.get")
-def test_get_trip_types_success(mock_get):
-    mock_response = Mock(status_code=200)
-    mock_response.json.return_value = ["Adventure", "Relaxation"]
-    mock_get.return_value = mock_response
+@pytest.mark.asyncio
+async def test_get_trip_types_success(ai_mock):
+    routes, calls = ai_mock
+    routes[("GET", "/trip-ai/trip-types")] = httpx.Response(200, json=["Adventure", "Relaxation"])
 
-    result = ai_service.get_trip_types()
+    result = await ai_service.get_trip_types()
     assert "Adventure" in result
     assert "Relaxation" in result
-    mock_get.assert_called_once()
+    assert len(calls) == 1
 
 # כישלון בשליפת סוגי טיולים מה-AI
-@patch("app.services.ai_service.requests.get")
-def test_get_trip_types_failure(mock_get):
-    mock_get.return_value = Mock(status_code=500)
+@pytest.mark.asyncio
+async def test_get_trip_types_failure(ai_mock):
+    routes, calls = ai_mock
+    routes[("GET", "/trip-ai/trip-types")] = httpx.Response(500)
 
     with pytest.raises(Exception) as e:
-        ai_service.get_trip_types()
+        await ai_service.get_trip_types()
     assert "Failed to fetch trip types" in str(e.value)
+
+# GET נשלח שוב אחרי שגיאת שער זמנית
+@pytest.mark.asyncio
+async def test_get_trip_types_retries_gateway_error(ai_mock):
+    routes, calls = ai_mock
+    responses = iter([httpx.Response(503), httpx.Response(200, json=["Adventure"])])
+    routes[("GET", "/trip-ai/trip-types")] = lambda request: next(responses)
+
+    result = await ai_service.get_trip_types()
+    assert result == ["Adventure"]
+    assert len(calls) == 2
@@ -4,8 +4,9 @@ from pydantic import ValidationError
 from unittest.mock import patch
 from jose import jwt
 from app.schemas.user_schema import UserCreate, UserLogin, ResetPasswordRequest, UpdateProfileRequest
-from app.services import auth_service
-from app.services.token_service import SECRET_KEY, ALGORITHM
+from app.models.user_model import User
+from app.services import auth_service, password_service
+from app.services.token_service import SECRET_KEY, ALGORITHM, create_access_token, create_feed_token, get_current_principal, get_feed_user
 from unit_tests.conftest import get_test_user, get_admin_user
 
 # משתמשים גלובליים לבדיקה
@@ -71,6 +72,16 @@ def test_login_user_wrong_password(db):
         auth_service.login_user(login_data, db)
     assert e.value.status_code == 401
 
+# סיסמה שהוצפנה בעלות ישנה מוצפנת מחדש בהתחברות
+def test_login_user_rehashes_password(db, monkeypatch):
+    monkeypatch.setattr(password_service, "BCRYPT_ROUNDS", 4)
+    auth_service.create_user(UserCreate(username="old", email="old@example.com", password="123456", confirm_password="123456"), db)
+
+    monkeypatch.setattr(password_service, "BCRYPT_ROUNDS", 5)
+    logged = auth_service.login_user(UserLogin(email="old@example.com", password="123456"), db)
+    assert logged.password.startswith("$2b$05$")
+    assert auth_service.login_user(UserLogin(email="old@example.com", password="123456"), db)
+
 
 # --- hash_password + verify_password ---
 # בדיקת הצפנה ואימות סיסמה תקינים
@@ -118,6 +129,16 @@ def test_reset_user_password_success(db):
     result = auth_service.reset_user_password(req, db)
     assert "successfully" in result["message"]
 
+# איפוס סיסמה מבטל את כתובות פיד היומן של המשתמש
+def test_reset_user_password_revokes_feed_tokens(db):
+    feed_token = create_feed_token(db.query(User).filter(User.id == user.id).first())
+    token = auth_service.create_reset_token(user.id)
+    req = ResetPasswordRequest(token=token, new_password="newpass123", confirm_new_password="newpass123")
+    auth_service.reset_user_password(req, db)
+    with pytest.raises(HTTPException) as e:
+        get_feed_user(feed_token, None, db)
+    assert e.value.status_code == 401
+
 # ניסיון איפוס סיסמה עם טוקן לא תקין
 def test_reset_user_password_invalid_token(db):
     req = ResetPasswordRequest(token="invalid.token.string", new_password="123456", confirm_new_password="123456")
@@ -153,6 +174,15 @@ def test_update_user_profile_success(db):
     assert updated.username == "newname"
     assert updated.profile_image_url == "http://img.com/new.png"
 
+# אחרי עדכון פרופיל המשתמש המחובר לא מגיע מהמטמון עם השם הישן
+def test_update_user_profile_invalidates_principal(db):
+    class Token:
+        credentials = create_access_token({"sub": user.email})
+
+    assert get_current_principal(Token(), db).username == "testuser"
+    auth_service.update_user_profile(user, UpdateProfileRequest(update_username="renamed"), db)
+    assert get_current_principal(Token(), db).username == "renamed"
+
 # עדכון שם משתמש ריק (אמור להיכשל)
 def test_update_user_profile_empty_username(db):
     update_data = UpdateProfileRequest(update_username="   ")
@@ -0,0 +1,78 @@
+from app.services.cache_service import LRUCache, cache_stats
+
+
+# --- LRUCache ---
+# הפריט שלא היה בשימוש הכי הרבה זמן מפונה ראשון
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+# החישוב רץ רק כשהערך חסר
+def test_lru_cache_get_or_set():
+    cache = LRUCache()
+    calls = []
+    def factory():
+        calls.append(1)
+        return "value"
+    assert cache.get_or_set("key", factory) == "value"
+    assert cache.get_or_set("key", factory) == "value"
+    assert len(calls) == 1
+
+# ערך None נשמר כמו כל ערך אחר
+def test_lru_cache_stores_none():
+    cache = LRUCache()
+    calls = []
+    cache.get_or_set("key", lambda: calls.append(1))
+    cache.get_or_set("key", lambda: calls.append(1))
+    assert len(calls) == 1
+
+# פריט פג תוקף אחרי ה-ttl של המטמון או של הפריט עצמו
+def test_lru_cache_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.services.cache_service.time.monotonic", lambda: now[0])
+    cache = LRUCache(ttl=10)
+    cache.set("default", 1)
+    cache.set("short", 2, ttl=2)
+
+    now[0] += 5
+    assert cache.get("short") is None
+    assert cache.get("default") == 1
+
+    now[0] += 5
+    assert cache.get("default") is None
+    assert len(cache) == 0
+
+# מחיקה של פריט אחד ושל כל הפריטים שמקיימים תנאי
+def test_lru_cache_delete():
+    cache = LRUCache()
+    for i in range(5):
+        cache.set(i, i % 2)
+    cache.delete(0)
+    cache.delete("missing")
+    assert cache.delete_where(lambda value: value == 1) == 2
+    assert [cache.get(i) for i in range(5)] == [None, None, 0, None, 0]
+
+# ערך שחושב בזמן שהמטמון נוקה מוחזר אבל לא נשמר
+def test_lru_cache_skips_value_computed_during_clear():
+    cache = LRUCache()
+    def factory():
+        cache.clear()
+        return "stale"
+    assert cache.get_or_set("key", factory) == "stale"
+    assert cache.get("key") is None
+
+# מוני פגיעות והחטאות, ורישום מטמון עם שם
+def test_lru_cache_stats():
+    cache = LRUCache(maxsize=10, name="test_stats")
+    cache.get_or_set("key", lambda: 1)
+    cache.get_or_set("key", lambda: 1)
+    cache.get("missing")
+    assert cache.stats() == {"size": 1, "maxsize": 10, "hits": 1, "misses": 2, "hit_rate": 0.333}
+    assert cache_stats()["test_stats"]["hits"] == 1
@@ -1,37 +1,216 @@
+import json
+import uuid
+import socket
+import threading
 import pytest
-from unittest.mock import MagicMock, patch
-from datetime import date
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+from datetime import date, time
 from fastapi import HTTPException
+from google.oauth2.credentials import Credentials
 from app.models.trip_model import Trip
-from app.models.user_model import User
+from app.models.activity_model import Activity
+from app.models.calendar_event_model import CalendarEvent
+from app.services import calendar_service
 from app.services.calendar_service import sync_trip_to_google_calendar, user_tokens
 from unit_tests.conftest import get_test_user
 
 # משתמש גלובלי לבדיקה
 user = get_test_user()
 
-# --- sync_trip_to_google_calendar ---
-# בדיקה של סנכרון טיול תקין ליומן גוגל עם קרדנציאל
-@patch("app.services.calendar_service.build")
-def test_sync_trip_success(mock_build, db):
-    mock_service = MagicMock()
-    mock_build.return_value = mock_service
-    trip = Trip(
-        title="Test Trip",
-        destination="Paris",
-        start_date=date(2025, 6, 1),
-        end_date=date(2025, 6, 3),
-        user_id=user.id,
-        is_recommended=False
-    )
+
+# Calendar API מקומי שמקבל בקשות batch ושומר את האירועים בזיכרון
+class FakeCalendarAPI:
+    def __init__(self):
+        self.events = {}
+        self.batches = []     # רשימת הפעולות בכל בקשת batch שהתקבלה
+        self.fail_ids = set() # אירועים שכל פעולה עליהם נכשלת ב-500
+        self.calendar_deleted = False  # היומן עצמו נמחק - כל פעולה מחזירה 404
+
+    def handle(self, method, path, body):
+        parts = path.split("?")[0].rstrip("/").split("/")
+        event_id = parts[-1] if parts[-2] == "events" else None
+        if event_id in self.fail_ids:
+            return 500, {"error": {"code": 500, "message": "Backend Error"}}
+        if self.calendar_deleted:
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        if method == "POST":
+            event_id = uuid.uuid4().hex
+            self.events[event_id] = body
+            return 200, {"id": event_id, **body}
+        if event_id not in self.events:
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        if method == "PUT":
+            self.events[event_id] = body
+            return 200, {"id": event_id, **body}
+        del self.events[event_id]
+        return 204, None
+
+    # פענוח בקשת ה-batch והרכבת תשובת multipart
+    def handle_batch(self, content_type: str, payload: bytes) -> tuple[str, bytes]:
+        message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + payload)
+        boundary = "fake_batch_boundary"
+        response, operations = [], []
+
+        for part in message.iter_parts():
+            request = part.get_payload(decode=True).decode().replace("\r\n", "\n")
+            head, _, body = request.partition("\n\n")
+            method, path, _ = head.split("\n")[0].split(" ")
+            operations.append((method, path))
+            status, result = self.handle(method, path, json.loads(body) if body.strip() else None)
+
+            response.append(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{part['Content-ID'][1:-1]}>\r\n\r\n")
+            response.append(f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(result) if result else ''}\r\n")
+
+        self.batches.append(operations)
+        response.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(response).encode()
+
+@pytest.fixture
+def calendar_api(monkeypatch):
+    api = FakeCalendarAPI()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.path != "/batch/calendar/v3":
+                self.send_response(404)
+                self.end_headers()
+                return
+            content_type, body = api.handle_batch(self.headers["Content-Type"], payload)
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(calendar_service, "GOOGLE_API_ROOT", f"http://127.0.0.1:{server.server_port}/")
+    yield api
+    server.shutdown()
+    server.server_close()
+
+def credentials():
+    return Credentials(token="test-token")
+
+def create_trip(db, start=date(2025, 6, 1), end=date(2025, 6, 3), **kwargs):
+    trip = Trip(title="Test Trip", destination="Paris", start_date=start, end_date=end, user_id=user.id, is_recommended=False, **kwargs)
     db.add(trip)
     db.commit()
+    return trip
+
+
+# --- sync_trip_to_google_calendar ---
+# כל האירועים של הטיול נשלחים בבקשת batch אחת, והמיפוי נשמר
+def test_sync_trip_success(db, calendar_api):
+    trip = create_trip(db)
+    db.add(Activity(trip_id=trip.id, day_number=2, title="Louvre", time=time(10, 0), location_name="Paris"))
+    db.add(Activity(trip_id=trip.id, day_number=1, title="Walk", time=None, location_name="Paris"))
+    db.commit()
+
+    result = sync_trip_to_google_calendar(trip.id, user, db, credentials())
+
+    assert result == {"created": 4, "updated": 0, "deleted": 0, "unchanged": 0, "failed": 0}
+    assert len(calendar_api.batches) == 1
+    assert len(calendar_api.events) == 4
+    mappings = db.query(CalendarEvent).filter_by(trip_id=trip.id).all()
+    assert sorted(m.item_key for m in mappings) == ["activity:1", "day:1", "day:2", "day:3"]
+    assert {m.google_event_id for m in mappings} == set(calendar_api.events)
+    louvre = calendar_api.events[next(m.google_event_id for m in mappings if m.item_key == "activity:1")]
+    assert louvre["start"] == {"dateTime": "2025-06-02T10:00:00", "timeZone": calendar_service.CALENDAR_TIMEZONE}
+    day_one = calendar_api.events[next(m.google_event_id for m in mappings if m.item_key == "day:1")]
+    assert "- Walk" in day_one["description"]
+
+# סנכרון חוזר בלי שינויים לא שולח כלום ולא יוצר כפילויות
+def test_sync_trip_again_without_changes(db, calendar_api):
+    trip = create_trip(db)
+    sync_trip_to_google_calendar(trip.id, user, db, credentials())
+
+    result = sync_trip_to_google_calendar(trip.id, user, db, credentials())
+
+    assert result == {"created": 0, "updated": 0, "deleted": 0, "unchanged": 3, "failed": 0}
+    assert len(calendar_api.batches) == 1
+    assert len(calendar_api.events) == 3
+
+# אחרי שינוי נשלח רק ההפרש - עדכון, הוספה ומחיקה באותה בקשה
+def test_sync_trip_sends_only_diff(db, calendar_api):
+    trip = create_trip(db)
+    activity = Activity(trip_id=trip.id, day_number=1, title="Museum", time=time(9, 0), location_name="Paris")
+    db.add(activity)
+    db.commit()
+    sync_trip_to_google_calendar(trip.id, user, db, credentials())
+
+    activity.title = "Orsay Museum"
+    trip.end_date = date(2025, 6, 2)
+    db.add(Activity(trip_id=trip.id, day_number=2, title="Eiffel", time=time(18, 0), location_name="Paris"))
+    db.commit()
+    result = sync_trip_to_google_calendar(trip.id, user, db, credentials())
+
+    assert result == {"created": 1, "updated": 1, "deleted": 1, "unchanged": 2, "failed": 0}
+    assert len(calendar_api.batches) == 2
+    assert sorted(method for method, path in calendar_api.batches[1]) == ["DELETE", "POST", "PUT"]
+    assert sorted(e["summary"] for e in calendar_api.events.values() if "location" in e) == ["Eiffel", "Orsay Museum"]
+    assert db.query(CalendarEvent).filter_by(trip_id=trip.id).count() == 4
+
+# אירוע שנמחק ידנית מהיומן נוצר מחדש בעדכון הבא
+def test_sync_trip_recreates_deleted_event(db, calendar_api):
+    trip = create_trip(db, end=date(2025, 6, 1))
+    sync_trip_to_google_calendar(trip.id, user, db, credentials())
+    calendar_api.events.clear()
+
+    trip.title = "Renamed Trip"
+    db.commit()
+    result = sync_trip_to_google_calendar(trip.id, user, db, credentials())
+
+    assert result["created"] == 1 and result["failed"] == 0
+    assert [e["summary"] for e in calendar_api.events.values()] == ["Renamed Trip - Paris"]
+    mapping = db.query(CalendarEvent).filter_by(trip_id=trip.id).one()
+    assert mapping.google_event_id in calendar_api.events
+
+# פעולה שנכשלה לא משנה את המיפוי ונשלחת שוב בסנכרון הבא
+def test_sync_trip_failed_operation_retried(db, calendar_api):
+    trip = create_trip(db, end=date(2025, 6, 2))
+    sync_trip_to_google_calendar(trip.id, user, db, credentials())
+    failing = db.query(CalendarEvent).filter_by(trip_id=trip.id, item_key="day:1").one()
+    calendar_api.fail_ids.add(failing.google_event_id)
+
+    trip.destination = "Lyon"
+    db.commit()
+    result = sync_trip_to_google_calendar(trip.id, user, db, credentials())
+    assert result["updated"] == 1 and result["failed"] == 1
+
+    calendar_api.fail_ids.clear()
+    result = sync_trip_to_google_calendar(trip.id, user, db, credentials())
+    assert result == {"created": 0, "updated": 1, "deleted": 0, "unchanged": 1, "failed": 0}
+
+# יצירה שנכשלה כי היומן נמחק (404) נספרת ככישלון ולא נשמרת במיפוי
+def test_sync_trip_insert_into_deleted_calendar(db, calendar_api):
+    trip = create_trip(db, end=date(2025, 6, 2))
+    calendar_api.calendar_deleted = True
+    result = sync_trip_to_google_calendar(trip.id, user, db, credentials())
+    assert result == {"created": 0, "updated": 0, "deleted": 0, "unchanged": 0, "failed": 2}
+    assert db.query(CalendarEvent).filter_by(trip_id=trip.id).count() == 0
+
+    calendar_api.calendar_deleted = False
+    result = sync_trip_to_google_calendar(trip.id, user, db, credentials())
+    assert result["created"] == 2 and result["failed"] == 0
+
+# טיול ארוך נשלח בכמה בקשות batch לפי CALENDAR_BATCH_SIZE
+def test_sync_trip_splits_large_batches(db, calendar_api, monkeypatch):
+    monkeypatch.setattr(calendar_service, "CALENDAR_BATCH_SIZE", 2)
+    trip = create_trip(db, end=date(2025, 6, 5))
 
-    credentials = MagicMock()
-    sync_trip_to_google_calendar(trip.id, user, db, credentials)
+    result = sync_trip_to_google_calendar(trip.id, user, db, credentials())
 
-    assert mock_service.events().insert.call_count == 3
-    assert mock_service.events().insert().execute.call_count == 3
+    assert result["created"] == 5
+    assert [len(batch) for batch in calendar_api.batches] == [2, 2, 1]
 
 
 # בדיקה על טיול שלא קיים
@@ -98,24 +277,12 @@ def test_sync_trip_missing_credentials(db):
 
 
 # בדיקה של שימוש בקרדנציאל זמני מזיכרון
-@patch("app.services.calendar_service.build")
-def test_sync_trip_uses_token_from_memory(mock_build, db):
-    mock_service = MagicMock()
-    mock_build.return_value = mock_service
-    trip = Trip(
-        title="Token Trip",
-        destination="London",
-        start_date=date(2025, 9, 1),
-        end_date=date(2025, 9, 1),
-        user_id=user.id,
-        is_recommended=False
-    )
-    db.add(trip)
-    db.commit()
+def test_sync_trip_uses_token_from_memory(db, calendar_api):
+    trip = create_trip(db, start=date(2025, 9, 1), end=date(2025, 9, 1))
 
-    user_tokens["temp"] = MagicMock()
+    user_tokens["temp"] = credentials()
 
     sync_trip_to_google_calendar(trip.id, user, db)
 
-    assert mock_service.events().insert.call_count == 1
+    assert len(calendar_api.events) == 1
     user_tokens.clear()
@@ -1,13 +1,14 @@
 import pytest
-from unittest.mock import patch, MagicMock, mock_open
-from email.mime.application import MIMEApplication
+from unittest.mock import patch, MagicMock
 from fastapi import HTTPException
-from datetime import date, timedelta
-from app.services import email_service
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import event
+from app.services import email_service, summary_service
 from app.schemas.ai_schema import AiTripSummaryRequest
 from app.models.trip_model import Trip
 from app.models.user_model import User
 from app.models.activity_model import Activity
+from app.models.outbound_email_model import OutboundEmail
 from unit_tests.conftest import get_test_user
 
 # משתמש גלובלי לבדיקה
@@ -15,52 +16,44 @@ user = get_test_user()
 
 
 # --- send_email ---
-# בדיקה שהמייל נשלח בהצלחה
+# בדיקה שהמייל נכנס לתור בלי לפתוח חיבור SMTP
 @patch("smtplib.SMTP")
-def test_send_email_success(mock_smtp):
-    mock_server = MagicMock()
-    mock_smtp.return_value.__enter__.return_value = mock_server
-
+def test_send_email_enqueues(mock_smtp, db):
     email_service.send_email(
         subject="Test Subject",
         to_email="recipient@example.com",
-        body_html="<p>Hello</p>"
+        body_html="<p>Hello</p>",
+        db=db,
     )
 
-    mock_server.send_message.assert_called_once()
-
+    mock_smtp.assert_not_called()
+    email = db.query(OutboundEmail).one()
+    assert email.to_email == "recipient@example.com"
+    assert email.status == "pending"
+    assert email.attempts == 0
 
-# בדיקה שהמייל נשלח עם קובץ מצורף
-@patch("smtplib.SMTP")
-def test_send_email_with_attachment(mock_smtp):
-    mock_server = MagicMock()
-    mock_smtp.return_value.__enter__.return_value = mock_server
-
-    attachment = MIMEApplication(b"data")
-    attachment.add_header('Content-Disposition', 'attachment', filename="file.txt")
 
+# בדיקה שהקובץ המצורף נשמר בתור
+def test_send_email_with_attachment(db):
     email_service.send_email(
         subject="Subject",
         to_email="test@example.com",
         body_html="<p>Test</p>",
-        attachment=attachment
+        db=db,
+        attachment_name="file.txt",
+        attachment_content=b"data",
     )
 
-    mock_server.send_message.assert_called_once()
-
-
-# בדיקה של כישלון ב־SMTP
-@patch("smtplib.SMTP", side_effect=Exception("SMTP error"))
-def test_send_email_failure(mock_smtp):
-    with pytest.raises(Exception):
-        email_service.send_email("Fail", "fail@example.com", "<p>fail</p>")
+    email = db.query(OutboundEmail).one()
+    assert email.attachment_name == "file.txt"
+    assert email.attachment_content == b"data"
 
 
 # --- send_reset_email ---
 # בדיקה שנשלח מייל איפוס עם קישור נכון
 @patch("app.services.email_service.send_email")
-def test_send_reset_email(mock_send):
-    email_service.send_reset_email("test@example.com", "token123")
+def test_send_reset_email(mock_send, db):
+    email_service.send_reset_email("test@example.com", "token123", db)
     args, kwargs = mock_send.call_args
     assert "reset-password/token123" in kwargs["body_html"]
     assert kwargs["to_email"] == "test@example.com"
@@ -68,20 +61,65 @@ def test_send_reset_email(mock_send):
 
 # --- send_upcoming_trip_reminders ---
 # בדיקה של שליחת מייל לתזכורת על טיול שמתחיל היום
-@patch("app.services.email_service.send_email")
-def test_send_upcoming_trip_reminder_today(mock_send, db):
+def test_send_upcoming_trip_reminder_today(db):
     today = date.today()
     trip = Trip(title="Today Trip", destination="Place", start_date=today, end_date=today + timedelta(days=1), user_id=user.id)
     db.add(trip)
     db.commit()
 
-    email_service.send_upcoming_trip_reminders(db)
-    assert mock_send.call_count == 1
-    assert "Today" in mock_send.call_args[1]["subject"]
+    assert email_service.send_upcoming_trip_reminders(db) == 1
+    email = db.query(OutboundEmail).one()
+    assert "Today" in email.subject
+    assert email.to_email == user.email
+    assert email.status == "pending"
+    db.refresh(trip)
+    assert trip.reminded_at is not None
+
+# הרצה חוזרת באותו יום לא מכניסה את התזכורת שוב לתור
+def test_send_upcoming_trip_reminders_idempotent(db):
+    tomorrow = date.today() + timedelta(days=1)
+    db.add(Trip(title="Tomorrow Trip", destination="Place", start_date=tomorrow, end_date=tomorrow, user_id=user.id))
+    db.commit()
+
+    assert email_service.send_upcoming_trip_reminders(db) == 1
+    assert email_service.send_upcoming_trip_reminders(db) == 0
+    assert db.query(OutboundEmail).count() == 1
+
+# טיול שקיבל תזכורת אתמול מקבל תזכורת גם היום
+def test_send_upcoming_trip_reminders_next_day(db):
+    today = date.today()
+    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+    db.add(Trip(title="Trip", destination="Place", start_date=today, end_date=today, user_id=user.id, reminded_at=yesterday))
+    db.commit()
+
+    assert email_service.send_upcoming_trip_reminders(db) == 1
+
+# כל הטיולים נטענים עם המשתמשים בשאילתה אחת, והמיילים נכנסים לתור ב-INSERT אחד
+def test_send_upcoming_trip_reminders_no_n_plus_one(db, monkeypatch):
+    monkeypatch.setattr(email_service, "REMINDER_BATCH_SIZE", 100)
+    today = date.today()
+    for i in range(10):
+        db.add(Trip(title=f"Trip {i}", destination="Place", start_date=today, end_date=today, user_id=1 + i % 2))
+    db.commit()
+    db.expire_all()
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        assert email_service.send_upcoming_trip_reminders(db) == 10
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+    assert len([s for s in statements if s.lstrip().upper().startswith("INSERT")]) == 1
+    assert {e.to_email for e in db.query(OutboundEmail).all()} == {"test@example.com", "admin@example.com"}
 
 # בדיקה שלא נשלח מייל על טיול שמתחיל רחוק (יותר מ-3 ימים קדימה)
-@patch("app.services.email_service.send_email")
-def test_send_upcoming_trip_skips_far_future_trip(mock_send, db):
+def test_send_upcoming_trip_skips_far_future_trip(db):
     future_start = date.today() + timedelta(days=5)
     trip = Trip(
         title="Far Future Trip",
@@ -93,27 +131,43 @@ def test_send_upcoming_trip_skips_far_future_trip(mock_send, db):
     db.add(trip)
     db.commit()
 
-    email_service.send_upcoming_trip_reminders(db)
-    assert mock_send.call_count == 0
+    assert email_service.send_upcoming_trip_reminders(db) == 0
+    assert db.query(OutboundEmail).count() == 0
     
 
 # --- send_trip_summary_by_trip_id ---
 # בדיקה של שליחת מייל סיכום טיול תקין
 @patch("app.services.email_service.send_email")
-@patch("tempfile.NamedTemporaryFile")
-def test_send_trip_summary_success(mock_temp, mock_send, db):
+def test_send_trip_summary_success(mock_send, db):
     trip = Trip(title="Trip", destination="Rome", start_date=date.today(), end_date=date.today(), user_id=user.id)
     db.add(trip)
     db.commit()
 
-    mock_file = MagicMock()
-    mock_file.__enter__.return_value.name = "/tmp/fake.txt"
-    mock_temp.return_value = mock_file
+    email_service.send_trip_summary_by_trip_id(trip.id, db)
+    assert mock_send.call_count == 1
+    kwargs = mock_send.call_args[1]
+    assert kwargs["attachment_name"] == "Trip_summary.txt"
+    assert b"Rome" in kwargs["attachment_content"]
+
+
+# שליחה חוזרת של אותו טיול לא בונה את הסיכום מחדש, ושינוי בטיול כן
+def test_send_trip_summary_reuses_attachment(db):
+    trip = Trip(title="Cached", destination="Rome", start_date=date.today(), end_date=date.today(), user_id=user.id)
+    db.add(trip)
+    db.commit()
+
+    mock_build = MagicMock(return_value="summary")
+    with patch.dict(summary_service.SUMMARY_FORMATS["text"], render=mock_build):
+        email_service.send_trip_summary_by_trip_id(trip.id, db)
+        email_service.send_trip_summary_by_trip_id(trip.id, db)
+        assert mock_build.call_count == 1
 
-    with patch("builtins.open", mock_open(read_data="summary text")):
+        db.add(Activity(trip_id=trip.id, day_number=1, title="Colosseum", location_name="Rome"))
+        db.commit()
         email_service.send_trip_summary_by_trip_id(trip.id, db)
-        assert mock_send.call_count == 1
+        assert mock_build.call_count == 2
 
+    assert [e.attachment_content for e in db.query(OutboundEmail).all()] == [b"summary"] * 3
 
 # בדיקה על טיול שלא קיים
 def test_send_trip_summary_trip_not_found(db):
@@ -125,19 +179,14 @@ def test_send_trip_summary_trip_not_found(db):
 # --- send_recommended_trip_summary ---
 # בדיקה של שליחת מייל סיכום טיול מומלץ
 @patch("app.services.email_service.send_email")
-@patch("tempfile.NamedTemporaryFile")
-def test_send_recommended_trip_summary_success(mock_temp, mock_send, db):
+def test_send_recommended_trip_summary_success(mock_send, db):
     trip = Trip(title="Recommended", destination="Greece", is_recommended=True, start_date=date.today(), end_date=date.today())
     db.add(trip)
     db.commit()
 
-    mock_file = MagicMock()
-    mock_file.__enter__.return_value.name = "/tmp/fake.txt"
-    mock_temp.return_value = mock_file
-
-    with patch("builtins.open", mock_open(read_data="summary text")):
-        email_service.send_recommended_trip_summary(trip.id, "user@example.com", db)
-        assert mock_send.call_count == 1
+    email_service.send_recommended_trip_summary(trip.id, "user@example.com", db)
+    assert mock_send.call_count == 1
+    assert mock_send.call_args[1]["to_email"] == "user@example.com"
 
 
 # בדיקה על טיול מומלץ שלא קיים
@@ -150,8 +199,7 @@ def test_send_recommended_trip_not_found(db):
 # --- send_ai_trip_summary_by_data ---
 # בדיקה של שליחת מייל מסיכום טיול AI
 @patch("app.services.email_service.send_email")
-@patch("tempfile.NamedTemporaryFile")
-def test_send_ai_trip_summary_success(mock_temp, mock_send):
+def test_send_ai_trip_summary_success(mock_send, db):
     request = AiTripSummaryRequest(
         destination="Japan",
         days=3,
@@ -166,10 +214,6 @@ def test_send_ai_trip_summary_success(mock_temp, mock_send):
         ]
     )
 
-    mock_file = MagicMock()
-    mock_file.__enter__.return_value.name = "/tmp/fake.txt"
-    mock_temp.return_value = mock_file
-
-    with patch("builtins.open", mock_open(read_data="ai summary")):
-        email_service.send_ai_trip_summary_by_data(request)
-        assert mock_send.call_count == 1
+    email_service.send_ai_trip_summary_by_data(request, db)
+    assert mock_send.call_count == 1
+    assert b"Temple at Kyoto" in mock_send.call_args[1]["attachment_content"]
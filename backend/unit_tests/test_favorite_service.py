@@ -1,7 +1,6 @@
 import pytest
 from fastapi import HTTPException
 from app.models.trip_model import Trip
-from app.models.rating_model import Rating
 from app.services import favorite_service
 from unit_tests.conftest import get_test_user, get_admin_user
 
@@ -11,15 +10,10 @@ admin = get_admin_user()
 # --- enrich_trip_with_rating ---
 # בדיקה עם דירוגים קיימים
 def test_enrich_trip_with_rating_with_ratings(db):
-    trip = Trip(title="Trip1", destination="Paris")
+    trip = Trip(title="Trip1", destination="Paris", rating_sum=9, rating_count=2)
     db.add(trip)
     db.commit()
-    db.add_all([
-        Rating(rating=4, user_id=user.id, trip_id=trip.id),
-        Rating(rating=5, user_id=admin.id, trip_id=trip.id),
-    ])
-    db.commit()
-    enriched = favorite_service.enrich_trip_with_rating(trip, db)
+    enriched = favorite_service.enrich_trip_with_rating(trip)
     assert enriched.average_rating == 4.5
 
 # בדיקה כשאין דירוגים
@@ -27,7 +21,7 @@ def test_enrich_trip_with_rating_without_ratings(db):
     trip = Trip(title="Trip2", destination="London")
     db.add(trip)
     db.commit()
-    enriched = favorite_service.enrich_trip_with_rating(trip, db)
+    enriched = favorite_service.enrich_trip_with_rating(trip)
     assert enriched.average_rating is None
 
 # --- toggle_favorite_trip ---
@@ -71,6 +65,18 @@ def test_get_all_favorites(db):
     result = favorite_service.get_all_favorites(user, db)
     assert len(result) == 1
 
+# דירוג ממוצע לכל מועדף ושמירה על סדר ההוספה
+def test_get_all_favorites_with_ratings(db):
+    first = Trip(title="Trip6a", destination="Tokyo")
+    second = Trip(title="Trip6b", destination="Osaka", rating_sum=3, rating_count=1)
+    db.add_all([first, second])
+    db.commit()
+    favorite_service.toggle_favorite_trip(user, second.id, db)
+    favorite_service.toggle_favorite_trip(user, first.id, db)
+    result = favorite_service.get_all_favorites(user, db)
+    assert [trip.id for trip in result] == [second.id, first.id]
+    assert [trip.average_rating for trip in result] == [3.0, None]
+
 # בדיקה כשאין מועדפים כלל
 def test_get_all_favorites_empty(db):
     results = favorite_service.get_all_favorites(user, db)
@@ -123,6 +129,15 @@ def test_toggle_favorite_recommended_trip_remove(db):
     removed = favorite_service.toggle_favorite_recommended_trip(trip.id, user, db)
     assert removed.id == trip.id
 
+# מונה המועדפים של הטיול עולה ויורד עם הסימון
+def test_toggle_favorite_recommended_trip_updates_count(db):
+    trip = Trip(title="Trip11b", destination="Athens", is_recommended=True)
+    db.add(trip)
+    db.commit()
+    assert favorite_service.toggle_favorite_recommended_trip(trip.id, user, db).favorite_count == 1
+    assert favorite_service.toggle_favorite_recommended_trip(trip.id, admin, db).favorite_count == 2
+    assert favorite_service.toggle_favorite_recommended_trip(trip.id, user, db).favorite_count == 1
+
 # טיול לא מומלץ לא אמור להיכנס למועדפים מומלצים
 def test_toggle_favorite_recommended_trip_invalid_trip(db):
     trip = Trip(title="Trip12", destination="Paris", is_recommended=False)
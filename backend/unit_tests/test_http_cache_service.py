@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+from fastapi import Response
+from app.models.trip_model import Trip
+from app.services import http_cache_service
+from unit_tests.conftest import get_test_user
+
+# משתמש גלובלי לבדיקה
+user = get_test_user()
+
+def create_trip(db, is_recommended=False):
+    trip = Trip(title="Lisbon", destination="Portugal", is_recommended=is_recommended, user_id=None if is_recommended else user.id)
+    db.add(trip)
+    db.commit()
+    return trip
+
+
+# --- etag_matches / http_date ---
+# התאמה ל-ETag מתוך רשימה, כולל W/ ו-*
+def test_etag_matches():
+    assert http_cache_service.etag_matches('"a", W/"b"', '"b"')
+    assert http_cache_service.etag_matches("*", '"b"')
+    assert not http_cache_service.etag_matches('"a"', '"b"')
+    assert not http_cache_service.etag_matches(None, '"b"')
+
+# תאריך בלי אזור זמן נחשב UTC
+def test_http_date():
+    assert http_cache_service.http_date(datetime(2026, 10, 18, 10, 0, 5)) == "Sun, 18 Oct 2026 10:00:05 GMT"
+
+
+# --- is_not_modified ---
+# If-None-Match קובע גם כשיש If-Modified-Since
+def test_is_not_modified_prefers_etag():
+    modified = datetime(2026, 10, 18, 10, 0, 5, 900000, tzinfo=timezone.utc)
+    later = "Sun, 18 Oct 2026 11:00:00 GMT"
+    assert not http_cache_service.is_not_modified('"new"', modified, '"old"', later)
+    assert http_cache_service.is_not_modified('"new"', modified, None, later)
+    assert http_cache_service.is_not_modified('"new"', modified, None, "Sun, 18 Oct 2026 10:00:05 GMT")
+    assert not http_cache_service.is_not_modified('"new"', modified, None, "Sun, 18 Oct 2026 09:00:00 GMT")
+    assert not http_cache_service.is_not_modified('"new"', modified, None, "not a date")
+
+
+# --- conditional_response / trip_response ---
+# 304 בלי לבנות את התוכן, ובתשובה רגילה הכותרות נוספות
+def test_conditional_response():
+    calls = []
+    def build():
+        calls.append(1)
+        return {"ok": True}
+
+    response = Response()
+    assert http_cache_service.conditional_response(response, '"v1"', "private, no-cache", build) == {"ok": True}
+    assert response.headers["etag"] == '"v1"'
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    not_modified = http_cache_service.conditional_response(Response(), '"v1"', "private, no-cache", build, '"v1"')
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == '"v1"'
+    assert len(calls) == 1
+
+# טיול אישי פרטי, טיול מומלץ ציבורי, ושינוי בטיול משנה את ה-ETag ואת Last-Modified
+def test_trip_response(db):
+    trip = create_trip(db)
+    response = Response()
+    http_cache_service.trip_response(trip, response, lambda: trip)
+    assert response.headers["cache-control"] == http_cache_service.PRIVATE_CACHE_CONTROL
+    assert response.headers["last-modified"] == http_cache_service.http_date(trip.updated_at)
+    etag = response.headers["etag"]
+    assert http_cache_service.trip_response(trip, Response(), lambda: trip, etag).status_code == 304
+
+    trip.updated_at = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    trip.title = "Porto"
+    db.commit()
+    assert trip.updated_at.year > 2000
+    assert http_cache_service.trip_response(trip, Response(), lambda: trip, etag) is trip
+
+# ה-ETag נשלח גם בלי התחברות - הוא לא חושף את share_uuid
+def test_trip_etag_hides_share_uuid(db):
+    trip = create_trip(db)
+    assert http_cache_service.trip_etag(trip) == f'"{trip.id}-{trip.revision}-0-0"'
+    assert str(trip.share_uuid) not in http_cache_service.trip_etag(trip)
+
+    recommended = create_trip(db, is_recommended=True)
+    response = Response()
+    http_cache_service.trip_response(recommended, response, lambda: recommended)
+    assert response.headers["cache-control"] == http_cache_service.PUBLIC_CACHE_CONTROL
+
+# בלי טיול התשובה נבנית בלי כותרות
+def test_trip_response_without_trip():
+    response = Response()
+    assert http_cache_service.trip_response(None, response, lambda: []) == []
+    assert "etag" not in response.headers
@@ -0,0 +1,126 @@
+import pytest
+from datetime import date, time
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from app.models.trip_model import Trip
+from app.models.activity_model import Activity
+from app.services import ics_service
+from unit_tests.conftest import get_test_user, get_admin_user
+
+# משתמשים גלובליים לבדיקה
+user = get_test_user()
+admin = get_admin_user()
+
+def create_trip(db, user_id=user.id, title="Paris Trip", start=date(2025, 6, 1), end=date(2025, 6, 3)):
+    trip = Trip(title=title, destination="Paris", start_date=start, end_date=end, user_id=user_id)
+    db.add(trip)
+    db.flush()
+    db.add_all([
+        Activity(trip_id=trip.id, day_number=2, title="Louvre", time=time(10, 0), location_name="Paris, Rue de Rivoli"),
+        Activity(trip_id=trip.id, day_number=1, title="Walk", time=None, location_name="Paris"),
+        Activity(trip_id=trip.id, day_number=9, title="Out of range", time=time(8, 0), location_name="Paris"),
+    ])
+    db.commit()
+    return trip
+
+def render(trips) -> str:
+    return b"".join(ics_service.stream_calendar(trips, "Trips")).decode("utf-8")
+
+
+# --- ics_escape / fold_line ---
+# תווים מיוחדים מקודדים לפי התקן
+def test_ics_escape():
+    assert ics_service.ics_escape("a,b;c\\d\ne") == "a\\,b\\;c\\\\d\\ne"
+    assert ics_service.ics_escape(None) == ""
+
+# שורה ארוכה מקופלת ל-75 בתים בשורה, בלי לשבור תו בעברית באמצע
+def test_fold_line():
+    line = "SUMMARY:" + "טיול" * 40
+    folded = ics_service.fold_line(line)
+    parts = folded[:-2].split("\r\n")
+    assert all(len(part.encode("utf-8")) <= 75 for part in parts)
+    assert all(part.startswith(" ") for part in parts[1:])
+    assert "".join(part[1:] if i else part for i, part in enumerate(parts)) == line
+
+
+# --- stream_calendar ---
+# אירוע אחד לכל פעילות בטווח הטיול - עם שעה באזור הזמן של היומן, ובלי שעה כיום שלם
+def test_stream_calendar_trip(db, monkeypatch):
+    monkeypatch.setattr(ics_service, "CALENDAR_TIMEZONE", "Europe/Paris")
+    trip = create_trip(db)
+    ics = render([trip])
+
+    assert ics.startswith("BEGIN:VCALENDAR\r\nVERSION:2.0\r\n")
+    assert ics.endswith("END:VCALENDAR\r\n")
+    assert ics.count("BEGIN:VEVENT") == 2
+    assert "Out of range" not in ics
+    assert "DTSTART:20250602T080000Z\r\nDTEND:20250602T090000Z\r\nSUMMARY:Louvre" in ics
+    assert "DTSTART;VALUE=DATE:20250601\r\nDTEND;VALUE=DATE:20250602\r\nSUMMARY:Walk" in ics
+    assert "LOCATION:Paris\\, Rue de Rivoli" in ics
+    assert f"SEQUENCE:{trip.revision}" in ics
+    assert str(trip.share_uuid) not in ics
+
+# אותה גרסה של הטיול תמיד מייצרת את אותו קובץ
+def test_stream_calendar_stable(db):
+    trip = create_trip(db)
+    assert render([trip]) == render([trip])
+
+
+# --- get_trip_calendar ---
+# הקובץ נשלח בהזרמה עם ETag, ואותו ETag מחזיר 304
+def test_get_trip_calendar_etag(db):
+    trip = create_trip(db)
+    response = ics_service.get_trip_calendar(trip.id, db)
+    assert isinstance(response, StreamingResponse)
+    assert response.media_type.startswith("text/calendar")
+    etag = response.headers["etag"]
+
+    assert ics_service.get_trip_calendar(trip.id, db, etag).status_code == 304
+    assert ics_service.get_trip_calendar(trip.id, db, f'"other", W/{etag}').status_code == 304
+
+    # שינוי בפעילות משנה את ה-ETag
+    db.add(Activity(trip_id=trip.id, day_number=3, title="Versailles", location_name="Versailles"))
+    db.commit()
+    assert ics_service.get_trip_calendar(trip.id, db, etag).status_code == 200
+
+# טיול שלא קיים
+def test_get_trip_calendar_not_found(db):
+    with pytest.raises(HTTPException) as e:
+        ics_service.get_trip_calendar(9999, db)
+    assert e.value.status_code == 404
+
+# טיול בלי תאריך התחלה
+def test_get_trip_calendar_without_dates(db):
+    trip = create_trip(db, start=None, end=None)
+    with pytest.raises(HTTPException) as e:
+        ics_service.get_trip_calendar(trip.id, db)
+    assert e.value.status_code == 400
+
+
+# --- get_user_calendar_feed ---
+# הפיד כולל רק את הטיולים של המשתמש
+def test_stream_user_trips(db):
+    create_trip(db, title="First")
+    create_trip(db, title="Second", start=date(2025, 5, 1), end=date(2025, 5, 2))
+    create_trip(db, user_id=admin.id, title="Other user")
+
+    trips = list(ics_service.stream_user_trips(db, user.id, batch_size=1))
+    assert [trip.title for trip in trips] == ["Second", "First"]
+    assert render(trips).count("BEGIN:VEVENT") == 4
+
+# ETag של הפיד משתנה כשטיול משתנה, נוסף או נמחק, ולא כשטיול של משתמש אחר משתנה
+def test_user_feed_etag(db):
+    trip = create_trip(db)
+    etag = ics_service.user_feed_etag(db, user.id)
+    assert ics_service.get_user_calendar_feed(user, db, etag).status_code == 304
+
+    create_trip(db, user_id=admin.id)
+    assert ics_service.user_feed_etag(db, user.id) == etag
+
+    trip.title = "Renamed"
+    db.commit()
+    renamed = ics_service.user_feed_etag(db, user.id)
+    assert renamed != etag
+
+    create_trip(db)
+    assert ics_service.user_feed_etag(db, user.id) != renamed
@@ -0,0 +1,220 @@
+import time
+import socket
+import smtplib
+import pytest
+from datetime import datetime, timedelta, timezone
+from email import message_from_bytes
+from unittest.mock import patch, MagicMock
+from aiosmtpd.controller import Controller
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.database import Base
+from app.models.outbound_email_model import OutboundEmail
+from app.services import mail_queue_service
+
+
+# שרת SMTP מקומי שאוסף את ההודעות ואת החיבורים שנפתחו
+class CollectingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+        self.rejected = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.rejected:
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(message_from_bytes(envelope.content))
+        return "250 Message accepted"
+
+# פורט פנוי במחשב
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    handler = CollectingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    monkeypatch.setattr(mail_queue_service, "EMAIL_HOST", "127.0.0.1")
+    monkeypatch.setattr(mail_queue_service, "EMAIL_PORT", controller.port)
+    monkeypatch.setattr(mail_queue_service, "EMAIL_USE_TLS", False)
+    monkeypatch.setattr(mail_queue_service, "EMAIL_PASSWORD", None)
+    monkeypatch.setattr(mail_queue_service, "EMAIL_ADDRESS", "planngo@example.com")
+    yield handler
+    controller.stop()
+
+# כתובת שאין בה שרת SMTP
+@pytest.fixture
+def no_smtp_server(monkeypatch):
+    monkeypatch.setattr(mail_queue_service, "EMAIL_HOST", "127.0.0.1")
+    monkeypatch.setattr(mail_queue_service, "EMAIL_PORT", free_port())
+    monkeypatch.setattr(mail_queue_service, "EMAIL_TIMEOUT", 2)
+
+def enqueue(db, to_email="user@example.com", **kwargs):
+    return mail_queue_service.enqueue_email(db, subject="Hello", to_email=to_email, body_html="<p>Hi</p>", **kwargs)
+
+def as_utc(value):
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+# --- enqueue_email ---
+# המייל נשמר בתור ומעיר את ה-workers
+def test_enqueue_email(db):
+    mail_queue_service._wakeup.clear()
+    email = enqueue(db)
+    assert email.status == "pending"
+    assert mail_queue_service._wakeup.is_set()
+
+
+# --- deliver_pending_emails ---
+# כל המיילים בתור נשלחים בחיבור SMTP אחד
+def test_deliver_pending_emails_single_connection(db, smtp_server):
+    for i in range(3):
+        enqueue(db, to_email=f"user{i}@example.com")
+
+    connection = mail_queue_service.SMTPConnection()
+    try:
+        assert mail_queue_service.deliver_pending_emails(db, connection) == 3
+    finally:
+        connection.close()
+
+    assert len(smtp_server.messages) == 3
+    assert len(smtp_server.sessions) == 1
+    emails = db.query(OutboundEmail).all()
+    assert all(e.status == "sent" and e.sent_at and e.attempts == 1 for e in emails)
+
+# קובץ מצורף מגיע לנמען
+def test_deliver_pending_emails_attachment(db, smtp_server):
+    enqueue(db, attachment_name="trip.txt", attachment_content=b"Day 1: Rome")
+
+    connection = mail_queue_service.SMTPConnection()
+    mail_queue_service.deliver_pending_emails(db, connection)
+    connection.close()
+
+    message = smtp_server.messages[0]
+    assert message["From"] == "planngo@example.com"
+    attachment = [part for part in message.walk() if part.get_filename() == "trip.txt"][0]
+    assert attachment.get_payload(decode=True) == b"Day 1: Rome"
+
+# שרת לא זמין - המייל חוזר לתור עם המתנה שגדלה בכל ניסיון
+def test_deliver_pending_emails_retry_backoff(db, no_smtp_server, monkeypatch):
+    monkeypatch.setattr(mail_queue_service, "MAIL_RETRY_BACKOFF", 10)
+    email = enqueue(db)
+    connection = mail_queue_service.SMTPConnection()
+
+    before = datetime.now(timezone.utc)
+    mail_queue_service.deliver_pending_emails(db, connection)
+    db.refresh(email)
+    assert email.status == "pending"
+    assert email.attempts == 1
+    assert email.last_error
+    assert as_utc(email.next_attempt_at) >= before + timedelta(seconds=10)
+
+    # ניסיון שני רק אחרי ההמתנה
+    assert mail_queue_service.deliver_pending_emails(db, connection) == 0
+    email.next_attempt_at = datetime.now(timezone.utc)
+    db.commit()
+    before = datetime.now(timezone.utc)
+    mail_queue_service.deliver_pending_emails(db, connection)
+    db.refresh(email)
+    assert email.attempts == 2
+    assert as_utc(email.next_attempt_at) >= before + timedelta(seconds=20)
+
+# אחרי המספר המקסימלי של ניסיונות המייל מסומן כנכשל
+def test_deliver_pending_emails_max_attempts(db, no_smtp_server, monkeypatch):
+    monkeypatch.setattr(mail_queue_service, "MAIL_MAX_ATTEMPTS", 1)
+    email = enqueue(db)
+
+    mail_queue_service.deliver_pending_emails(db, mail_queue_service.SMTPConnection())
+    db.refresh(email)
+    assert email.status == "failed"
+
+# כתובת שנדחתה נכשלת מיד, ושאר המיילים עוברים באותו חיבור
+def test_deliver_pending_emails_rejected_recipient(db, smtp_server):
+    smtp_server.rejected.add("missing@example.com")
+    rejected = enqueue(db, to_email="missing@example.com")
+    accepted = enqueue(db, to_email="user@example.com")
+
+    connection = mail_queue_service.SMTPConnection()
+    mail_queue_service.deliver_pending_emails(db, connection)
+    connection.close()
+
+    db.refresh(rejected)
+    db.refresh(accepted)
+    assert rejected.status == "failed"
+    assert accepted.status == "sent"
+    assert len(smtp_server.sessions) == 1
+
+# מייל שנתקע ב-sending (worker שנפל) חוזר לתור אחרי הזמן המוקצב
+def test_claim_emails_reclaims_stuck_email(db):
+    email = enqueue(db)
+    assert mail_queue_service.claim_emails(db, 10) == [email]
+    assert mail_queue_service.claim_emails(db, 10) == []
+
+    email.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.commit()
+    assert mail_queue_service.claim_emails(db, 10) == [email]
+
+
+# --- SMTPConnection ---
+# חיבור שהשרת סגר נפתח מחדש
+@patch("smtplib.SMTP")
+def test_smtp_connection_reconnects(mock_smtp, monkeypatch):
+    monkeypatch.setattr(mail_queue_service, "EMAIL_USE_TLS", False)
+    monkeypatch.setattr(mail_queue_service, "EMAIL_PASSWORD", None)
+    stale, fresh = MagicMock(), MagicMock()
+    stale.send_message.side_effect = smtplib.SMTPServerDisconnected()
+    mock_smtp.side_effect = [stale, fresh]
+
+    connection = mail_queue_service.SMTPConnection()
+    connection.send("first")
+    connection.send("second")
+
+    assert mock_smtp.call_count == 2
+    assert fresh.send_message.call_count == 2
+
+# התחברות ו-STARTTLS פעם אחת לכל החיבור
+@patch("smtplib.SMTP")
+def test_smtp_connection_login_once(mock_smtp, monkeypatch):
+    monkeypatch.setattr(mail_queue_service, "EMAIL_USE_TLS", True)
+    monkeypatch.setattr(mail_queue_service, "EMAIL_PASSWORD", "secret")
+    server = mock_smtp.return_value
+
+    connection = mail_queue_service.SMTPConnection()
+    for i in range(3):
+        connection.send(f"message {i}")
+
+    server.starttls.assert_called_once()
+    server.login.assert_called_once()
+    assert server.send_message.call_count == 3
+
+
+# --- MailWorkerPool ---
+# ה-workers שולחים את המיילים ברקע
+def test_mail_worker_pool(tmp_path, smtp_server):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mail.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    pool = mail_queue_service.MailWorkerPool(workers=2, session_factory=Session)
+    pool.start()
+    try:
+        with Session() as session:
+            for i in range(5):
+                enqueue(session, to_email=f"user{i}@example.com")
+
+        deadline = time.time() + 10
+        while len(smtp_server.messages) < 5 and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        pool.stop()
+        engine.dispose()
+
+    assert sorted(m["To"] for m in smtp_server.messages) == [f"user{i}@example.com" for i in range(5)]
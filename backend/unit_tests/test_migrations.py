@@ -0,0 +1,135 @@
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, event, inspect, text
+from app.db.database import Base
+from app.db import migrate
+import app.models  # noqa: F401
+
+# הגרסה האחרונה של המיגרציות
+HEAD = ScriptDirectory.from_config(migrate.get_alembic_config()).get_current_head()
+
+# DB חדש בקובץ זמני לכל בדיקה
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+# ההבדלים בין מבנה ה-DB למודלים, בלי עמודות ואינדקסים שקיימים רק ב-Postgres
+def schema_diff(engine):
+    with engine.connect() as connection:
+        context = MigrationContext.configure(connection, opts={"compare_type": False})
+        diff = compare_metadata(context, Base.metadata)
+    return [d for d in diff if not (isinstance(d, tuple) and d[0] == "add_index" and d[1].name in ("ix_trips_search_vector", "ix_users_username_trgm"))]
+
+
+# --- run_migrations ---
+# DB ריק מגיע לגרסה האחרונה ותואם את המודלים
+def test_run_migrations_matches_models(engine):
+    migrate.run_migrations(engine)
+    assert migrate.current_revision(engine) == HEAD
+    assert schema_diff(engine) == []
+
+# הוספת מועדף כפול נכשלת אחרי המיגרציה
+def test_run_migrations_unique_favorites(engine):
+    migrate.run_migrations(engine)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO users (id, username, email, password) VALUES (1, 'u', 'u@x.com', 'p')"))
+        connection.execute(text("INSERT INTO favorite_trips (user_id, trip_id) VALUES (1, 1)"))
+    with pytest.raises(Exception):
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO favorite_trips (user_id, trip_id) VALUES (1, 1)"))
+
+# DB קיים בלי alembic_version מסומן לפי המבנה שלו ואז משודרג
+def test_run_migrations_unversioned_database(engine):
+    migrate.run_migrations(engine, "0001_baseline")
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE alembic_version"))
+    migrate.run_migrations(engine)
+    assert migrate.current_revision(engine) == HEAD
+    assert schema_diff(engine) == []
+
+# DB שנוצר ב-create_all מזוהה לפי העמודות ולא מנסה להוסיף אותן שוב
+def test_detect_unversioned_revision_create_all(engine):
+    migrate.run_migrations(engine, "0003_trip_search")
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE alembic_version"))
+        assert migrate.detect_unversioned_revision(connection) == "0003_trip_search"
+
+# מחיקת מועדפים כפולים ועדכון המונה בזמן המיגרציה
+def test_hot_indexes_removes_duplicate_favorites(engine):
+    migrate.run_migrations(engine, "0003_trip_search")
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO users (id, username, email, password) VALUES (1, 'u', 'u@x.com', 'p')"))
+        connection.execute(text(
+            "INSERT INTO trips (id, title, destination, share_uuid, favorite_count) VALUES (1, 't', 'd', 'abc', 2)"
+        ))
+        connection.execute(text("INSERT INTO favorite_trips (user_id, trip_id) VALUES (1, 1), (1, 1)"))
+    migrate.run_migrations(engine)
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM favorite_trips")).scalar() == 1
+        assert connection.execute(text("SELECT favorite_count FROM trips")).scalar() == 1
+
+
+# --- backfill_in_batches ---
+# כל השורות מתעדכנות, בעדכון נפרד לכל טווח id
+def test_backfill_in_batches(engine):
+    migrate.run_migrations(engine)
+    with engine.begin() as connection:
+        for trip_id in (1, 2, 3, 7):
+            connection.execute(text(
+                "INSERT INTO trips (id, title, destination, share_uuid) VALUES (:id, 't', 'd', :id)"
+            ), {"id": trip_id})
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        if statement.startswith("UPDATE"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        with engine.connect() as connection:
+            context = MigrationContext.configure(connection)
+            with Operations.context(context), context.begin_transaction():
+                migrate.backfill_in_batches("trips", "title = upper(title)", batch_size=2)
+            connection.commit()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert len(statements) == 4
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT DISTINCT title FROM trips")).scalars().all() == ["T"]
+
+
+# --- downgrade_migrations ---
+# חזרה לגרסת הבסיס ושדרוג מחדש
+def test_downgrade_and_upgrade_round_trip(engine):
+    migrate.run_migrations(engine)
+    migrate.downgrade_migrations("0001_baseline", engine)
+    assert migrate.current_revision(engine) == "0001_baseline"
+    assert "rating_sum" not in {c["name"] for c in inspect(engine).get_columns("trips")}
+    migrate.run_migrations(engine)
+    assert schema_diff(engine) == []
+    # אינדקס הביטוי לא נבדק ב-compare_metadata ב-SQLite
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'ix_trips_rating_score'")).scalar() == 1
+
+
+# --- main ---
+# שורת הפקודה משדרגת לגרסה שנבחרה ומדפיסה אותה
+def test_main_upgrade_and_downgrade(engine, monkeypatch, capsys):
+    monkeypatch.setattr(migrate, "default_engine", engine)
+    migrate.main(["upgrade", "0002_trip_aggregates"])
+    assert capsys.readouterr().out.strip() == "0002_trip_aggregates"
+    migrate.main(["upgrade"])
+    assert migrate.current_revision(engine) == HEAD
+    migrate.main(["downgrade", "0003_trip_search"])
+    assert migrate.current_revision(engine) == "0003_trip_search"
+
+# פקודה לא מוכרת
+def test_main_unknown_command():
+    with pytest.raises(SystemExit):
+        migrate.main(["create-all"])
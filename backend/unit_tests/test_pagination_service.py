@@ -0,0 +1,93 @@
+import pytest
+from datetime import date, datetime, timezone
+from fastapi import HTTPException
+from app.models.trip_model import Trip
+from app.services import pagination_service, trip_service, recommend_service
+from unit_tests.conftest import get_test_user
+
+# משתמש גלובלי לבדיקה
+user = get_test_user()
+
+# מעבר על כל העמודים עם סמן ואיסוף המזהים
+def collect_pages(fetch):
+    ids, cursor, pages = [], None, 0
+    while True:
+        result = fetch(cursor)
+        ids.extend(trip.id for trip in result["trips"])
+        pages += 1
+        cursor = result["next_cursor"]
+        if cursor is None:
+            return ids, pages
+
+
+# --- encode_cursor / decode_cursor ---
+# הסמן שומר תאריכים ומספרים כפי שהם
+def test_cursor_round_trip():
+    values = [datetime(2025, 5, 1, 10, 30, tzinfo=timezone.utc), date(2025, 6, 1), 4.5, 7]
+    cursor = pagination_service.encode_cursor("recent", values)
+    assert pagination_service.decode_cursor(cursor, "recent") == values
+
+# סמן פגום
+def test_decode_cursor_invalid():
+    with pytest.raises(HTTPException) as e:
+        pagination_service.decode_cursor("not-a-cursor!", "recent")
+    assert e.value.status_code == 400
+
+# סמן של מיון אחר
+def test_decode_cursor_other_sort():
+    cursor = pagination_service.encode_cursor("recent", [1])
+    with pytest.raises(HTTPException) as e:
+        pagination_service.decode_cursor(cursor, "top_rated")
+    assert e.value.status_code == 400
+
+
+# --- paginate_trips ---
+# מעבר על כל הטיולים לפי recent בלי כפילויות גם כשזמן היצירה זהה
+def test_cursor_pages_recent(db):
+    db.add_all([Trip(title=f"T{i}", destination="D", user_id=user.id) for i in range(7)])
+    db.commit()
+    expected = [trip.id for trip in db.query(Trip).order_by(Trip.created_at.desc(), Trip.id.desc())]
+
+    ids, pages = collect_pages(
+        lambda cursor: trip_service.get_trips(db, user.id, "recent", 1, 3, cursor, include_total=False)
+    )
+    assert ids == expected
+    assert pages == 3
+
+# start_soonest - טיולים בלי תאריך בסוף
+def test_cursor_pages_start_soonest(db):
+    late = Trip(title="Late", destination="D", user_id=user.id, start_date=date(2025, 9, 1))
+    undated = Trip(title="Undated", destination="D", user_id=user.id)
+    early = Trip(title="Early", destination="D", user_id=user.id, start_date=date(2025, 7, 1))
+    db.add_all([late, undated, early])
+    db.commit()
+
+    ids, _ = collect_pages(
+        lambda cursor: trip_service.get_trips(db, user.id, "start_soonest", 1, 1, cursor)
+    )
+    assert ids == [early.id, late.id, undated.id]
+
+# top_rated במומלצים לפי מוני הדירוג
+def test_cursor_pages_top_rated(db):
+    trips = [Trip(title=f"R{i}", destination="D", is_recommended=True, rating_sum=i, rating_count=1) for i in range(1, 5)]
+    db.add_all(trips)
+    db.commit()
+
+    ids, _ = collect_pages(
+        lambda cursor: recommend_service.get_recommended_trips(db, "top_rated", 1, 3, cursor)
+    )
+    assert ids == [trip.id for trip in reversed(trips)]
+
+# בלי ספירה total מוחזר כ-None
+def test_paginate_without_total(db):
+    db.add(Trip(title="T", destination="D", user_id=user.id))
+    db.commit()
+    result = trip_service.get_trips(db, user.id, "recent", 1, 10, include_total=False)
+    assert result["total"] is None
+    assert result["next_cursor"] is None
+
+# מיון אקראי לא תומך בסמן
+def test_paginate_cursor_with_random_sort(db):
+    with pytest.raises(HTTPException) as e:
+        trip_service.get_trips(db, user.id, "random", 1, 10, cursor="abc")
+    assert e.value.status_code == 400
@@ -0,0 +1,70 @@
+import threading
+import pytest
+from fastapi import HTTPException
+from app.services import password_service
+from app.services.password_service import PasswordHasher
+
+
+# --- hash_password ---
+# הסיסמה מוצפנת בעלות שהוגדרה
+def test_hash_password_uses_configured_rounds(monkeypatch):
+    monkeypatch.setattr(password_service, "BCRYPT_ROUNDS", 4)
+    hashed = password_service.hash_password("secret")
+    assert hashed.startswith("$2b$04$")
+    assert password_service.verify_password("secret", hashed)
+    assert not password_service.verify_password("other", hashed)
+
+
+# --- password_needs_rehash ---
+# סיסמה בעלות אחרת (או בפורמט לא מוכר) צריכה הצפנה מחדש
+def test_password_needs_rehash(monkeypatch):
+    monkeypatch.setattr(password_service, "BCRYPT_ROUNDS", 5)
+    assert password_service.password_needs_rehash("$2b$04$abcdefghijklmnopqrstuv")
+    assert not password_service.password_needs_rehash("$2b$05$abcdefghijklmnopqrstuv")
+    assert password_service.password_needs_rehash("plain")
+
+
+# --- PasswordHasher ---
+# כשכל ה-workers תפוסים והתור מלא בקשה חדשה נדחית מיד עם 503
+def test_password_hasher_sheds_load():
+    hasher = PasswordHasher(workers=1, queue_limit=1)
+    started, release = threading.Event(), threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(hasher.run(blocking))) for _ in range(2)]
+    try:
+        threads[0].start()
+        started.wait(5)
+        threads[1].start()
+        while hasher.metrics()["queued"] < 1:
+            pass
+
+        with pytest.raises(HTTPException) as e:
+            hasher.run(blocking)
+        assert e.value.status_code == 503
+        assert e.value.headers["Retry-After"] == "1"
+
+        metrics = hasher.metrics()
+        assert (metrics["running"], metrics["queued"], metrics["rejected"]) == (1, 1, 1)
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        hasher.shutdown()
+
+    assert results == ["done", "done"]
+    assert hasher.metrics()["completed"] == 2
+    assert hasher.metrics()["queued"] == 0
+
+# שגיאה בחישוב מגיעה לקורא ולא משאירה את הבקשה בתור
+def test_password_hasher_propagates_errors():
+    hasher = PasswordHasher(workers=1, queue_limit=0)
+    with pytest.raises(ValueError):
+        hasher.run(lambda: (_ for _ in ()).throw(ValueError("bad salt")))
+    assert hasher.run(lambda: 1) == 1
+    hasher.shutdown()
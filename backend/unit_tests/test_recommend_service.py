@@ -1,5 +1,6 @@
 import pytest
-from fastapi import HTTPException
+from fastapi import HTTPException, Response
+from sqlalchemy import event
 from app.models.trip_model import Trip
 from app.models.rating_model import Rating
 from app.models.comment_model import Comment
@@ -7,7 +8,7 @@ from app.models.favorite_model import FavoriteRecommendedTrip
 from app.schemas.comment_schema import CommentCreate
 from app.schemas.rating_schema import RateTripRequest
 from app.schemas.trip_schema import AiTripCloneRequest
-from app.services import recommend_service
+from app.services import recommend_service, favorite_service
 from app.services.auth_service import User
 from unit_tests.conftest import get_test_user, get_admin_user
 
@@ -43,6 +44,20 @@ def test_get_recommended_trips_favorites(db):
     result = recommend_service.get_recommended_trips(db, "favorites", 1, 10)
     assert result["total"] == 1
 
+# top_rated ממוין לפי המונים של הטיול - טיול בלי דירוגים אחרון
+def test_get_recommended_trips_top_rated_order(db):
+    low = Trip(title="Low", destination="Place", is_recommended=True)
+    high = Trip(title="High", destination="Place", is_recommended=True)
+    unrated = Trip(title="Unrated", destination="Place", is_recommended=True)
+    db.add_all([low, high, unrated])
+    db.commit()
+    recommend_service.rate_trip(low.id, RateTripRequest(rating=2), user, db)
+    recommend_service.rate_trip(high.id, RateTripRequest(rating=5), user, db)
+    recommend_service.rate_trip(high.id, RateTripRequest(rating=4), admin, db)
+    result = recommend_service.get_recommended_trips(db, "top_rated", 1, 10)
+    assert [trip.title for trip in result["trips"]] == ["High", "Low", "Unrated"]
+    assert result["trips"][0].average_rating == 4.5
+
 # --- handle_search_recommended_trips ---
 # חיפוש לפי כותרת
 def test_search_recommended_by_title(db):
@@ -51,6 +66,17 @@ def test_search_recommended_by_title(db):
     result = recommend_service.handle_search_recommended_trips("Ama", "", "", db)
     assert result["total"] == 1
 
+# חיפוש עם מיון top_rated נעשה במסד ומחזיר עמוד אחד בלבד
+def test_search_recommended_top_rated(db):
+    first = Trip(title="Beach A", destination="Place", is_recommended=True)
+    second = Trip(title="Beach B", destination="Place", is_recommended=True)
+    db.add_all([first, second])
+    db.commit()
+    recommend_service.rate_trip(second.id, RateTripRequest(rating=5), user, db)
+    result = recommend_service.handle_search_recommended_trips("Beach", "", "", db, page=1, limit=1, sort_by="top_rated")
+    assert result["total"] == 2
+    assert [trip.id for trip in result["trips"]] == [second.id]
+
 # חיפוש ריק
 def test_search_recommended_no_filters(db):
     result = recommend_service.handle_search_recommended_trips("", "", "", db)
@@ -75,6 +101,18 @@ def test_rate_existing_trip_updates(db):
     response = recommend_service.rate_trip(trip.id, RateTripRequest(rating=5), user, db)
     assert "Rating submitted successfully" in response["message"]
 
+# סכום ומונה הדירוגים מתעדכנים עם כל דירוג חדש או מעודכן
+def test_rate_trip_updates_aggregates(db):
+    trip = Trip(title="Rated", destination="Z", is_recommended=True)
+    db.add(trip)
+    db.commit()
+    recommend_service.rate_trip(trip.id, RateTripRequest(rating=4), user, db)
+    recommend_service.rate_trip(trip.id, RateTripRequest(rating=2), admin, db)
+    response = recommend_service.rate_trip(trip.id, RateTripRequest(rating=5), user, db)
+    db.refresh(trip)
+    assert (trip.rating_sum, trip.rating_count) == (7, 2)
+    assert response["average_rating"] == 3.5
+
 # ניסיון לדרג טיול לא מומלץ
 def test_rate_trip_invalid(db):
     trip = Trip(title="X", destination="Y", is_recommended=False)
@@ -149,18 +187,160 @@ def test_import_ai_recommended_success(db):
     assert new_trip.title.startswith("Recommended:")
 
 # --- enrich_with_average_rating ---
-# ממוצע תקין
+# ממוצע תקין לפי המונים של הטיול
 def test_enrich_with_average_rating(db):
     trip = Trip(title="R", destination="D", is_recommended=True)
     db.add(trip)
     db.commit()
+    recommend_service.rate_trip(trip.id, RateTripRequest(rating=3), user, db)
+    recommend_service.rate_trip(trip.id, RateTripRequest(rating=5), admin, db)
+    enriched = recommend_service.enrich_with_average_rating([trip])
+    assert enriched[0].average_rating == 4.0
+
+# כמה טיולים בלי אף שאילתה - הממוצע מחושב מ-rating_sum ו-rating_count
+def test_enrich_with_average_rating_no_queries(db):
+    trips = [
+        Trip(title="R0", destination="D", is_recommended=True, rating_sum=7, rating_count=2),
+        Trip(title="R1", destination="D", is_recommended=True, rating_sum=4, rating_count=1),
+        Trip(title="R2", destination="D", is_recommended=True),
+    ]
+    db.add_all(trips)
+    db.commit()
+    ids = [trip.id for trip in trips]
+    for trip in trips:
+        db.refresh(trip)
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        recommend_service.enrich_with_average_rating(trips)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert statements == []
+    assert [trip.id for trip in trips] == ids
+    assert [trip.average_rating for trip in trips] == [3.5, 4.0, None]
+
+# --- refresh_trip_aggregates ---
+# חישוב מחדש של המונים מתוך טבלאות הדירוגים והמועדפים
+def test_refresh_trip_aggregates(db):
+    trip = Trip(title="R", destination="D", is_recommended=True, rating_sum=99, rating_count=9, favorite_count=9)
+    db.add(trip)
+    db.commit()
     db.add(Rating(rating=3, user_id=user.id, trip_id=trip.id))
-    db.add(Rating(rating=5, user_id=admin.id, trip_id=trip.id))
+    db.add(FavoriteRecommendedTrip(user_id=user.id, trip_id=trip.id))
     db.commit()
-    enriched = recommend_service.enrich_with_average_rating([trip], db)
-    assert enriched[0].average_rating == 4.0
+    recommend_service.refresh_trip_aggregates([trip.id], db)
+    db.commit()
+    db.refresh(trip)
+    assert (trip.rating_sum, trip.rating_count, trip.favorite_count) == (3, 1, 1)
 
 # ממוצע כאשר אין דירוגים
 def test_enrich_with_average_rating_empty(db):
-    result = recommend_service.enrich_with_average_rating([], db)
+    result = recommend_service.enrich_with_average_rating([])
     assert result == []
+
+# --- get_cached_recommended_trips ---
+# עמוד שנשמר נשלף בלי שאילתות, ודירוג חדש מנקה אותו
+def test_get_cached_recommended_trips(db):
+    trip = Trip(title="Cached", destination="Place", is_recommended=True)
+    db.add(trip)
+    db.commit()
+    first = recommend_service.get_cached_recommended_trips(db, "top_rated", 1, 10)
+
+    statements = []
+    def count(*args):
+        statements.append(args[2])
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        second = recommend_service.get_cached_recommended_trips(db, "top_rated", 1, 10)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert statements == []
+    assert second == first
+    assert first["trips"][0]["title"] == "Cached"
+
+    recommend_service.rate_trip(trip.id, RateTripRequest(rating=4), user, db)
+    result = recommend_service.get_cached_recommended_trips(db, "top_rated", 1, 10)
+    assert result["trips"][0]["average_rating"] == 4.0
+
+# מיון random לא נשמר במטמון
+def test_get_cached_recommended_trips_random_not_cached(db):
+    db.add(Trip(title="Random", destination="Place", is_recommended=True))
+    db.commit()
+    result = recommend_service.get_cached_recommended_trips(db, "random", 1, 10)
+    assert result["total"] == 1
+    assert len(recommend_service._listings) == 0
+
+# תוצאות חיפוש נשמרות ומתנקות אחרי סימון טיול כמועדף
+def test_get_cached_search_results(db):
+    trip = Trip(title="Beach", destination="Place", is_recommended=True)
+    db.add(trip)
+    db.commit()
+    result = recommend_service.get_cached_search_results("Beach", "", "", db)
+    assert result["total"] == 1
+    assert len(recommend_service._listings) == 1
+
+    favorite_service.toggle_favorite_recommended_trip(trip.id, user, db)
+    assert len(recommend_service._listings) == 0
+
+# --- get_cached_comments_for_trip ---
+# התגובות נשמרות, ותגובה חדשה מנקה את הטיול שלה
+def test_get_cached_comments_for_trip(db):
+    trip = Trip(title="Commented", destination="Z", is_recommended=True)
+    db.add(trip)
+    db.commit()
+    recommend_service.add_comment_to_trip(trip.id, user, CommentCreate(content="First"), db)
+    assert [c["content"] for c in recommend_service.get_cached_comments_for_trip(trip.id, db)] == ["First"]
+
+    db.add(Comment(content="Direct", trip_id=trip.id, user_id=user.id))
+    db.commit()
+    assert len(recommend_service.get_cached_comments_for_trip(trip.id, db)) == 1
+
+    recommend_service.add_comment_to_trip(trip.id, user, CommentCreate(content="Second"), db)
+    assert len(recommend_service.get_cached_comments_for_trip(trip.id, db)) == 3
+
+# --- recommended_listings_etag / listing_response ---
+# ה-ETag משתנה עם דירוג, ו-304 מהמטמון נשלח בלי לבנות את הרשימה ובלי שאילתות
+def test_recommended_listings_etag(db):
+    trip = Trip(title="Tagged", destination="Place", is_recommended=True)
+    db.add(trip)
+    db.commit()
+    etag = recommend_service.recommended_listings_etag(db)
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        not_modified = recommend_service.listing_response(db, Response(), "recent", etag, lambda version: pytest.fail("built"))
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert not_modified.status_code == 304
+    assert statements == []
+
+    recommend_service.rate_trip(trip.id, RateTripRequest(rating=5), user, db)
+    assert recommend_service.recommended_listings_etag(db) != etag
+
+# ה-ETag נגזר מהנתונים - אחרי ניקוי המטמון (למשל בתהליך אחר או אחרי הפעלה מחדש) הוא זהה כל עוד לא היה שינוי
+def test_recommended_listings_etag_stable(db):
+    db.add(Trip(title="Stable", destination="Place", is_recommended=True))
+    db.commit()
+    etag = recommend_service.recommended_listings_etag(db)
+    recommend_service.invalidate_recommended_listings()
+    assert recommend_service.recommended_listings_etag(db) == etag
+
+# מיון random נבנה תמיד ובלי ETag
+def test_listing_response_random(db):
+    response = Response()
+    assert recommend_service.listing_response(db, response, "random", '"any"', lambda version: version) is None
+    assert "etag" not in response.headers
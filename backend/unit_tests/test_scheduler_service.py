@@ -0,0 +1,106 @@
+import threading
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.database import Base
+from app.models.scheduled_job_model import ScheduledJob
+from app.services import scheduler_service
+from unit_tests.conftest import TestingSessionLocal
+
+
+# משימת בדיקה שסופרת כמה פעמים רצה
+@pytest.fixture
+def test_job(monkeypatch):
+    calls = []
+    job = {"func": lambda db: calls.append(db), "trigger": None, "lease_seconds": 60, "min_interval_seconds": 3600}
+    monkeypatch.setitem(scheduler_service.SCHEDULED_JOBS, "test_job", job)
+    return calls
+
+
+# --- acquire_job_lease / release_job_lease ---
+# רק תהליך אחד מחזיק בחכירה
+def test_acquire_job_lease_single_owner(db):
+    assert scheduler_service.acquire_job_lease(db, "job", "worker-1", 60)
+    assert not scheduler_service.acquire_job_lease(db, "job", "worker-2", 60)
+    job = db.get(ScheduledJob, "job")
+    assert job.lease_owner == "worker-1"
+    assert job.last_status == "running"
+
+# שחרור החכירה שומר את משך ההרצה ואת התוצאה
+def test_release_job_lease_records_run(db):
+    started = datetime.now(timezone.utc) - timedelta(seconds=2)
+    scheduler_service.acquire_job_lease(db, "job", "worker-1", 60)
+    scheduler_service.release_job_lease(db, "job", "worker-1", started)
+
+    job = db.get(ScheduledJob, "job")
+    db.refresh(job)
+    assert job.lease_owner is None
+    assert job.last_status == "succeeded"
+    assert job.last_duration_seconds >= 2
+    assert job.run_count == 1
+
+# חכירה של תהליך שנפל פגה ותהליך אחר יכול לקחת אותה
+def test_acquire_job_lease_expired(db):
+    scheduler_service.acquire_job_lease(db, "job", "worker-1", 60)
+    job = db.get(ScheduledJob, "job")
+    job.lease_expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.commit()
+
+    assert scheduler_service.acquire_job_lease(db, "job", "worker-2", 60)
+
+# הרצה נוספת לא מתחילה לפני שעבר הזמן המינימלי מההרצה הקודמת
+def test_acquire_job_lease_min_interval(db):
+    started = datetime.now(timezone.utc)
+    assert scheduler_service.acquire_job_lease(db, "job", "worker-1", 60, min_interval_seconds=3600)
+    scheduler_service.release_job_lease(db, "job", "worker-1", started)
+    assert not scheduler_service.acquire_job_lease(db, "job", "worker-2", 60, min_interval_seconds=3600)
+
+
+# --- run_exclusive ---
+# כמה תהליכים שמופעלים באותה דקה - המשימה רצה פעם אחת
+def test_run_exclusive_runs_once(db, test_job):
+    ran = [scheduler_service.run_exclusive("test_job", TestingSessionLocal, owner=f"worker-{i}") for i in range(8)]
+    assert ran.count(True) == 1
+    assert len(test_job) == 1
+
+# משימה שנכשלה נשמרת עם השגיאה והחכירה משתחררת
+def test_run_exclusive_failure(db, monkeypatch):
+    def fail(db):
+        raise RuntimeError("smtp down")
+    monkeypatch.setitem(scheduler_service.SCHEDULED_JOBS, "test_job", {"func": fail, "lease_seconds": 60, "min_interval_seconds": 0})
+
+    assert scheduler_service.run_exclusive("test_job", TestingSessionLocal)
+    job = db.get(ScheduledJob, "test_job")
+    assert job.last_status == "failed"
+    assert "smtp down" in job.last_error
+    assert job.lease_owner is None
+
+# תהליכים מקבילים על אותו DB - רק אחד מריץ
+def test_run_exclusive_concurrent(tmp_path, test_job):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    results = []
+
+    def worker(i):
+        results.append(scheduler_service.run_exclusive("test_job", Session, owner=f"worker-{i}"))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    assert results.count(True) == 1
+    assert len(test_job) == 1
+
+
+# --- get_job_statuses ---
+# משימה שעוד לא רצה מופיעה בלי נתוני הרצה
+def test_get_job_statuses(db):
+    statuses = scheduler_service.get_job_statuses(db)
+    reminders = [job for job in statuses if job.name == "trip_reminders"][0]
+    assert reminders.last_started_at is None
+    assert reminders.run_count == 0
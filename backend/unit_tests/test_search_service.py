@@ -0,0 +1,72 @@
+from app.models.trip_model import Trip
+from app.schemas.trip_schema import TripCreate
+from app.services import search_service, trip_service, recommend_service
+from unit_tests.conftest import get_test_user, get_admin_user
+
+# משתמשים גלובליים לבדיקה
+user = get_test_user()
+admin = get_admin_user()
+
+
+# --- build_tsquery ---
+# כל שדה מקבל את המשקל שלו, מילים באותו שדה ב-AND ושדות ב-OR
+def test_build_tsquery():
+    query = search_service.build_tsquery({"title": "Rome  Trip", "destination": "", "description": "food!"})
+    assert query == "(rome:*A & trip:*A) | (food:*C)"
+
+# תווים מיוחדים לא נכנסים לשאילתה
+def test_build_tsquery_strips_operators():
+    query = search_service.build_tsquery({"title": "a'|b:*!", "destination": "", "description": ""})
+    assert query == "(a:*A & b:*A)"
+
+
+# --- build_search_filter ---
+# בלי מונחי חיפוש אין תנאי
+def test_build_search_filter_empty(db):
+    assert search_service.build_search_filter(db, "", "  ", "", "") is None
+
+
+# --- InMemoryTripIndex ---
+# התאמה לפי תחילית מילה ורק בשדה המבוקש
+def test_index_prefix_match_per_field(db):
+    in_title = Trip(title="Amazing Rome", destination="Italy", is_recommended=True)
+    in_description = Trip(title="Other", destination="Spain", description="Not Rome", is_recommended=True)
+    db.add_all([in_title, in_description])
+    db.commit()
+
+    scores = search_service.trip_index.search(db, {"title": "ro", "destination": "", "description": ""})
+    assert set(scores) == {in_title.id}
+
+# עדכון טיול מרענן את האינדקס
+def test_index_refreshes_after_update(db):
+    trip = Trip(title="Paris", destination="France", is_recommended=True)
+    db.add(trip)
+    db.commit()
+    assert search_service.trip_index.search(db, {"title": "paris", "destination": "", "description": ""})
+
+    trip.title = "Lyon"
+    db.commit()
+    assert not search_service.trip_index.search(db, {"title": "paris", "destination": "", "description": ""})
+
+
+# --- חיפוש מלא ---
+# מיון לפי רלוונטיות - התאמה בכותרת לפני התאמה בתיאור
+def test_search_recommended_relevance(db):
+    weak = Trip(title="Beach", destination="Greece", description="Lisbon vibes", is_recommended=True)
+    strong = Trip(title="Lisbon Nights", destination="Portugal", is_recommended=True)
+    db.add_all([weak, strong])
+    db.commit()
+
+    result = recommend_service.handle_search_recommended_trips("lisbon", "lisbon", "", db, sort_by="relevance")
+    assert [trip.id for trip in result["trips"]] == [strong.id, weak.id]
+
+# חיפוש לפי שם יוצר או טקסט בטיול
+def test_search_trips_by_creator_or_text(db):
+    by_admin = trip_service.create_trip(TripCreate(title="Berlin", destination="Germany"), db, admin)
+    by_user = trip_service.create_trip(TripCreate(title="Tokyo", destination="Japan"), db, user)
+
+    result = trip_service.handle_search_trips("tokyo", "", "", "adm", db)
+    assert {trip.id for trip in result["trips"]} == {by_admin.id, by_user.id}
+
+    result = trip_service.handle_search_trips("", "", "", "adm", db)
+    assert [trip.id for trip in result["trips"]] == [by_admin.id]
@@ -0,0 +1,102 @@
+import pytest
+from datetime import date, time
+from fastapi import HTTPException
+from sqlalchemy import event
+from app.models.trip_model import Trip
+from app.models.activity_model import Activity
+from app.services import summary_service
+from unit_tests.conftest import get_test_user
+
+# משתמש גלובלי לבדיקה
+user = get_test_user()
+
+def create_trip_with_activities(db, title="Summary Trip"):
+    trip = Trip(title=title, destination="Japan", start_date=date(2026, 5, 1), end_date=date(2026, 5, 3), user_id=user.id)
+    db.add(trip)
+    db.flush()
+    db.add_all([
+        Activity(trip_id=trip.id, day_number=2, title="Market", time=time(9, 0), location_name="Osaka"),
+        Activity(trip_id=trip.id, day_number=1, title="Dinner", time=time(19, 30), location_name="Tokyo"),
+        Activity(trip_id=trip.id, day_number=1, title="Shrine", time=None, location_name="Tokyo"),
+    ])
+    db.commit()
+    return trip
+
+
+# --- group_activities_by_day ---
+# הפעילויות ממוינות לפי יום ולפי שעה, ופעילות בלי שעה ראשונה
+def test_group_activities_by_day(db):
+    trip = create_trip_with_activities(db)
+    days = summary_service.group_activities_by_day(trip)
+    assert [(day, [a.title for a in activities]) for day, activities in days] == [
+        (1, ["Shrine", "Dinner"]),
+        (2, ["Market"]),
+    ]
+
+
+# --- render_trip_summary ---
+# בדיקה של יצירת טקסט סיכום טיול
+def test_render_trip_summary_text(db):
+    trip = create_trip_with_activities(db)
+    text = summary_service.render_trip_summary(trip, "text").decode("utf-8")
+    assert text.startswith("Trip Summary – Summary Trip")
+    assert "Day 1:\n- Shrine at Time not set\n- Dinner at 19:30" in text
+    assert "Day 2:\n- Market at 09:00" in text
+
+# HTML עם תווים מיוחדים מקודדים
+def test_render_trip_summary_html(db):
+    trip = create_trip_with_activities(db, title="Tom & Jerry <3")
+    html = summary_service.render_trip_summary(trip, "html").decode("utf-8")
+    assert "<h1>Trip Summary – Tom &amp; Jerry &lt;3 🌍</h1>" in html
+    assert "<li>Dinner at 19:30</li>" in html
+
+# סיכום Markdown
+def test_render_trip_summary_markdown(db):
+    trip = create_trip_with_activities(db)
+    markdown = summary_service.render_trip_summary(trip, "markdown").decode("utf-8")
+    assert "## Day 2\n\n- **09:00** – Market" in markdown
+
+# פורמט לא מוכר
+def test_render_trip_summary_unknown_format(db):
+    trip = create_trip_with_activities(db)
+    with pytest.raises(HTTPException) as e:
+        summary_service.render_trip_summary(trip, "pdf")
+    assert e.value.status_code == 400
+
+# סיכום של אותה גרסה מגיע מהמטמון בלי לטעון את הפעילויות, ושינוי בפעילות בונה אותו מחדש
+def test_render_trip_summary_cached_per_revision(db):
+    trip = create_trip_with_activities(db)
+    first = summary_service.render_trip_summary(trip)
+
+    db.expire_all()
+    statements = []
+    engine = db.get_bind()
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        trip = db.get(Trip, trip.id)
+        assert summary_service.render_trip_summary(trip) is first
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert not any("FROM activities" in s for s in statements)
+
+    db.add(Activity(trip_id=trip.id, day_number=3, title="Onsen", location_name="Hakone"))
+    db.commit()
+    assert b"Onsen" in summary_service.render_trip_summary(trip)
+
+
+# --- get_trip_summary ---
+# שם הקובץ וסוג התוכן לפי הפורמט
+def test_get_trip_summary(db):
+    trip = create_trip_with_activities(db)
+    file_name, content, media_type = summary_service.get_trip_summary(trip.id, "markdown", db)
+    assert file_name == "Summary Trip_summary.md"
+    assert media_type.startswith("text/markdown")
+    assert b"# Trip Summary" in content
+
+# טיול שלא קיים
+def test_get_trip_summary_not_found(db):
+    with pytest.raises(HTTPException) as e:
+        summary_service.get_trip_summary(9999, "text", db)
+    assert e.value.status_code == 404
@@ -5,8 +5,17 @@ from fastapi import HTTPException, status
 from app.services.token_service import (
     create_access_token,
     get_current_user,
-    require_admin_user
+    get_optional_current_user,
+    require_admin_user,
+    create_feed_token,
+    get_feed_token,
+    rotate_feed_token,
+    get_feed_user,
+    get_current_principal,
+    invalidate_user_principals
 )
+from app.services import token_service
+from sqlalchemy import event
 from app.models.user_model import User
 from dotenv import load_dotenv
 import os
@@ -78,16 +87,168 @@ def test_get_current_user_missing_sub(db):
         get_current_user(Token(), db)
     assert e.value.status_code == 401
 
+# טוקן של פיד היומן לא מתקבל כטוקן התחברות
+def test_get_current_user_rejects_feed_token(db):
+    user = db.query(User).filter(User.email == "test@example.com").first()
+
+    class Token:
+        credentials = create_feed_token(user)
+
+    with pytest.raises(HTTPException) as e:
+        get_current_user(Token(), db)
+    assert e.value.status_code == 401
+
+
+# --- get_current_principal ---
+# מונה שאילתות SQL שרצות בזמן הקריאה
+def count_statements(db, func):
+    statements = []
+    engine = db.get_bind()
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return result, statements
+
+# טוקן שכבר נבדק מגיע מהמטמון בלי פענוח ובלי שאילתה
+def test_get_current_principal_cached(db):
+    class Token:
+        credentials = create_access_token({"sub": "test@example.com"})
+
+    principal, statements = count_statements(db, lambda: get_current_principal(Token(), db))
+    assert (principal.id, principal.username) == (1, "testuser")
+    assert len(statements) == 1
+
+    cached, statements = count_statements(db, lambda: get_current_principal(Token(), db))
+    assert cached == principal
+    assert statements == []
+
+# המשתמש המלא נשלף לפי מפתח ראשי כשהטוקן במטמון
+def test_get_current_user_uses_cached_principal(db):
+    class Token:
+        credentials = create_access_token({"sub": "test@example.com"})
+
+    get_current_principal(Token(), db)
+    db.expire_all()
+    user, statements = count_statements(db, lambda: get_current_user(Token(), db))
+    assert user.email == "test@example.com"
+    assert len(statements) == 1 and "users.id = " in statements[0]
+
+# ניקוי המטמון של משתמש מחזיר את הפרטים העדכניים מה-DB
+def test_invalidate_user_principals(db):
+    class Token:
+        credentials = create_access_token({"sub": "test@example.com"})
+
+    get_current_principal(Token(), db)
+    db.query(User).filter(User.id == 1).update({"username": "renamed"})
+    db.commit()
+    assert get_current_principal(Token(), db).username == "testuser"
+
+    assert invalidate_user_principals(1) == 1
+    assert get_current_principal(Token(), db).username == "renamed"
+
+# משתמש לא נשמר במטמון אחרי שהטוקן שלו פג
+def test_get_current_principal_cache_capped_by_token_expiry(db, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.services.cache_service.time.monotonic", lambda: now[0])
+
+    class Token:
+        credentials = create_access_token({"sub": "test@example.com"}, expires_delta=timedelta(seconds=30))
+
+    get_current_principal(Token(), db)
+    now[0] += 20
+    assert count_statements(db, lambda: get_current_principal(Token(), db))[1] == []
+    now[0] += 20
+    assert len(count_statements(db, lambda: get_current_principal(Token(), db))[1]) == 1
+
+
+# --- get_optional_current_user ---
+# בלי טוקן מחזיר None
+def test_get_optional_current_user_without_token(db):
+    assert get_optional_current_user(None, db) is None
+
+# עם טוקן תקף מחזיר את המשתמש
+def test_get_optional_current_user_with_token(db):
+    class Token:
+        credentials = create_access_token({"sub": "test@example.com"})
+
+    assert get_optional_current_user(Token(), db).email == "test@example.com"
+
 
 # --- require_admin_user ---
 # משתמש אדמין עובר
 def test_require_admin_user_success(db):
     admin = db.query(User).filter(User.email == "admin@example.com").first()
-    assert require_admin_user(admin) == admin
+    assert require_admin_user(admin, db) == admin
 
 # משתמש לא אדמין נזרקת שגיאת 403
 def test_require_admin_user_forbidden(db):
     user = db.query(User).filter(User.email == "test@example.com").first()
     with pytest.raises(HTTPException) as e:
-        require_admin_user(user)
+        require_admin_user(user, db)
     assert e.value.status_code == status.HTTP_403_FORBIDDEN
+
+# מינוי אדמין ב-DB תקף מיד, גם כשהטוקן כבר במטמון
+def test_require_admin_user_promoted_after_cache(db):
+    class Token:
+        credentials = create_access_token({"sub": "test@example.com"})
+
+    principal = get_current_principal(Token(), db)
+    db.query(User).filter(User.email == "test@example.com").update({User.is_admin: True})
+    db.commit()
+    assert require_admin_user(get_current_principal(Token(), db), db) == principal
+
+
+# --- get_feed_user ---
+# טוקן הפיד בכתובת מחזיר את המשתמש
+def test_get_feed_user_with_feed_token(db):
+    user = db.query(User).filter(User.email == "test@example.com").first()
+    assert get_feed_user(create_feed_token(user), None, db).id == user.id
+
+# בקשות חוזרות לכתובת הפיד לא מבטלות זו את זו
+def test_get_feed_token_keeps_previous(db):
+    user = db.query(User).filter(User.email == "test@example.com").first()
+    first, second = get_feed_token(user.id, db), get_feed_token(user.id, db)
+    assert get_feed_user(first, None, db).id == user.id
+    assert get_feed_user(second, None, db).id == user.id
+
+# כתובת פיד חדשה מבטלת את הקודמת, גם כשהטוקן הקודם כבר במטמון
+def test_rotate_feed_token_revokes_previous(db):
+    user = db.query(User).filter(User.email == "test@example.com").first()
+    old_token = create_feed_token(user)
+    get_feed_user(old_token, None, db)
+
+    new_token = rotate_feed_token(user.id, db)
+    assert get_feed_user(new_token, None, db).id == user.id
+    with pytest.raises(HTTPException) as e:
+        get_feed_user(old_token, None, db)
+    assert e.value.status_code == 401
+
+# טוקן פיד בלי גרסה (מלפני שנוספה) לא מתקבל
+def test_get_feed_user_rejects_unversioned_token(db):
+    token = jwt.encode({"sub": "test@example.com", "scope": token_service.FEED_TOKEN_SCOPE}, SECRET_KEY, algorithm=ALGORITHM)
+    with pytest.raises(HTTPException) as e:
+        get_feed_user(token, None, db)
+    assert e.value.status_code == 401
+
+# בלי טוקן פיד אפשר להתחבר עם טוקן רגיל
+def test_get_feed_user_with_bearer(db):
+    class Token:
+        credentials = create_access_token({"sub": "test@example.com"})
+
+    assert get_feed_user(None, Token(), db).email == "test@example.com"
+
+# טוקן התחברות רגיל לא מתקבל כטוקן פיד
+def test_get_feed_user_rejects_access_token(db):
+    with pytest.raises(HTTPException) as e:
+        get_feed_user(create_access_token({"sub": "test@example.com"}), None, db)
+    assert e.value.status_code == 401
+
+# בלי שום טוקן
+def test_get_feed_user_missing_token(db):
+    with pytest.raises(HTTPException) as e:
+        get_feed_user(None, None, db)
+    assert e.value.status_code == 401
@@ -1,15 +1,22 @@
 from app.models.trip_model import Trip
 from app.models.user_model import User
 from app.models.activity_model import Activity
+from app.models.rating_model import Rating
+from app.models.comment_model import Comment
+from app.models.favorite_model import FavoriteRecommendedTrip
 from app.schemas.trip_schema import TripCreate, AiTripCloneRequest
+from app.schemas.rating_schema import RateTripRequest
+from app.services.recommend_service import rate_trip
+from app.services.favorite_service import toggle_favorite_recommended_trip
 from app.services.trip_service import (
     create_trip, update_trip, delete_trip, get_trips, handle_search_trips,
-    get_trip_by_id, clone_recommended_trip, import_ai_trip,
-    get_upcoming_trips, build_trip_summary_text
+    get_trip_by_id, get_trip_full, clone_recommended_trip, import_ai_trip,
+    get_upcoming_trips, parse_activity_time
 )
 from fastapi import HTTPException
 import pytest
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta, timezone, time as dtime
+from sqlalchemy import event
 from unit_tests.conftest import get_test_user, get_admin_user
 
 # משתמשים גלובליים לבדיקה
@@ -98,6 +105,41 @@ def test_get_trip_by_id_not_found(db):
     assert e.value.status_code == 404
 
 
+# --- get_trip_full ---
+# פעילויות מקובצות לפי יום וממוינות לפי שעה, עם דירוג, תגובות ומועדף
+def test_get_trip_full(db):
+    trip = Trip(title="Full", destination="Rome", is_recommended=True, rating_sum=9, rating_count=2)
+    db.add(trip)
+    db.commit()
+    db.add_all([
+        Activity(trip_id=trip.id, day_number=2, title="Dinner", location_name="A", time=dtime(19, 0)),
+        Activity(trip_id=trip.id, day_number=1, title="Free time", location_name="B"),
+        Activity(trip_id=trip.id, day_number=1, title="Museum", location_name="C", time=dtime(10, 0)),
+        Activity(trip_id=trip.id, day_number=1, title="Breakfast", location_name="D", time=dtime(8, 0)),
+        Rating(rating=4, user_id=user.id, trip_id=trip.id),
+        Rating(rating=5, user_id=admin.id, trip_id=trip.id),
+        Comment(content="Nice", user_id=user.id, trip_id=trip.id),
+        FavoriteRecommendedTrip(user_id=user.id, trip_id=trip.id),
+    ])
+    db.commit()
+
+    full = get_trip_full(trip.id, db, user)
+    assert [day["day_number"] for day in full.days] == [1, 2]
+    assert [a.title for a in full.days[0]["activities"]] == ["Breakfast", "Museum", "Free time"]
+    assert full.average_rating == 4.5
+    assert full.comment_count == 1
+    assert full.is_favorite is True
+
+    assert get_trip_full(trip.id, db, admin).is_favorite is False
+    assert get_trip_full(trip.id, db).is_favorite is False
+
+# טיול שלא קיים
+def test_get_trip_full_not_found(db):
+    with pytest.raises(HTTPException) as e:
+        get_trip_full(9999, db)
+    assert e.value.status_code == 404
+
+
 # --- update_trip ---
 # בדיקה של עדכון טיול תקין
 def test_update_trip_success(db):
@@ -152,6 +194,33 @@ def test_clone_recommended_trip_success(db):
     assert cloned.title == trip.title
     assert cloned.id != trip.id
 
+# הפעילויות משוכפלות בפקודת INSERT ... SELECT אחת בלי לקרוא אותן קודם
+def test_clone_recommended_trip_copies_activities_in_database(db):
+    trip = Trip(title="Recommended", destination="Spain", is_recommended=True)
+    db.add(trip)
+    db.commit()
+    db.add_all([
+        Activity(trip_id=trip.id, day_number=1, title="Tapas", location_name="Bar", time=dtime(20, 0)),
+        Activity(trip_id=trip.id, day_number=2, title="Museum", location_name="Prado"),
+    ])
+    db.commit()
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        cloned = clone_recommended_trip(trip.id, db, user)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert any("INSERT INTO activities" in s and "SELECT" in s for s in statements)
+    assert not any(s.lstrip().startswith("SELECT") and "FROM activities" in s for s in statements)
+    copied = db.query(Activity).filter(Activity.trip_id == cloned.id).order_by(Activity.id).all()
+    assert [(a.day_number, a.title, a.time) for a in copied] == [(1, "Tapas", dtime(20, 0)), (2, "Museum", None)]
+
 # בדיקה של שכפול טיול לא מומלץ ( אמור להיכשל)
 def test_clone_regular_trip_fails(db):
     trip = create_trip(TripCreate(title="Normal", destination="France"), db, user)
@@ -175,17 +244,6 @@ def test_get_upcoming_trips_excludes_future(db):
     assert all(trip.title != "Future" for trip in results)
 
 
-# --- build_trip_summary_text ---
-# בדיקה של יצירת טקסט סיכום טיול
-def test_trip_summary_text(db):
-    trip = create_trip(TripCreate(title="Summary Trip", destination="Japan"), db, user)
-    db.add(Activity(trip_id=trip.id, day_number=1, title="Shrine", time=None, description="Visit", location_name="Tokyo"))
-    db.commit()
-    text = build_trip_summary_text(trip)
-    assert "Day 1:" in text
-    assert "Shrine" in text
-
-
 # --- import_ai_trip ---
 # בדיקה של טעינת טיול מ-AI כולל פעילויות
 def test_import_ai_trip_success(db):
@@ -202,3 +260,130 @@ def test_import_ai_trip_success(db):
     )
     new_trip = import_ai_trip(ai_data, db, user)
     assert new_trip.title.startswith("AI Trip")
+
+# הפעילויות נכתבות עם שעות מפורקות, והטיול חוזר עם הפעילויות בלי שאילתה נוספת
+def test_import_ai_trip_bulk_insert(db):
+    ai_data = AiTripCloneRequest(
+        destination="Rome",
+        trip_type="Food",
+        travelers=2,
+        duration_days=2,
+        trip_plan=[
+            {"day": 1, "activities": [
+                {"title": "Coffee", "time": "08:30", "location_name": "Bar"},
+                {"title": "Pasta", "time": "13:00", "location_name": "Trattoria"},
+            ]},
+            {"day": 2, "activities": [{"title": "Gelato", "time": "", "location_name": "Centro"}]},
+        ]
+    )
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        new_trip = import_ai_trip(ai_data, db, user)
+        titles = [a.title for a in new_trip.activities]
+        times = [a.time for a in new_trip.activities]
+        trip_id = new_trip.id
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert not [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    assert titles == ["Coffee", "Pasta", "Gelato"]
+    assert times == [dtime(8, 30), dtime(13, 0), None]
+    assert db.query(Activity).filter(Activity.trip_id == trip_id).count() == 3
+
+# תוכנית עם שעה לא תקינה לא משאירה טיול חלקי
+def test_import_ai_trip_invalid_time(db):
+    ai_data = AiTripCloneRequest(
+        destination="Rome",
+        duration_days=1,
+        trip_plan=[{"day": 1, "activities": [{"title": "Coffee", "time": "morning"}]}]
+    )
+    with pytest.raises(HTTPException) as e:
+        import_ai_trip(ai_data, db, user)
+    assert e.value.status_code == 400
+    assert db.query(Trip).count() == 0
+
+# פעילות בלי כותרת
+def test_import_ai_trip_activity_without_title(db):
+    ai_data = AiTripCloneRequest(
+        destination="Rome",
+        duration_days=1,
+        trip_plan=[{"day": 1, "activities": [{"time": "10:00"}]}]
+    )
+    with pytest.raises(HTTPException) as e:
+        import_ai_trip(ai_data, db, user)
+    assert e.value.status_code == 400
+
+
+# --- parse_activity_time ---
+# פורמטים נתמכים וערך ריק
+def test_parse_activity_time():
+    assert parse_activity_time("9:05") == dtime(9, 5)
+    assert parse_activity_time("18:45:30") == dtime(18, 45, 30)
+    assert parse_activity_time(None) is None
+
+
+# --- Trip.revision ---
+# עדכון טיול מעלה את הגרסה
+def test_trip_revision_bumped_on_update(db):
+    trip = create_trip(TripCreate(title="Rev", destination="Place"), db, user)
+    assert trip.revision == 1
+    update_trip(trip.id, {"title": "Rev 2"}, db, user)
+    db.refresh(trip)
+    assert trip.revision == 2
+
+# זמן העדכון נקבע ביצירה ומתעדכן יחד עם הגרסה
+def test_trip_updated_at_bumped_with_revision(db):
+    trip = create_trip(TripCreate(title="Rev", destination="Place"), db, user)
+    created = trip.updated_at
+    assert created is not None
+    update_trip(trip.id, {"title": "Rev 2"}, db, user)
+    db.refresh(trip)
+    assert trip.updated_at > created
+
+# הוספה, עדכון ומחיקה של פעילות מעלים את הגרסה של הטיול
+def test_trip_revision_bumped_on_activity_change(db):
+    trip = create_trip(TripCreate(title="Rev", destination="Place"), db, user)
+    activity = Activity(trip_id=trip.id, day_number=1, title="Museum", location_name="Center")
+    db.add(activity)
+    db.commit()
+    db.refresh(trip)
+    assert trip.revision == 2
+
+    activity.title = "Park"
+    db.commit()
+    db.refresh(trip)
+    assert trip.revision == 3
+
+    db.delete(activity)
+    db.commit()
+    db.refresh(trip)
+    assert trip.revision == 4
+
+# שינוי בזמן התזכורת לא משנה את תוכן הטיול
+def test_trip_revision_ignores_reminded_at(db):
+    trip = create_trip(TripCreate(title="Rev", destination="Place"), db, user)
+    trip.reminded_at = datetime.now(timezone.utc)
+    db.commit()
+    db.refresh(trip)
+    assert trip.revision == 1
+
+# דירוג ומועדפים מעדכנים רק את המונים של הטיול, בלי להעלות את הגרסה
+def test_trip_revision_ignores_rating_and_favorites(db):
+    trip = Trip(title="Rated", destination="Place", is_recommended=True)
+    db.add(trip)
+    db.commit()
+    updated_at = trip.updated_at
+
+    rate_trip(trip.id, RateTripRequest(rating=4), user, db)
+    toggle_favorite_recommended_trip(trip.id, user, db)
+    toggle_favorite_recommended_trip(trip.id, user, db)
+    db.refresh(trip)
+    assert trip.rating_count == 1
+    assert trip.revision == 1
+    assert trip.updated_at == updated_at